@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from api import checks, signals  # noqa: F401
+        from api.indexes import trigram_index
+        trigram_index.load()
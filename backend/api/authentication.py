@@ -0,0 +1,61 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.authentication import TokenAuthentication
+
+from api.cache import is_shared_cache
+from users.models import User
+
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname != 'password'
+)
+
+
+def token_cache_key(key: str) -> str:
+    """Ключ кэша по хешу токена: сам токен в имена ключей не попадает."""
+    return 'auth:token:{}'.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_token(key: str) -> None:
+    """
+    Удаляет снимок пользователя сразу и повторно после коммита,
+    чтобы параллельный запрос не вернул в кэш данные до изменения.
+    """
+    cache_key = token_cache_key(key)
+    cache.delete(cache_key)
+    transaction.on_commit(lambda: cache.delete(cache_key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшем соответствия токен → пользователь.
+
+    В кэше хранится снимок полей пользователя без пароля, поэтому
+    запрос с известным токеном не обращается к базе. Пароль остается
+    отложенным полем и загружается только при обращении к нему.
+    Снимок сбрасывается сигналами при выходе, изменении и удалении
+    пользователя, а при промахе кэша проверка идет через базу.
+    С кэшем одного процесса (``LocMemCache``) другие воркеры и команды
+    не могут сбросить снимок, поэтому тогда проверка всегда идет
+    через базу, как в ``TokenAuthentication``.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_shared_cache():
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        snapshot = cache.get(cache_key)
+        if snapshot is not None:
+            user = User.from_db(DEFAULT_DB_ALIAS, SNAPSHOT_FIELDS, snapshot)
+            return user, self.get_model()(key=key, user=user)
+
+        user, token = super().authenticate_credentials(key)
+        cache.set(
+            cache_key,
+            tuple(getattr(user, field) for field in SNAPSHOT_FIELDS),
+            settings.AUTH_TOKEN_CACHE_TIMEOUT
+        )
+        return user, token
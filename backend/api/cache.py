@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from recipes.models import Tag
+
+CATALOG_VERSION_KEY: str = 'catalog:version'
+RECIPE_INGREDIENTS_VERSION_KEY: str = 'recipe_ingredients:version'
+
+
+def is_shared_cache() -> bool:
+    """
+    Виден ли кэш всем процессам. ``LocMemCache`` у каждого воркера
+    свой, поэтому сброс версии в одном процессе другие не увидят.
+    """
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def _get_version(key: str) -> str:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _set_version(key: str) -> None:
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def _bump_version(key: str) -> None:
+    """
+    Сбрасывает версию сразу и повторно после коммита транзакции,
+    чтобы другой воркер не закэшировал данные до коммита под новой версией.
+    """
+    _set_version(key)
+    transaction.on_commit(lambda: _set_version(key))
+
+
+def get_catalog_version() -> str:
+    """
+    Текущая версия каталога тегов и ингредиентов.
+
+    Версию видят все воркеры и команды управления, только если кэш
+    общий (``CACHE_BACKEND`` — Redis, как в infra). С ``LocMemCache``
+    по умолчанию сброс версии виден лишь процессу, который его сделал.
+    Это случайный токен, а не счетчик: если ключ вытеснен из кэша,
+    новая версия не совпадет ни с одной из старых.
+    """
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version() -> None:
+    _bump_version(CATALOG_VERSION_KEY)
+
+
+def get_tag_ids_by_slug() -> dict[str, int]:
+    """Соответствие slug → id тегов, закэшированное по версии каталога."""
+    key = 'catalog:{}:tag_ids'.format(get_catalog_version())
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.CATALOG_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def get_recipe_ingredients_version() -> str:
+    """Версия составов рецептов для индекса поиска по продуктам."""
+    return _get_version(RECIPE_INGREDIENTS_VERSION_KEY)
+
+
+def bump_recipe_ingredients_version() -> None:
+    _bump_version(RECIPE_INGREDIENTS_VERSION_KEY)
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует отрендеренные ответы каталога по версии каталога.
+
+    На повторный запрос с совпадающим If-None-Match отвечает 304
+    без обращения к базе данных. Аутентификация отключена:
+    ответы каталога одинаковы для всех пользователей.
+    """
+    authentication_classes = ()
+
+    def _cache_key(self, request) -> str:
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        return 'catalog:{}:{}:{}:{}'.format(
+            get_catalog_version(),
+            self.basename,
+            request.accepted_media_type,
+            path
+        )
+
+    def _cached_response(self, request, handler, *args, **kwargs):
+        key = self._cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = self.finalize_response(
+                request, handler(request, *args, **kwargs), *args, **kwargs
+            )
+            if response.status_code != 200:
+                return response
+            content = response.render().content
+            entry = (
+                quote_etag(hashlib.sha1(content).hexdigest()),
+                content,
+                response['Content-Type']
+            )
+            cache.set(key, entry, settings.CATALOG_CACHE_TIMEOUT)
+
+        etag, content, content_type = entry
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', ))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
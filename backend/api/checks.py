@@ -0,0 +1,21 @@
+from django.core.checks import Tags, Warning, register
+
+from api.cache import is_shared_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версии каталога и снимки токенов сбрасываются через кэш, поэтому
+    на проде он должен быть общим для всех воркеров.
+    """
+    if is_shared_cache():
+        return []
+    return [
+        Warning(
+            'Кэш по умолчанию — LocMemCache, воркеры не видят '
+            'сброс версий каталога друг друга.',
+            hint='Задайте CACHE_BACKEND и CACHE_LOCATION (Redis).',
+            id='api.W001'
+        )
+    ]
@@ -1,5 +1,30 @@
 LIMIT_VALUE: int = 1
 
+FUZZY_SEARCH_LIMIT: int = 10
+
+MAX_MISSING_INGREDIENTS: int = 2
+RECIPE_INGREDIENT_INDEX_REBUILD_INTERVAL: int = 30
+
+BATCH_RECIPES_LIMIT: int = 100
+
+ADMIN_ESTIMATED_COUNT_THRESHOLD: int = 10_000
+
+DUPLICATE_QUERY_THRESHOLD: int = 3
+
+RECIPE_ORDERINGS: dict = {
+    'popular': ('-favorites_count', '-pub_date', '-id'),
+    'cooking_time': ('cooking_time', '-pub_date', '-id'),
+    '-pub_date': ('-pub_date', '-id')
+}
+
+IMAGE_MAX_SIZE: int = 5 * 1024 * 1024
+IMAGE_MAX_PIXELS: int = 24_000_000
+IMAGE_DECODE_CHUNK_SIZE: int = 64 * 1024
+IMAGE_SPOOL_MAX_SIZE: int = 1024 * 1024
+IMAGE_THUMBNAIL_WIDTH: int = 320
+IMAGE_MEDIUM_WIDTH: int = 960
+RECIPE_IMAGE_PLACEHOLDER: str = 'recipes/placeholder.svg'
+
 REGEX_FOR_USERNAME: str = (
     r'^(?=.{2,150}$)(?![_.-])(?!.*[_.-]{2})[a-zA-Z0-9._(){}-]+(?<![_.(){}-])$'
 )
@@ -1,11 +1,10 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
-
-
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+from api.cache import get_tag_ids_by_slug
+from api.conf import RECIPE_ORDERINGS
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
@@ -13,7 +12,7 @@ class RecipeFilter(filters.FilterSet):
         field_name='author',
         method='get_filter_field'
     )
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.CharFilter(method='filter_tags')
     is_favorited = filters.BooleanFilter(
         field_name='is_favorited',
         method='get_filter_field'
@@ -22,6 +21,11 @@ class RecipeFilter(filters.FilterSet):
         field_name='is_in_shopping_cart',
         method='get_filter_field'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(value, value) for value in RECIPE_ORDERINGS],
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -29,20 +33,16 @@ class RecipeFilter(filters.FilterSet):
             'author',
             'tags',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ordering'
         )
 
     def get_filter_field(self, queryset, name, value):
         if not value:
             return queryset
-        if name == 'is_favorited':
-            return queryset.filter(
-                favorite__user=self.request.user
-            )
-        if name == 'is_in_shopping_cart':
-            return queryset.filter(
-                shoppingcart__user=self.request.user
-            )
+        if name in ('is_favorited', 'is_in_shopping_cart'):
+            return self.filter_user_recipes(queryset, name)
         if name == 'author' and value == 'me':
             return queryset.filter(
                 author=self.request.user
@@ -51,3 +51,50 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(
                 author__id=value
             )
+
+    def filter_user_recipes(self, queryset, name):
+        """Рецепты из избранного или корзины текущего пользователя."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        model = Favorite if name == 'is_favorited' else ShoppingCart
+        return queryset.filter(Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        ))
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск; результаты идут по релевантности."""
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-pub_date', '-id'
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        Сортировка ``?ordering=popular|cooking_time|-pub_date``.
+        Для каждой есть составной индекс, поэтому страница
+        читается по индексу без сортировки всей таблицы.
+        """
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов ``?tags=a&tags=b``.
+        Слаги переводятся в id по закэшированному справочнику,
+        а связь проверяется подзапросом EXISTS: JOIN по тегам
+        дублировал бы рецепты с несколькими выбранными тегами.
+        """
+        tag_ids_by_slug = get_tag_ids_by_slug()
+        tag_ids = {
+            tag_ids_by_slug[slug]
+            for slug in self.request.query_params.getlist(name)
+            if slug in tag_ids_by_slug
+        }
+        if not tag_ids:
+            return queryset.none()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+            )
+        ))
@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import chain
+from typing import Iterable, Optional
+
+import numpy as np
+from django.conf import settings
+
+from api.cache import get_catalog_version, get_recipe_ingredients_version
+from api.conf import RECIPE_INGREDIENT_INDEX_REBUILD_INTERVAL
+from recipes.models import Ingredient, IngredientAmountForRecipe
+
+
+def normalize(value: str) -> str:
+    """Приводит строку к виду для поиска: регистр и ё не важны."""
+    return value.casefold().replace('ё', 'е').strip()
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Хранит отсортированный список нормализованных названий:
+    совпадения по префиксу ищутся бинарным поиском и идут первыми,
+    за ними следуют совпадения по подстроке.
+    Индекс перестраивается при первом обращении после смены
+    версии каталога, поэтому изменения видны во всех воркерах.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Optional[tuple[str, list[str], list[dict]]] = None
+
+    def invalidate(self) -> None:
+        self._data = None
+
+    def _build(self) -> tuple[list[str], list[dict]]:
+        entries = sorted(
+            (normalize(name), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [key for key, *_ in entries]
+        rows = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in entries
+        ]
+        return keys, rows
+
+    def _get(self) -> tuple[list[str], list[dict]]:
+        version = get_catalog_version()
+        data = self._data
+        if data is None or data[0] != version:
+            with self._lock:
+                data = self._data
+                if data is None or data[0] != version:
+                    data = self._data = (version, *self._build())
+        return data[1], data[2]
+
+    def search(self, query: str, limit: Optional[int] = None) -> list[dict]:
+        keys, rows = self._get()
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = rows[start:end]
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+        result.extend(
+            rows[position]
+            for position, key in enumerate(keys)
+            if query in key and not key.startswith(query)
+        )
+        return result if limit is None else result[:limit]
+
+
+def trigrams(value: str) -> set[int]:
+    """
+    Триграммы строки как в pg_trgm: каждое слово дополняется
+    двумя пробелами слева и одним справа. Триграмма упакована в int.
+    """
+    result = set()
+    for word in normalize(value).split():
+        word = '  ' + word + ' '
+        for position in range(len(word) - 2):
+            first, second, third = word[position:position + 3]
+            result.add((ord(first) << 42) | (ord(second) << 21) | ord(third))
+    return result
+
+
+class TrigramIndex:
+    """
+    Инвертированный индекс триграмм названий ингредиентов.
+
+    Индекс хранится в компактном бинарном файле и открывается через mmap,
+    поэтому воркеры gunicorn разделяют одни и те же страницы памяти.
+    Формат (little-endian): заголовок ``MAGIC``, контрольная сумма
+    строк ингредиентов (см. ``checksum``), число ингредиентов N
+    и триграмм T (uint32); id ингредиентов (N x uint32); число триграмм
+    каждого ингредиента (N x uint32); отсортированные триграммы
+    (T x uint64); смещения списков (T + 1 x uint32); списки позиций
+    ингредиентов (uint32).
+    """
+    MAGIC = b'FGTRGM01'
+    header = struct.Struct('<8s32sII')
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data = None
+        self._mtime = None
+        self._version = None
+        self._checked_version = None
+
+    @property
+    def path(self) -> str:
+        return self._path or settings.INGREDIENT_TRIGRAM_INDEX_PATH
+
+    @staticmethod
+    def rows() -> list[tuple[int, str]]:
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', 'name')
+        )
+
+    @staticmethod
+    def checksum(rows: Iterable[tuple[int, str]]) -> str:
+        """
+        Версия файла, зависящая только от данных: одинаковая во всех
+        процессах при любом кэше, в отличие от версии каталога.
+        """
+        digest = hashlib.sha256()
+        for pk, name in rows:
+            digest.update('{}\t{}\n'.format(pk, name).encode())
+        return digest.hexdigest()[:32]
+
+    @classmethod
+    def dumps(cls, rows: Iterable[tuple[int, str]], version: str) -> bytes:
+        ids, counts = [], []
+        postings = defaultdict(list)
+        for position, (pk, name) in enumerate(rows):
+            grams = trigrams(name)
+            ids.append(pk)
+            counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(position)
+        keys = sorted(postings)
+        offsets, items = [0], []
+        for key in keys:
+            items.extend(postings[key])
+            offsets.append(len(items))
+        return b''.join((
+            cls.header.pack(
+                cls.MAGIC, version.encode(), len(ids), len(keys)
+            ),
+            struct.pack('<{}I'.format(len(ids)), *ids),
+            struct.pack('<{}I'.format(len(counts)), *counts),
+            struct.pack('<{}Q'.format(len(keys)), *keys),
+            struct.pack('<{}I'.format(len(offsets)), *offsets),
+            struct.pack('<{}I'.format(len(items)), *items),
+        ))
+
+    def write(self, rows: Optional[list] = None) -> int:
+        """Пересобирает файл индекса по таблице ингредиентов."""
+        if rows is None:
+            rows = self.rows()
+        content = self.dumps(rows, self.checksum(rows))
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        # Свой временный файл у каждого писателя: воркеры, которые
+        # пересобирают индекс одновременно, не пишут в один файл,
+        # а os.replace атомарно публикует только дописанный целиком.
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=directory, prefix=os.path.basename(self.path) + '.',
+            suffix='.tmp'
+        )
+        try:
+            with os.fdopen(descriptor, 'wb') as fout:
+                fout.write(content)
+                fout.flush()
+                os.fsync(fout.fileno())
+            os.chmod(temporary_path, 0o644)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        self._mtime = None
+        return len(content)
+
+    @classmethod
+    def _parse(cls, buffer) -> tuple:
+        view = memoryview(buffer)
+        if len(view) < cls.header.size:
+            raise ValueError('Файл индекса триграмм обрезан.')
+        magic, version, items_count, keys_count = cls.header.unpack_from(
+            view
+        )
+        if magic != cls.MAGIC:
+            raise ValueError('Неизвестный формат индекса триграмм.')
+        start = cls.header.size
+        sections = []
+        for length, code, size in (
+            (items_count, 'I', 4),
+            (items_count, 'I', 4),
+            (keys_count, 'Q', 8),
+            (keys_count + 1, 'I', 4),
+        ):
+            end = start + length * size
+            if end > len(view):
+                raise ValueError('Файл индекса триграмм обрезан.')
+            sections.append(view[start:end].cast(code))
+            start = end
+        if len(view) != start + sections[-1][-1] * 4:
+            raise ValueError('Длина файла индекса триграмм не совпадает.')
+        sections.append(view[start:].cast('I'))
+        return version.decode(), tuple(sections)
+
+    def load(self) -> bool:
+        """Открывает файл индекса, если он есть и изменился."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return True
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as fin:
+                    buffer = mmap.mmap(
+                        fin.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+                self._version, self._data = self._parse(buffer)
+            except (OSError, ValueError):
+                # Файл пропал или поврежден: его пересоберет _get.
+                return False
+            self._mtime = mtime
+        return True
+
+    def invalidate(self) -> None:
+        """Помечает индекс непроверенным: он сверится при поиске."""
+        self._checked_version = None
+
+    def _get(self) -> tuple:
+        """
+        Данные индекса. Когда процесс видит новую версию каталога,
+        он сверяет контрольную сумму таблицы ингредиентов с файлом
+        и пересобирает файл, только если данные изменились. Остальные
+        воркеры подхватывают новый файл по времени изменения, даже
+        если версии каталога у них свои (``LocMemCache``).
+        """
+        catalog_version = get_catalog_version()
+        if self.load() and self._checked_version == catalog_version:
+            return self._data
+        rows = self.rows()
+        if not self.load() or self._version != self.checksum(rows):
+            self.write(rows)
+            self.load()
+        self._checked_version = catalog_version
+        return self._data
+
+    def search(
+        self, query: str, limit: int = 10, threshold: float = 0.2
+    ) -> list[int]:
+        """
+        Возвращает id ингредиентов, отсортированные по сходству
+        с запросом (доля общих триграмм, как similarity в pg_trgm).
+        """
+        ids, counts, keys, offsets, items = self._get()
+        query_grams = trigrams(query)
+        common = defaultdict(int)
+        for gram in query_grams:
+            position = bisect_left(keys, gram)
+            if position == len(keys) or keys[position] != gram:
+                continue
+            for item in items[offsets[position]:offsets[position + 1]]:
+                common[item] += 1
+        scored = []
+        for item, shared in common.items():
+            score = shared / (len(query_grams) + counts[item] - shared)
+            if score >= threshold:
+                scored.append((-score, ids[item]))
+        scored.sort()
+        return [pk for _, pk in scored[:limit]]
+
+
+class RecipeIngredientIndex:
+    """
+    Инвертированный индекс «ингредиент → рецепты» для поиска
+    рецептов по продуктам, которые есть у пользователя.
+
+    Хранится в массивах NumPy в формате CSR: позиции рецептов
+    с ингредиентом ``keys[k]`` лежат в ``postings[offsets[k]:
+    offsets[k + 1]]``, ``recipe_ids`` и ``sizes`` — id рецептов
+    и число ингредиентов в каждом из них. Индекс перестраивается
+    после смены версии составов рецептов, но не чаще раза
+    в ``RECIPE_INGREDIENT_INDEX_REBUILD_INTERVAL`` секунд: до этого
+    и пока индекс перестраивает другой поток, отдается прежний.
+    Удаленные рецепты отбрасывает view, а изменения составов
+    попадают в поиск с этой задержкой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+        self._built = 0.0
+
+    def invalidate(self) -> None:
+        self._data = None
+
+    @staticmethod
+    def _build() -> tuple:
+        pairs = IngredientAmountForRecipe.objects.order_by().values_list(
+            'ingredient_id', 'recipe_id'
+        )
+        pairs = np.fromiter(
+            chain.from_iterable(pairs.iterator(chunk_size=10000)),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        recipe_ids, positions = np.unique(pairs[:, 1], return_inverse=True)
+        sizes = np.bincount(positions, minlength=len(recipe_ids))
+        order = np.lexsort((positions, pairs[:, 0]))
+        keys, starts = np.unique(pairs[order, 0], return_index=True)
+        offsets = np.append(starts, len(order))
+        postings = positions[order].astype(np.int32)
+        return recipe_ids, sizes, keys, offsets, postings
+
+    def _get(self) -> tuple:
+        version = get_recipe_ingredients_version()
+        data = self._data
+        if data is not None and (
+            data[0] == version
+            or time.monotonic() - self._built
+            < RECIPE_INGREDIENT_INDEX_REBUILD_INTERVAL
+        ):
+            return data[1:]
+        if not self._lock.acquire(blocking=data is None):
+            return data[1:]
+        try:
+            if self._data is data:
+                self._built = time.monotonic()
+                self._data = (version, *self._build())
+            data = self._data
+        finally:
+            self._lock.release()
+        return data[1:]
+
+    def search(
+        self, have: Iterable[int], max_missing: int
+    ) -> list[tuple[int, int, int]]:
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов ``have``
+        и недостает не больше ``max_missing``, в виде
+        ``(id рецепта, есть, недостает)``. Сначала идут рецепты
+        с наибольшей долей имеющихся ингредиентов, затем с меньшим
+        числом недостающих и с большим числом имеющихся.
+        """
+        recipe_ids, sizes, keys, offsets, postings = self._get()
+        have = np.unique(np.fromiter(have, dtype=np.int64))
+        found = np.searchsorted(keys, have)
+        known = found < len(keys)
+        found = found[known][keys[found[known]] == have[known]]
+        if not len(found):
+            return []
+        matched = np.bincount(
+            np.concatenate([
+                postings[offsets[key]:offsets[key + 1]] for key in found
+            ]),
+            minlength=len(recipe_ids)
+        )
+        missing = sizes - matched
+        candidates = np.flatnonzero((matched > 0) & (missing <= max_missing))
+        order = np.lexsort((
+            -recipe_ids[candidates],
+            -matched[candidates],
+            missing[candidates],
+            -matched[candidates] / sizes[candidates],
+        ))
+        candidates = candidates[order]
+        return list(zip(
+            recipe_ids[candidates].tolist(),
+            matched[candidates].tolist(),
+            missing[candidates].tolist()
+        ))
+
+
+ingredient_index = IngredientIndex()
+trigram_index = TrigramIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from api.conf import DUPLICATE_QUERY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTiming:
+    """
+    Замеры одного запроса. Объект передается в
+    ``connection.execute_wrapper`` и считает время и текст каждого
+    SQL-запроса; точки начала и конца view ставит middleware.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.view_started: Optional[float] = None
+        self.view_finished: Optional[float] = None
+        self.db_time = 0.0
+        self.db_time_before_view = 0.0
+        self.db_time_in_view = 0.0
+        self.queries: Counter = Counter()
+        self.size: Optional[int] = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[sql] += 1
+
+    def start_view(self) -> None:
+        self.view_started = time.perf_counter()
+        self.db_time_before_view = self.db_time
+
+    def finish_view(self) -> None:
+        if self.view_started is not None and self.view_finished is None:
+            self.view_finished = time.perf_counter()
+            self.db_time_in_view = self.db_time - self.db_time_before_view
+
+    def finish(self, response) -> None:
+        self.finish_view()
+        self.finished = time.perf_counter()
+        if not response.streaming:
+            self.size = len(response.content)
+
+    def duplicates(self) -> dict:
+        """Одинаковые запросы, повторенные много раз (вероятный N+1)."""
+        return {
+            sql: count for sql, count in self.queries.items()
+            if count >= DUPLICATE_QUERY_THRESHOLD
+        }
+
+    def phases(self) -> dict:
+        """Длительности фаз в миллисекундах."""
+        view = render = 0.0
+        if self.view_finished is not None:
+            view = self.view_finished - self.view_started
+            render = self.finished - self.view_finished
+        return {
+            'total': (self.finished - self.started) * 1000,
+            'db': self.db_time * 1000,
+            'view': view * 1000,
+            'app': max(view - self.db_time_in_view, 0.0) * 1000,
+            'render': render * 1000
+        }
+
+    def header(self) -> str:
+        phases = self.phases()
+        metrics = [
+            'total;dur={:.1f}'.format(phases['total']),
+            'db;dur={:.1f};desc="{} queries"'.format(
+                phases['db'], sum(self.queries.values())
+            ),
+            'view;dur={:.1f}'.format(phases['view']),
+            'app;dur={:.1f}'.format(phases['app']),
+            'render;dur={:.1f}'.format(phases['render'])
+        ]
+        if self.size is not None:
+            metrics.append('size;desc="{} bytes"'.format(self.size))
+        duplicates = self.duplicates()
+        if duplicates:
+            metrics.append('n1;desc="{} repeated queries"'.format(
+                len(duplicates)
+            ))
+        return ', '.join(metrics)
+
+
+class ServerTimingMiddleware:
+    """
+    Замеры запроса в заголовке ``Server-Timing`` и в логе.
+
+    Включается настройкой ``SERVER_TIMING``. Фазы: ``db`` — все
+    SQL-запросы, ``view`` — выполнение view вместе с сериализаторами
+    (DRF считает ``serializer.data`` внутри view), ``app`` — то же без
+    SQL, ``render`` — рендеринг ответа в JSON. Одинаковые запросы,
+    повторенные ``DUPLICATE_QUERY_THRESHOLD`` и более раз, попадают
+    в лог как вероятный N+1.
+
+    Тело потокового ответа формируется уже после выхода из middleware,
+    когда заголовки отправлены, поэтому ``Server-Timing`` к нему
+    не добавляется: замеры вместе с запросами, выполненными при
+    выдаче тела (фаза ``render``), попадают в лог после отправки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request._timing = RequestTiming()
+        with self._capture(timing):
+            response = self.get_response(request)
+        if response.streaming:
+            timing.finish_view()
+            response.streaming_content = self._stream(
+                request, response, timing, response.streaming_content
+            )
+            return response
+        timing.finish(response)
+        response['Server-Timing'] = timing.header()
+        self._log(request, response, timing)
+        return response
+
+    @staticmethod
+    @contextmanager
+    def _capture(timing: RequestTiming):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing))
+            yield
+
+    def _stream(self, request, response, timing: RequestTiming, content):
+        timing.size = 0
+        try:
+            with self._capture(timing):
+                for chunk in content:
+                    timing.size += len(chunk)
+                    yield chunk
+        finally:
+            timing.finish(response)
+            self._log(request, response, timing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing.start_view()
+
+    def process_template_response(self, request, response):
+        """Ответ DRF рендерится после этого вызова: view закончена."""
+        request._timing.finish_view()
+        return response
+
+    @staticmethod
+    def _log(request, response, timing: RequestTiming) -> None:
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': sum(timing.queries.values()),
+            'size': timing.size,
+            **{
+                name + '_ms': round(value, 1)
+                for name, value in timing.phases().items()
+            }
+        }
+        logger.info(
+            'server_timing %s', json.dumps(record),
+            extra={'server_timing': record}
+        )
+        for sql, count in timing.duplicates().items():
+            duplicate = {
+                'method': request.method,
+                'path': request.path,
+                'count': count,
+                'sql': sql
+            }
+            logger.warning(
+                'n_plus_one %s', json.dumps(duplicate, ensure_ascii=False),
+                extra={'n_plus_one': duplicate}
+            )
@@ -1,5 +1,223 @@
-from rest_framework import pagination
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework import pagination, serializers
+from rest_framework.exceptions import NotFound
+
+from api.conf import ADMIN_ESTIMATED_COUNT_THRESHOLD, RECIPE_ORDERINGS
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для списков админки по большим таблицам.
+
+    Без фильтров на PostgreSQL число строк берется из статистики
+    планировщика (pg_class.reltuples), если оно больше порога:
+    точный COUNT(*) по такой таблице читает ее целиком.
+    """
+
+    def _estimated_count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or queryset.query.where:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+    @cached_property
+    def count(self):
+        estimate = self._estimated_count()
+        if estimate is not None and estimate > ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class KeysetCursorPagination(pagination.CursorPagination):
+    """
+    Курсор по всем полям сортировки, а не только по первому.
+
+    Позиция — значения всех полей сортировки у крайней строки
+    страницы, следующая страница — строки строго после нее
+    в лексикографическом порядке. Последнее поле сортировки должно
+    быть уникальным (id), поэтому совпадения первых полей не нужно
+    добирать через OFFSET, как в ``CursorPagination``.
+    """
+    page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self._decode_position()
+        ordering = (
+            tuple(reverse_order(field) for field in self.ordering)
+            if reverse else self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(after_position(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        if (self.has_previous or self.has_next) and self.template:
+            self.display_page_controls = True
+        return self.page
+
+    def _decode_position(self):
+        if self.cursor is None or self.cursor.position is None:
+            return None
+        try:
+            position = json.loads(self.cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(position, list)
+            or len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            value = (
+                instance[name] if isinstance(instance, dict)
+                else getattr(instance, name)
+            )
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return json.dumps(values)
+
+    def _link(self, instance, reverse):
+        position = (
+            self._get_position_from_instance(instance, self.ordering)
+            if instance is not None else self.cursor.position
+        )
+        return self.encode_cursor(
+            pagination.Cursor(offset=0, reverse=reverse, position=position)
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self._link(self.page[-1] if self.page else None, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self._link(self.page[0] if self.page else None, True)
+
+
+def reverse_order(field: str) -> str:
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+def after_position(ordering, position) -> Q:
+    """
+    Условие «строка идет после позиции» для составной сортировки:
+    (a > x) OR (a = x AND b > y) OR ... с учетом направления полей.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = '__lt' if field.startswith('-') else '__gt'
+        condition |= Q(**equal, **{name + lookup: value})
+        equal[name] = value
+    return condition
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    """
+    Курсор следует сортировке, выбранной параметром ``?ordering``.
+    Сортировка поиска по релевантности курсором не листается:
+    релевантность меняется вместе с содержимым таблицы.
+    """
+    ordering = RECIPE_ORDERINGS['-pub_date']
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(queryset.query.order_by)
+        if not ordering:
+            return self.ordering
+        if ordering not in RECIPE_ORDERINGS.values():
+            raise serializers.ValidationError({
+                'pagination': 'Курсорный режим недоступен для этой '
+                              'сортировки, используйте номера страниц.'
+            })
+        return ordering
+
+
+class FollowCursorPagination(pagination.CursorPagination):
+    page_size_query_param = 'limit'
+    ordering = ('-id', )
+
+
+class FeedCursorPagination(KeysetCursorPagination):
+    """
+    Лента подписок всегда листается курсором: страница читается
+    диапазоном индекса ``(user, -pub_date, -recipe)``.
+    """
+    ordering = ('-pub_date', '-recipe_id')
 
 
 class CustomPagination(pagination.PageNumberPagination):
+    """
+    Постраничная пагинация с опциональным режимом курсора.
+
+    Курсорный режим включается параметром ``?pagination=cursor``:
+    он не выполняет COUNT(*) и OFFSET, поэтому время ответа
+    не зависит от глубины страницы. Готовые списки (не QuerySet)
+    всегда разбиваются на страницы по номеру.
+    """
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    cursor_pagination_class = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        mode = request.query_params.get(self.mode_query_param)
+        if (
+            self.cursor_pagination_class
+            and mode == self.cursor_mode
+            and isinstance(queryset, QuerySet)
+        ):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(CustomPagination):
+    cursor_pagination_class = RecipeCursorPagination
+
+
+class FollowPagination(CustomPagination):
+    cursor_pagination_class = FollowCursorPagination
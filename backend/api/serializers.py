@@ -1,9 +1,13 @@
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
-from api.utils import Base64ImageField, validate_input_value
+from api.utils import (Base64ImageField, ImageDerivativeField,
+                       RecipeImageField, validate_input_value)
+from api.viewer import ViewerListSerializer, ViewerSerializerMixin
 from recipes.models import (Favorite, Ingredient, IngredientAmountForRecipe,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingListTotal, Tag)
+from recipes.tasks import is_same_image, schedule_recipe_image
 from users.serializers import UserDetailSerializer
 
 
@@ -34,36 +38,63 @@ class IngredientAmountForRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipesListSerializer(serializers.ModelSerializer):
+class RecipesListSerializer(ViewerSerializerMixin,
+                            serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     author = UserDetailSerializer()
     ingredients = serializers.SerializerMethodField()
+    image = RecipeImageField()
+    image_thumbnail = ImageDerivativeField()
+    image_medium = ImageDerivativeField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        exclude = ('pub_date', )
+        fields = (
+            'id',
+            'tags',
+            'author',
+            'ingredients',
+            'image',
+            'image_thumbnail',
+            'image_medium',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'text',
+            'cooking_time'
+        )
         read_only_fields = (
             'author', 'ingredients', 'is_favorited', 'is_in_shopping_cart'
         )
+        list_serializer_class = ViewerListSerializer
+
+    def viewer_ids(self, objs):
+        return {
+            'authors': [obj.author_id for obj in objs],
+            'recipes': [obj.id for obj in objs]
+        }
 
     def get_ingredients(self, obj):
         queryset = obj.ingredient_amount.all()
         return IngredientAmountForRecipeSerializer(queryset, many=True).data
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and user.favorite_recipe.filter(recipe=obj).exists()
-        )
+        return self.viewer.is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and user.recipe_in_cart.filter(recipe=obj).exists()
+        return self.viewer.is_in_shopping_cart(obj.id)
+
+
+class RecipeMatchSerializer(RecipesListSerializer):
+    """Рецепт с числом имеющихся и недостающих ингредиентов."""
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipesListSerializer.Meta):
+        fields = RecipesListSerializer.Meta.fields + (
+            'matched_count', 'missing_count'
         )
 
 
@@ -82,27 +113,38 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def _validate_ingredient_ids(self, ingredients):
+        try:
+            ingredient_ids = [int(item.get('id')) for item in ingredients]
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({
+                'Ингредиент': 'Идентификатор ингредиента должен быть числом.'
+            })
+        unique_ingredients_id = set(ingredient_ids)
+        missing_ids = unique_ingredients_id - set(
+            Ingredient.objects.filter(
+                id__in=unique_ingredients_id
+            ).values_list('id', flat=True)
+        )
+        if missing_ids:
+            raise serializers.ValidationError({
+                'Ингредиент': (
+                    'Не существующий ингредиент: {}'.format(min(missing_ids))
+                )
+            })
+        if len(unique_ingredients_id) != len(ingredient_ids):
+            raise serializers.ValidationError({
+                'Ингредиент': (
+                    'Ингредиенты не должны повторяться.'
+                )
+            })
+        return ingredient_ids
+
     def validate(self, attrs):
         ingredients = self.initial_data.get('ingredients')
         validated_ingrediets = []
-        unique_ingredients_id = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('id')
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
-                raise serializers.ValidationError({
-                    'Ингредиент': (
-                        'Не существующий ингредиент: {}'.format(ingredient_id)
-                    )
-                })
-
-            if ingredient_id in unique_ingredients_id:
-                raise serializers.ValidationError({
-                    'Ингредиент': (
-                        'Ингредиенты не должны повторяться.'
-                    )
-                })
-            unique_ingredients_id.append(ingredient_id)
-
+        ingredient_ids = self._validate_ingredient_ids(ingredients)
+        for ingredient_id, ingredient in zip(ingredient_ids, ingredients):
             amount = validate_input_value(
                 int(ingredient.get('amount')),
                 field_name='Ингредиент',
@@ -127,23 +169,80 @@ class RecipeSerializer(serializers.ModelSerializer):
         return attrs
 
     def _set_amount_to_ingredient(self, recipe, ingredients):
-        for ingredient in ingredients:
-            IngredientAmountForRecipe.objects.create(
+        if not ingredients:
+            return
+        IngredientAmountForRecipe.objects.bulk_create(
+            IngredientAmountForRecipe(
                 recipe=recipe,
                 ingredient_id=ingredient.get('id'),
                 amount=ingredient.get('amount')
             )
+            for ingredient in ingredients
+        )
 
     @transaction.atomic
     def create(self, validated_data):
         validated_data['author'] = self.context.get('request').user
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        image = validated_data.pop('image')
+        validated_data['image_status'] = Recipe.ImageStatus.PENDING
         recipe = super().create(validated_data)
         recipe.tags.set(tags)
         self._set_amount_to_ingredient(recipe, ingredients)
+        schedule_recipe_image(recipe, image)
         return recipe
 
+    def _update_tags(self, recipe, tags):
+        current_ids = set(recipe.tags.values_list('id', flat=True))
+        submitted_ids = {tag.id for tag in tags}
+        if current_ids - submitted_ids:
+            recipe.tags.remove(*(current_ids - submitted_ids))
+        if submitted_ids - current_ids:
+            recipe.tags.add(*(submitted_ids - current_ids))
+
+    def _update_amount_to_ingredient(self, recipe, ingredients):
+        """
+        Применяет к количествам ингредиентов только разницу между
+        сохраненным и присланным составом: неизменные строки не трогаются.
+        Возвращает прежние количества по id ингредиента.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in IngredientAmountForRecipe.objects.filter(
+                recipe=recipe
+            )
+        }
+        submitted = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        old_amounts = {
+            ingredient_id: amount.amount
+            for ingredient_id, amount in current.items()
+        }
+
+        removed_ids = current.keys() - submitted.keys()
+        if removed_ids:
+            IngredientAmountForRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed_ids
+            ).delete()
+        self._set_amount_to_ingredient(
+            recipe,
+            [
+                ingredient for ingredient in ingredients
+                if ingredient.get('id') not in current
+            ]
+        )
+        changed = []
+        for ingredient_id in current.keys() & submitted.keys():
+            amount = current[ingredient_id]
+            if amount.amount != submitted[ingredient_id]:
+                amount.amount = submitted[ingredient_id]
+                changed.append(amount)
+        IngredientAmountForRecipe.objects.bulk_update(changed, ('amount', ))
+        return old_amounts
+
     @transaction.atomic
     def update(self, instance, validated_data):
         recipe = instance
@@ -151,25 +250,43 @@ class RecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         if tags:
-            recipe.tags.clear()
-            recipe.tags.set(tags)
+            self._update_tags(recipe, tags)
         if ingredients:
-            recipe.ingredients.clear()
-            self._set_amount_to_ingredient(recipe, ingredients)
+            old_amounts = self._update_amount_to_ingredient(
+                recipe, ingredients
+            )
+            ShoppingListTotal.objects.change_recipe(
+                recipe,
+                old_amounts,
+                {
+                    ingredient.get('id'): ingredient.get('amount')
+                    for ingredient in ingredients
+                }
+            )
+
+        image = validated_data.pop('image', None)
+        if image is not None and not is_same_image(recipe, image):
+            validated_data['image_status'] = Recipe.ImageStatus.PENDING
+            schedule_recipe_image(recipe, image)
 
         return super().update(recipe, validated_data)
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        prefetch_related_objects(
+            [instance], 'tags', 'ingredient_amount__ingredient'
+        )
         return RecipesListSerializer(instance, context=context).data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image = RecipeImageField()
+    image_thumbnail = ImageDerivativeField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumbnail', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -213,9 +330,29 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             )
         return attrs
 
+    def create(self, validated_data):
+        shopping_cart = super().create(validated_data)
+        ShoppingListTotal.objects.add_recipes(
+            shopping_cart.user, [shopping_cart.recipe_id]
+        )
+        return shopping_cart
+
     def to_representation(self, instance):
         request = self.context.get('request')
         return RecipeShortSerializer(
             instance.recipe,
             context={'request': request}
         ).data
+
+
+class ShoppingListSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.ReadOnlyField(source='total_amount')
+
+    class Meta:
+        model = ShoppingListTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
@@ -0,0 +1,117 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token
+from api.cache import bump_catalog_version, bump_recipe_ingredients_version
+from recipes.models import (RECIPE_COUNTERS, RECIPE_MEDIA_FIELDS, Favorite,
+                            FeedItem, Ingredient, IngredientAmountForRecipe,
+                            MediaBlob, Recipe, ShoppingCart, Tag)
+from users.models import Follow, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_catalog(**kwargs):
+    bump_catalog_version()
+
+
+@receiver((post_save, post_delete), sender=IngredientAmountForRecipe)
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_ingredients(update_fields=None, **kwargs):
+    """
+    Составы меняются и через bulk_create без сигналов, поэтому
+    версия сбрасывается при любом сохранении рецепта: сериализатор
+    сохраняет рецепт в той же транзакции, что и его ингредиенты.
+    Частичные сохранения (картинки, счетчики) составы не меняют.
+    """
+    if update_fields is None:
+        bump_recipe_ingredients_version()
+
+
+def recipe_media_names(recipe):
+    """Имена файлов рецепта без загрузки отложенных полей."""
+    names = set()
+    for field in RECIPE_MEDIA_FIELDS:
+        value = recipe.__dict__.get(field)
+        name = getattr(value, 'name', value)
+        if name:
+            names.add(name)
+    return names
+
+
+@receiver(post_init, sender=Recipe)
+def remember_recipe_media(instance, **kwargs):
+    instance._media_names = recipe_media_names(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def count_recipe_media(instance, created, **kwargs):
+    names = recipe_media_names(instance)
+    previous = set() if created else instance._media_names
+    MediaBlob.objects.acquire(names - previous)
+    MediaBlob.objects.release(previous - names)
+    instance._media_names = names
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_media(instance, **kwargs):
+    MediaBlob.objects.release(recipe_media_names(instance))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        FeedItem.objects.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        FeedItem.objects.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(instance, **kwargs):
+    FeedItem.objects.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.change_counter(
+            RECIPE_COUNTERS[sender], [instance.recipe_id], 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, origin=None, **kwargs):
+    """
+    Счетчики удаляемого рецепта не трогаются. Массовые удаления
+    через QuerySet.delete() обновляют счетчики сами, сгруппированно
+    (RecipeRelationQuerySet.delete).
+    """
+    if isinstance(origin, Recipe) or getattr(origin, 'model', None) in (
+        Recipe, sender
+    ):
+        return
+    Recipe.objects.change_counter(
+        RECIPE_COUNTERS[sender], [instance.recipe_id], -1
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, **kwargs):
+    """Смена пароля, is_active и других полей сбрасывает снимок."""
+    for key in Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ):
+        invalidate_token(key)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    """Выход (token/logout) и удаление пользователя удаляют токен."""
+    invalidate_token(instance.key)
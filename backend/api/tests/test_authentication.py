@@ -0,0 +1,160 @@
+import io
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory
+from rest_framework import exceptions, status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.authentication import CachedTokenAuthentication, token_cache_key
+from users.models import User
+
+
+class SharedCacheTestCase(APITestCase):
+    """
+    Тесты с общим кэшем: тестовый LocMemCache живет в одном процессе
+    с тестами, поэтому считается общим.
+    """
+
+    def setUp(self):
+        patcher = mock.patch(
+            'api.authentication.is_shared_cache', return_value=True
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+
+class CachedTokenAuthenticationTests(SharedCacheTestCase):
+    """Класс тестов кэша аутентификации по токену."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def _cached(self):
+        return cache.get(token_cache_key(self.token.key)) is not None
+
+    def test_hit_does_not_query_database(self):
+        """Первый запрос идет в базу, повторный берет снимок из кэша."""
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.token.key)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.username, self.user.username)
+        self.assertEqual(token.key, self.token.key)
+        self.assertTrue(user.is_authenticated)
+
+    def test_local_cache_is_not_used(self):
+        """С кэшем одного процесса каждый запрос проверяется по базе."""
+        with mock.patch(
+            'api.authentication.is_shared_cache', return_value=False
+        ):
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    self.auth.authenticate_credentials(self.token.key)
+        self.assertFalse(self._cached())
+
+    def test_snapshot_has_no_password(self):
+        """Пароль не хранится в кэше и загружается только по запросу."""
+        self.auth.authenticate_credentials(self.token.key)
+        self.assertNotIn(
+            self.user.password, cache.get(token_cache_key(self.token.key))
+        )
+        user, _ = self.auth.authenticate_credentials(self.token.key)
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertTrue(user.check_password('Qwerty_123'))
+
+    def test_unknown_token(self):
+        """Неизвестный токен отклоняется и не попадает в кэш."""
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials('0' * 40)
+        self.assertIsNone(cache.get(token_cache_key('0' * 40)))
+
+    def test_logout_invalidates_cache(self):
+        """После token/logout старый токен больше не принимается."""
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get('http://testserver/api/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self._cached())
+        response = self.client.post('http://testserver/api/auth/token/logout/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(self._cached())
+        response = self.client.get('http://testserver/api/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_changes_invalidate_cache(self):
+        """Смена пароля и данных пользователя сбрасывает снимок."""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.set_password('Qwerty_456')
+        self.user.save()
+        self.assertFalse(self._cached())
+        self.auth.authenticate_credentials(self.token.key)
+        User.objects.get(pk=self.user.pk).save(update_fields=['first_name'])
+        self.assertFalse(self._cached())
+
+    def test_inactive_user_is_rejected(self):
+        """Отключенный пользователь не проходит даже с кэшем."""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+        self.assertFalse(self._cached())
+
+    def test_deleted_user_is_rejected(self):
+        """Удаление пользователя удаляет токен и снимок."""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.delete()
+        self.assertFalse(self._cached())
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+
+class CachedTokenAuthenticationQueriesTests(SharedCacheTestCase):
+    """
+    Аутентификация с кэшем и без него: число запросов к базе.
+    Задержки выводит команда benchmark_auth.
+    """
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        self.token = Token.objects.create(user=user)
+        self.request = RequestFactory().get(
+            '/', HTTP_AUTHORIZATION='Token ' + self.token.key
+        )
+
+    def test_cached_skips_database(self):
+        """Кэш убирает запрос к базе из каждого запроса."""
+        with self.assertNumQueries(1):
+            TokenAuthentication().authenticate(self.request)
+        cached = CachedTokenAuthentication()
+        cached.authenticate(self.request)
+        with self.assertNumQueries(0):
+            cached.authenticate(self.request)
+
+    def test_benchmark_command(self):
+        """Команда замера выводит p50/p99 и ничего не оставляет в базе."""
+        stdout = io.StringIO()
+        call_command('benchmark_auth', '--repeat', '5', stdout=stdout)
+        self.assertEqual(stdout.getvalue().count('p99'), 2)
+        self.assertEqual(User.objects.count(), 1)
@@ -0,0 +1,238 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api.serializers import FavoriteSerializer
+from api.views import RecipeViewSet
+from recipes.models import (Favorite, Ingredient, IngredientAmountForRecipe,
+                            Recipe, ShoppingCart)
+from users.models import User
+
+
+def create_recipes(author, ingredient, count):
+    recipes = [
+        Recipe.objects.create(
+            author=author,
+            image='image.jpg',
+            name='Рецепт {}'.format(number),
+            text='Описание',
+            cooking_time=1
+        )
+        for number in range(count)
+    ]
+    IngredientAmountForRecipe.objects.bulk_create(
+        IngredientAmountForRecipe(
+            recipe=recipe, ingredient=ingredient, amount=10
+        )
+        for recipe in recipes
+    )
+    return recipes
+
+
+def assert_consistent():
+    call_command('reconcile_recipe_counters', '--check', stdout=io.StringIO())
+    call_command('rebuild_shopping_lists', '--check', stdout=io.StringIO())
+
+
+class BatchEndpointsTests(APITestCase):
+    """Класс тестов пакетного добавления в избранное и список покупок."""
+
+    def setUp(self):
+        self.favorite_url = 'http://testserver/api/recipes/favorite/'
+        self.cart_url = 'http://testserver/api/recipes/shopping_cart/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.recipes = create_recipes(self.user, self.ingredient, 20)
+        self.ids = [recipe.id for recipe in self.recipes]
+
+    def _send(self, method, url, recipe_ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {
+            item['id']: item['status'] for item in response.json()['results']
+        }
+
+    def test_batch_favorite(self):
+        """Статусы по каждому id при добавлении и удалении."""
+        missing = 10 ** 6
+        self.assertEqual(
+            self._send('post', self.favorite_url, self.ids[:2]),
+            dict.fromkeys(self.ids[:2], 'added')
+        )
+        self.assertEqual(
+            self._send('post', self.favorite_url, [*self.ids[1:3], missing]),
+            {self.ids[1]: 'exists', self.ids[2]: 'added',
+             missing: 'not_found'}
+        )
+        self.assertEqual(
+            set(self.user.favorite_recipe.values_list('recipe_id', flat=True)),
+            set(self.ids[:3])
+        )
+        self.assertEqual(
+            self._send('delete', self.favorite_url, [*self.ids[2:4], missing]),
+            {self.ids[2]: 'removed', self.ids[3]: 'absent',
+             missing: 'not_found'}
+        )
+        self.assertEqual(Favorite.objects.count(), 2)
+        assert_consistent()
+
+    def test_batch_shopping_cart_totals(self):
+        """Пакетные изменения корзины переносятся в список покупок."""
+        self._send('post', self.cart_url, self.ids[:5])
+        self._send('delete', self.cart_url, self.ids[3:])
+        response = self.client.get(
+            'http://testserver/api/recipes/shopping_list/'
+        )
+        self.assertEqual(response.json()[0]['amount'], 30)
+        self.assertEqual(ShoppingCart.objects.count(), 3)
+        assert_consistent()
+
+    def test_queries_do_not_depend_on_batch_size(self):
+        """Число запросов одинаково для 2 и 20 рецептов."""
+        for url in (self.favorite_url, self.cart_url):
+            queries = {'post': [], 'delete': []}
+            for size in (2, 20):
+                for method in ('post', 'delete'):
+                    with CaptureQueriesContext(connection) as context:
+                        self._send(method, url, self.ids[:size])
+                    queries[method].append(len(context.captured_queries))
+            for method, counts in queries.items():
+                with self.subTest(url=url, method=method):
+                    self.assertEqual(counts[0], counts[1], counts)
+
+    def test_invalid_payload(self):
+        """Неверный список id отклоняется."""
+        for recipe_ids in ([], ['1'], [True], list(range(1, 102)), None):
+            with self.subTest(recipes=recipe_ids):
+                response = self.client.post(
+                    self.favorite_url, {'recipes': recipe_ids}, format='json'
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+
+    def test_single_insert_race(self):
+        """
+        Рецепт, добавленный параллельным запросом после проверки,
+        дает ошибку 400, а не 500.
+        """
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        with mock.patch.object(
+            FavoriteSerializer, 'validate', lambda self, attrs: attrs
+        ):
+            response = self.client.post(
+                'http://testserver/api/recipes/{}/favorite/'
+                .format(self.ids[0])
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Favorite.objects.count(), 1)
+        assert_consistent()
+
+    def test_single_requests_take_user_lock(self):
+        """Одиночные запросы блокируют пользователя, как и пакетные."""
+        for method in ('post', 'delete'):
+            for url in ('favorite', 'shopping_cart'):
+                with self.subTest(method=method, url=url), mock.patch.object(
+                    RecipeViewSet, '_lock_user'
+                ) as lock_user:
+                    getattr(self.client, method)(
+                        'http://testserver/api/recipes/{}/{}/'
+                        .format(self.ids[0], url)
+                    )
+                    lock_user.assert_called_once_with(self.user)
+        assert_consistent()
+
+    def test_anonymous(self):
+        """Аноним не может пользоваться пакетными запросами."""
+        self.client.credentials()
+        response = self.client.post(
+            self.cart_url, {'recipes': self.ids[:1]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class BatchConcurrencyTests(TransactionTestCase):
+    """
+    Класс стресс-теста параллельных пакетных запросов. Тестовая
+    SQLite лежит в файле, а транзакции ждут блокировку базы
+    (см. foodgram.sqlite3), поэтому тест идет и без PostgreSQL.
+    """
+    threads = 8
+    rounds = 5
+
+    def setUp(self):
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        self.token = Token.objects.create(user=self.user).key
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.ids = [
+            recipe.id for recipe in create_recipes(self.user, ingredient, 10)
+        ]
+
+    def _worker(self, number):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + self.token)
+        statuses = []
+        try:
+            for position in range(self.rounds):
+                method = 'post' if (number + position) % 3 else 'delete'
+                for url in ('favorite', 'shopping_cart'):
+                    response = getattr(client, method)(
+                        'http://testserver/api/recipes/{}/'.format(url),
+                        {'recipes': self.ids[number % 3:]},
+                        format='json'
+                    )
+                    statuses.append(response.status_code)
+                for url in ('favorite', 'shopping_cart'):
+                    response = getattr(client, method)(
+                        'http://testserver/api/recipes/{}/{}/'
+                        .format(self.ids[-1], url)
+                    )
+                    statuses.append(response.status_code)
+        finally:
+            connections.close_all()
+        return statuses
+
+    def test_parallel_requests_keep_data_consistent(self):
+        """
+        Параллельные пакетные и одиночные запросы к одним и тем же
+        строкам не падают с 500 и не сбивают счетчики и суммы.
+        """
+        with ThreadPoolExecutor(self.threads) as executor:
+            statuses = [
+                code
+                for codes in executor.map(self._worker, range(self.threads))
+                for code in codes
+            ]
+        self.assertTrue(statuses)
+        self.assertFalse(
+            [code for code in statuses if code >= 500], statuses
+        )
+        assert_consistent()
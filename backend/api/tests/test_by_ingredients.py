@@ -0,0 +1,176 @@
+import time
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.cache import get_recipe_ingredients_version
+from api.conf import RECIPE_INGREDIENT_INDEX_REBUILD_INTERVAL
+from api.indexes import RecipeIngredientIndex, recipe_ingredient_index
+from recipes.models import Ingredient, IngredientAmountForRecipe, Recipe
+from users.models import User
+
+
+class RecipesByIngredientsTests(APITestCase):
+    """Класс тестов поиска рецептов по имеющимся продуктам."""
+
+    def setUp(self):
+        cache.clear()
+        self.url = 'http://testserver/api/recipes/by-ingredients/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name='ингредиент {}'.format(number),
+                       measurement_unit='г')
+            for number in range(6)
+        )
+        self.recipes = {}
+        for name, numbers in (
+            ('омлет', (0, 1)),
+            ('яичница', (0, )),
+            ('салат', (2, 3, 4)),
+            ('пирог', (0, 1, 3, 4, 5)),
+        ):
+            self._create_recipe(name, numbers)
+
+    def _create_recipe(self, name, numbers):
+        recipe = Recipe.objects.create(
+            author=self.user,
+            image='image.jpg',
+            name=name,
+            text='описание',
+            cooking_time=10
+        )
+        for number in numbers:
+            IngredientAmountForRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredients[number], amount=1
+            )
+        self.recipes[name] = recipe
+
+    def _search(self, numbers, **params):
+        have = ','.join(str(self.ingredients[number].id) for number in numbers)
+        response = self.client.get(self.url, {'have': have, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            (item['name'], item['matched_count'], item['missing_count'])
+            for item in response.json()['results']
+        ]
+
+    def test_ranked_by_share_of_available_ingredients(self):
+        """Сначала идут рецепты, для которых есть больше продуктов."""
+        self.assertEqual(
+            self._search((0, 1)),
+            [('омлет', 2, 0), ('яичница', 1, 0)]
+        )
+        self.assertEqual(
+            self._search((0, 1), max_missing=3),
+            [('омлет', 2, 0), ('яичница', 1, 0), ('пирог', 2, 3)]
+        )
+
+    def test_matches_brute_force(self):
+        """Результаты совпадают с подсчетом через базу данных."""
+        have = {self.ingredients[number].id for number in (0, 3, 4)}
+        expected = set()
+        for recipe in Recipe.objects.all():
+            ingredient_ids = set(
+                recipe.ingredient_amount.values_list(
+                    'ingredient_id', flat=True
+                )
+            )
+            matched = len(ingredient_ids & have)
+            missing = len(ingredient_ids) - matched
+            if matched and missing <= 2:
+                expected.add((recipe.name, matched, missing))
+        self.assertEqual(set(self._search((0, 3, 4))), expected)
+
+    @mock.patch('api.indexes.RECIPE_INGREDIENT_INDEX_REBUILD_INTERVAL', 0)
+    def test_index_follows_changes(self):
+        """Новые и удаленные рецепты учитываются после перестроения."""
+        self._create_recipe('сырники', (5, ))
+        self.assertEqual(self._search((5, )), [('сырники', 1, 0)])
+        self.recipes['сырники'].delete()
+        self.assertEqual(self._search((5, )), [])
+
+    def test_rebuilds_are_rate_limited(self):
+        """Индекс перестраивается не чаще интервала, пока отдается старый."""
+        stale = [('пирог', 1, 4)]
+        self.assertEqual(self._search((5, ), max_missing=5), stale)
+        self._create_recipe('сырники', (5, ))
+        with mock.patch('api.indexes.RecipeIngredientIndex._build') as build:
+            self.assertEqual(self._search((5, ), max_missing=5), stale)
+        build.assert_not_called()
+        later = time.monotonic() + RECIPE_INGREDIENT_INDEX_REBUILD_INTERVAL
+        with mock.patch('api.indexes.time.monotonic', return_value=later):
+            with recipe_ingredient_index._lock:
+                self.assertEqual(self._search((5, ), max_missing=5), stale)
+            self.assertEqual(
+                self._search((5, ), max_missing=5),
+                [('сырники', 1, 0), *stale]
+            )
+
+    def test_invalid_parameters(self):
+        """Некорректные параметры отклоняются."""
+        for params in ({}, {'have': 'a,b'},
+                       {'have': '1', 'max_missing': '-1'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(
+                    response.status_code, status.HTTP_400_BAD_REQUEST
+                )
+
+    def test_pagination(self):
+        """Результаты разбиваются на страницы."""
+        response = self.client.get(self.url, {
+            'have': str(self.ingredients[0].id), 'max_missing': 5,
+            'limit': 2
+        })
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+
+    def test_search_over_100k_recipes(self):
+        """
+        Поиск по 100 000 рецептов читает только списки рецептов
+        с нужными ингредиентами и не обращается к базе.
+        """
+        generator = np.random.default_rng(0)
+        recipes_count, ingredients_count = 100_000, 2000
+        sizes = generator.integers(3, 15, recipes_count)
+        positions = np.repeat(np.arange(recipes_count), sizes)
+        ingredient_ids = generator.integers(
+            1, ingredients_count, len(positions)
+        )
+        order = np.lexsort((positions, ingredient_ids))
+        keys, starts = np.unique(ingredient_ids[order], return_index=True)
+        offsets = np.append(starts, len(order))
+        index = RecipeIngredientIndex()
+        index._data = (
+            get_recipe_ingredients_version(),
+            np.arange(1, recipes_count + 1),
+            np.bincount(positions, minlength=recipes_count),
+            keys,
+            offsets,
+            positions[order].astype(np.int32)
+        )
+        have = generator.integers(1, ingredients_count, 30)
+        found = np.searchsorted(keys, np.unique(have))
+        expected = int(np.sum(offsets[found + 1] - offsets[found]))
+        with mock.patch('api.indexes.np.concatenate',
+                        wraps=np.concatenate) as concatenate, \
+                self.assertNumQueries(0):
+            results = index.search(have.tolist(), 2)
+        scanned = sum(len(part) for part in concatenate.call_args.args[0])
+        self.assertEqual(scanned, expected)
+        self.assertLess(scanned, len(order) // 20)
+        self.assertTrue(results)
+
+    def tearDown(self):
+        recipe_ingredient_index.invalidate()
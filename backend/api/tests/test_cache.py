@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.cache import get_catalog_version
+from api.checks import check_shared_cache
+from recipes.models import Ingredient, Tag
+
+
+class CatalogCacheTests(APITestCase):
+    """Класс тестов кэширования каталога тегов и ингредиентов."""
+
+    def setUp(self):
+        cache.clear()
+        self.tag_url = 'http://testserver/api/tags/'
+        self.ingredient_url = 'http://testserver/api/ingredients/'
+        self.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        Ingredient.objects.create(name='Капуста', measurement_unit='кг')
+
+    def test_not_modified_without_queries(self):
+        """Совпадающий If-None-Match дает 304 без запросов к БД."""
+        for url in (self.tag_url, self.ingredient_url):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, status.HTTP_304_NOT_MODIFIED
+                )
+                self.assertEqual(response['ETag'], etag)
+
+    def test_cached_body_without_queries(self):
+        """Повторный запрос отдается из кэша без запросов к БД."""
+        first = self.client.get(self.tag_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.tag_url)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+
+    def test_change_bumps_version(self):
+        """Изменение тега меняет версию каталога и ETag."""
+        version = get_catalog_version()
+        etag = self.client.get(self.tag_url)['ETag']
+        self.tag.name = 'поздний завтрак'
+        self.tag.save()
+        self.assertNotEqual(get_catalog_version(), version)
+        response = self.client.get(self.tag_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['name'], 'поздний завтрак')
+
+    def test_version_survives_eviction(self):
+        """После вытеснения версии из кэша старые ответы не отдаются."""
+        etag = self.client.get(self.tag_url)['ETag']
+        cache.delete('catalog:version')
+        Tag.objects.filter(pk=self.tag.pk).update(name='ужин')
+        response = self.client.get(self.tag_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['name'], 'ужин')
+
+    def test_missing_object_is_not_cached(self):
+        """Ответ 404 не кэшируется."""
+        url = '{}{}/'.format(self.tag_url, self.tag.id + 1)
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+        )
+        Tag.objects.create(
+            id=self.tag.id + 1, name='обед', color='#49B64E', slug='lunch'
+        )
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_deploy_check_requires_shared_cache(self):
+        """Проверка деплоя предупреждает о LocMemCache."""
+        self.assertEqual(
+            [warning.id for warning in check_shared_cache(None)],
+            ['api.W001']
+        )
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }}):
+            self.assertEqual(check_shared_cache(None), [])
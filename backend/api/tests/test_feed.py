@@ -0,0 +1,151 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import FeedItem, Recipe
+from users.models import Follow, User
+
+
+class FeedTests(APITestCase):
+    """Класс тестов ленты подписок."""
+
+    def setUp(self):
+        self.feed_url = 'http://testserver/api/recipes/feed/'
+        self.user = self._create_user('vasya.pupkin')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.authors = [
+            self._create_user('author{}'.format(number))
+            for number in range(3)
+        ]
+
+    def _create_user(self, username):
+        return User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username=username,
+            email='{}@yandex.ru'.format(username),
+            password='Qwerty_123'
+        )
+
+    def _create_recipe(self, author, name='Рецепт'):
+        return Recipe.objects.create(
+            author=author,
+            image='image.jpg',
+            name=name,
+            text='Описание',
+            cooking_time=1
+        )
+
+    def _feed_names(self, **params):
+        response = self.client.get(self.feed_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def _subscribe_url(self, author):
+        return 'http://testserver/api/users/{}/subscribe/'.format(author.id)
+
+    def test_feed_requires_authentication(self):
+        """Анонимный пользователь не получает ленту."""
+        self.client.credentials()
+        response = self.client.get(self.feed_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_new_recipe_is_fanned_out_to_followers(self):
+        """Новый рецепт попадает только в ленты подписчиков автора."""
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        self._create_recipe(self.authors[0], 'Подписка')
+        self._create_recipe(self.authors[1], 'Чужой')
+        self.assertEqual(self._feed_names(), ['Подписка'])
+
+    def test_follow_backfills_and_unfollow_clears(self):
+        """Подписка переносит в ленту рецепты автора, отписка убирает их."""
+        self._create_recipe(self.authors[0], 'Первый')
+        self._create_recipe(self.authors[0], 'Второй')
+        self._create_recipe(self.authors[1], 'Третий')
+        response = self.client.post(self._subscribe_url(self.authors[0]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.post(self._subscribe_url(self.authors[1]))
+        self.assertEqual(
+            self._feed_names(), ['Третий', 'Второй', 'Первый']
+        )
+        response = self.client.delete(self._subscribe_url(self.authors[0]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._feed_names(), ['Третий'])
+
+    def test_deleted_recipe_leaves_feed(self):
+        """Удаленный рецепт пропадает из лент."""
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        recipe = self._create_recipe(self.authors[0])
+        recipe.delete()
+        self.assertEqual(self._feed_names(), [])
+        self.assertFalse(FeedItem.objects.exists())
+
+    def test_keyset_pagination(self):
+        """Лента листается курсором без пропусков и повторов."""
+        for author in self.authors:
+            Follow.objects.create(user=self.user, author=author)
+        for number in range(7):
+            self._create_recipe(
+                self.authors[number % 3], 'Рецепт {}'.format(number)
+            )
+        names = []
+        url, params = self.feed_url, {'limit': 3}
+        while url:
+            response = self.client.get(url, params)
+            data = response.json()
+            names.extend(recipe['name'] for recipe in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(
+            names, ['Рецепт {}'.format(number) for number in range(6, -1, -1)]
+        )
+
+    def test_queries_do_not_depend_on_follows(self):
+        """
+        Страница ленты — один запрос к индексу ленты плюс загрузка
+        рецептов при любом числе подписок.
+        """
+        authors = [
+            self._create_user('writer{}'.format(number))
+            for number in range(50)
+        ]
+        queries = {}
+        for count in (1, 50):
+            for author in authors[:count]:
+                Follow.objects.get_or_create(user=self.user, author=author)
+                self._create_recipe(author)
+            with CaptureQueriesContext(connection) as context:
+                self._feed_names(limit=6)
+            queries[count] = len(context.captured_queries)
+        self.assertEqual(queries[1], queries[50], queries)
+        feed_query = next(
+            query['sql'] for query in context.captured_queries
+            if 'recipes_feeditem' in query['sql']
+        )
+        self.assertNotIn('users_follow', feed_query)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + feed_query)
+                plan = ' '.join(str(row[-1]) for row in cursor)
+            self.assertIn('feed_item_user_date_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_rebuild_feeds(self):
+        """Команда rebuild_feeds восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        Follow.objects.create(user=self.authors[1], author=self.authors[0])
+        for number in range(3):
+            self._create_recipe(self.authors[0], 'Рецепт {}'.format(number))
+        expected = set(FeedItem.objects.values_list('user_id', 'recipe_id'))
+        FeedItem.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(
+            set(FeedItem.objects.values_list('user_id', 'recipe_id')),
+            expected
+        )
+        self.assertEqual(len(expected), 6)
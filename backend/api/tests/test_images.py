@@ -0,0 +1,290 @@
+import base64
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from api.conf import (IMAGE_MAX_SIZE, IMAGE_MEDIUM_WIDTH,
+                      IMAGE_THUMBNAIL_WIDTH)
+from api.utils import Base64ImageField
+from recipes.images import make_image_derivatives
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.storage import content_addressed_storage
+from users.models import User
+
+
+def make_image(size, format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, '#E26C2D').save(buffer, format=format)
+    return 'data:image/{};base64,{}'.format(
+        format.lower(), base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), RECIPE_IMAGE_WORKERS=0)
+class RecipeImageTests(APITestCase):
+    """Класс тестов загрузки картинок рецептов."""
+
+    def setUp(self):
+        self.recipe_url = 'http://testserver/api/recipes/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def _create(self, image, process=True):
+        with self.captureOnCommitCallbacks(execute=process):
+            return self.client.post(
+                self.recipe_url,
+                {
+                    'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+                    'tags': [self.tag.id],
+                    'image': image,
+                    'name': 'рецепт',
+                    'text': 'описание',
+                    'cooking_time': 5
+                },
+                format='json'
+            )
+
+    def test_decoder_streams_into_spooled_file(self):
+        """Base64 декодируется частями во временный файл."""
+        image = make_image((64, 48), 'PNG')
+        file = Base64ImageField()._decode(image)
+        self.assertEqual(file.name, 'temp.png')
+        self.assertEqual(file.size, len(base64.b64decode(
+            image.split(',', 1)[1]
+        )))
+        self.assertIsInstance(file.file, tempfile.SpooledTemporaryFile)
+
+    def test_line_breaks_are_skipped(self):
+        """Base64 с переводами строк (MIME) декодируется целиком."""
+        image = make_image((64, 48), 'PNG')
+        header, encoded = image.split(',', 1)
+        wrapped = '\r\n'.join(
+            encoded[position:position + 76]
+            for position in range(0, len(encoded), 76)
+        )
+        with mock.patch('api.utils.IMAGE_DECODE_CHUNK_SIZE', 50):
+            file = Base64ImageField()._decode(header + ',' + wrapped)
+        self.assertEqual(file.read(), base64.b64decode(encoded))
+        response = self._create(header + ',' + wrapped)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_declared_size_is_rejected_before_decoding(self):
+        """Слишком длинная строка base64 отклоняется без декодирования."""
+        image = 'data:image/png;base64,' + 'A' * (IMAGE_MAX_SIZE * 4 // 3 + 8)
+        with mock.patch('api.utils.base64.b64decode') as b64decode:
+            response = self._create(image)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.json())
+        b64decode.assert_not_called()
+
+    def test_pixel_count_limit(self):
+        """Картинка с большим числом пикселей отклоняется."""
+        with mock.patch('api.utils.IMAGE_MAX_PIXELS', 100 * 100):
+            response = self._create(make_image((200, 100)))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_invalid_base64(self):
+        """Строка не в base64 отклоняется."""
+        response = self._create('data:image/png;base64,не картинка')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_derivatives_are_created(self):
+        """При сохранении создаются миниатюра и картинка среднего размера."""
+        response = self._create(make_image((1200, 800)))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = self.client.get(
+            '{}{}/'.format(self.recipe_url, response.json()['id'])
+        ).json()
+        recipe = Recipe.objects.get(pk=data['id'])
+        for field, width in (('image_thumbnail', IMAGE_THUMBNAIL_WIDTH),
+                             ('image_medium', IMAGE_MEDIUM_WIDTH)):
+            with self.subTest(field=field):
+                with getattr(recipe, field).open('rb') as fin:
+                    image = Image.open(fin)
+                    self.assertEqual(image.format, 'WEBP')
+                    self.assertEqual(image.size, (width, width * 2 // 3))
+                self.assertTrue(data[field].endswith(
+                    getattr(recipe, field).url
+                ))
+        self.assertLess(recipe.image_thumbnail.size, recipe.image.size)
+
+    def test_short_serializer_exposes_thumbnail(self):
+        """Краткое представление рецепта отдает миниатюру."""
+        recipe_id = self._create(make_image((400, 400))).json()['id']
+        response = self.client.post(
+            '{}{}/favorite/'.format(self.recipe_url, recipe_id)
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('thumbnails/', response.json()['image_thumbnail'])
+
+    def test_image_is_processed_after_response(self):
+        """Рецепт возвращается сразу, картинка обрабатывается после."""
+        files = set(content_addressed_storage.iter_blobs())
+        response = self._create(make_image((1200, 800)), process=False)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(
+            Recipe.objects.get(pk=data['id']).image_status, 'pending'
+        )
+        self.assertTrue(data['image'].endswith('recipes/placeholder.svg'))
+        self.assertEqual(data['image_thumbnail'], data['image'])
+        self.assertEqual(set(content_addressed_storage.iter_blobs()), files)
+
+        recipe = Recipe.objects.get(pk=data['id'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                '{}{}/'.format(self.recipe_url, recipe.id),
+                {'name': 'рецепт', 'text': 'описание', 'cooking_time': 5,
+                 'image': make_image((1200, 800)),
+                 'tags': [self.tag.id],
+                 'ingredients': [{'id': self.ingredient.id, 'amount': 1}]},
+                format='json'
+            )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, 'ready')
+        self.assertTrue(recipe.image and recipe.image_thumbnail)
+
+    def test_failed_processing_is_reported(self):
+        """Ошибка обработки отмечается в статусе картинки."""
+        with mock.patch('recipes.tasks.make_image_derivatives',
+                        side_effect=OSError), \
+                self.assertLogs('recipes.tasks', 'ERROR'):
+            response = self._create(make_image((100, 100)))
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.image_status, 'failed')
+
+    def test_pending_images_are_recovered(self):
+        """Картинки, не обработанные до перезапуска, обрабатывает команда."""
+        response = self._create(make_image((300, 200)), process=False)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        upload = recipe.image_upload.name
+        self.assertTrue(default_storage.exists(upload))
+        lost = Recipe.objects.create(
+            author=self.user, name='импорт', text='описание',
+            cooking_time=1, image_status=Recipe.ImageStatus.PENDING
+        )
+        call_command('process_pending_images', '--grace', '0',
+                     stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertTrue(recipe.image and recipe.image_thumbnail)
+        self.assertEqual(recipe.image_upload.name, '')
+        self.assertFalse(default_storage.exists(upload))
+        lost.refresh_from_db()
+        self.assertEqual(lost.image_status, Recipe.ImageStatus.FAILED)
+
+    def test_outdated_upload_is_discarded(self):
+        """Старая картинка, обработанная последней, не заменяет новую."""
+        recipe_id = self._create(make_image((100, 100))).json()['id']
+        callbacks, uploads = [], []
+        for size in ((300, 200), (500, 300)):
+            with self.captureOnCommitCallbacks() as captured:
+                self.client.patch(
+                    '{}{}/'.format(self.recipe_url, recipe_id),
+                    {'name': 'рецепт', 'text': 'описание', 'cooking_time': 5,
+                     'image': make_image(size),
+                     'tags': [self.tag.id],
+                     'ingredients': [{'id': self.ingredient.id,
+                                      'amount': 1}]},
+                    format='json'
+                )
+            callbacks.append(captured[0])
+            uploads.append(Recipe.objects.get(pk=recipe_id).image_upload.name)
+        for callback in reversed(callbacks):
+            callback()
+        recipe = Recipe.objects.get(pk=recipe_id)
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+        with Image.open(recipe.image) as image:
+            self.assertEqual(image.size, (500, 300))
+        for upload in uploads:
+            self.assertFalse(default_storage.exists(upload))
+
+    def test_request_does_not_process_image(self):
+        """Запрос не обрабатывает картинку, это делает отложенная задача."""
+        with mock.patch('recipes.tasks.make_image_derivatives',
+                        wraps=make_image_derivatives) as derivatives:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self._create(make_image((1200, 800)),
+                                        process=False)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            derivatives.assert_not_called()
+            for callback in callbacks:
+                callback()
+        derivatives.assert_called_once()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), RECIPE_IMAGE_WORKERS=2)
+class RecipeImageWorkerTests(APITransactionTestCase):
+    """Класс тестов обработки картинок в пуле потоков."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_worker_processes_image(self):
+        """Картинка сохраняется потоком пула после ответа."""
+        user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        tag = Tag.objects.create(name='завтрак', color='#E26C2D', slug='b')
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        response = self.client.post(
+            'http://testserver/api/recipes/',
+            {
+                'ingredients': [{'id': ingredient.id, 'amount': 1}],
+                'tags': [tag.id],
+                'image': make_image((800, 600)),
+                'name': 'рецепт',
+                'text': 'описание',
+                'cooking_time': 5
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        deadline = time.monotonic() + 10
+        while (recipe.image_status == Recipe.ImageStatus.PENDING
+               and time.monotonic() < deadline):
+            time.sleep(0.05)
+            recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertTrue(recipe.image_thumbnail)
@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.indexes import TrigramIndex, ingredient_index, trigram_index
+from recipes.models import Ingredient
+
+
+class IngredientAutocompleteTests(APITestCase):
+    """Класс тестов автодополнения ингредиентов."""
+
+    def setUp(self):
+        cache.clear()
+        self.ingredient_url = 'http://testserver/api/ingredients/'
+        for name in ('Морковь', 'морковь по-корейски', 'сок морковный',
+                     'ёрш', 'капуста'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        ingredient_index.invalidate()
+
+    def _names(self, **params):
+        response = self.client.get(self.ingredient_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.json()]
+
+    def test_prefix_before_substring(self):
+        """Совпадения по префиксу идут раньше совпадений по подстроке."""
+        self.assertEqual(
+            self._names(name='МОРКОВ'),
+            ['Морковь', 'морковь по-корейски', 'сок морковный']
+        )
+
+    def test_limit(self):
+        """Параметр limit ограничивает количество подсказок."""
+        self.assertEqual(self._names(name='морков', limit=1), ['Морковь'])
+        response = self.client.get(
+            self.ingredient_url, {'name': 'морков', 'limit': 'abc'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_yo_is_folded(self):
+        """Буквы ё и е не различаются."""
+        self.assertEqual(self._names(name='ерш'), ['ёрш'])
+
+    def test_index_follows_changes(self):
+        """Индекс перестраивается после сохранения и удаления."""
+        self.assertEqual(self._names(name='кап'), ['капуста'])
+        ingredient = Ingredient.objects.create(
+            name='каперсы', measurement_unit='г'
+        )
+        self.assertEqual(self._names(name='кап'), ['каперсы', 'капуста'])
+        ingredient.delete()
+        self.assertEqual(self._names(name='кап'), ['капуста'])
+
+
+@override_settings(INGREDIENT_TRIGRAM_INDEX_PATH=os.path.join(
+    tempfile.mkdtemp(), 'ingredients.trigrams'
+))
+class IngredientFuzzySearchTests(APITestCase):
+    """Класс тестов нечеткого поиска ингредиентов по триграммам."""
+
+    def setUp(self):
+        cache.clear()
+        self.ingredient_url = 'http://testserver/api/ingredients/'
+        for name in ('морковь', 'помидоры', 'помидоры черри', 'капуста',
+                     'картофель'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        trigram_index.invalidate()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(
+            os.path.dirname(settings.INGREDIENT_TRIGRAM_INDEX_PATH),
+            ignore_errors=True
+        )
+        super().tearDownClass()
+
+    def _names(self, **params):
+        response = self.client.get(
+            self.ingredient_url, {'fuzzy': 'true', **params}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.json()]
+
+    def test_fuzzy_search_tolerates_typos(self):
+        """Опечатки и недописанные слова находят нужный ингредиент."""
+        self.assertEqual(self._names(name='морков')[0], 'морковь')
+        self.assertEqual(self._names(name='помидор')[0], 'помидоры')
+        self.assertEqual(self._names(name='картошель')[0], 'картофель')
+
+    def test_fuzzy_search_limit(self):
+        """Количество результатов ограничивается параметром limit."""
+        self.assertEqual(len(self._names(name='помидоры', limit=1)), 1)
+
+    def test_index_file_round_trip(self):
+        """Файл индекса открывается через mmap и дает те же результаты."""
+        self._names(name='капуста')
+        self.assertTrue(
+            os.path.exists(settings.INGREDIENT_TRIGRAM_INDEX_PATH)
+        )
+        index = TrigramIndex()
+        cabbage = Ingredient.objects.get(name='капуста')
+        self.assertEqual(index.search('капуста', limit=1), [cabbage.id])
+
+    def test_concurrent_writes(self):
+        """
+        Одновременные пересборки не портят файл и не оставляют
+        временных файлов.
+        """
+        path = settings.INGREDIENT_TRIGRAM_INDEX_PATH
+        rows = TrigramIndex.rows()
+        content = TrigramIndex.dumps(rows, TrigramIndex.checksum(rows))
+        index = TrigramIndex()
+        with mock.patch.object(TrigramIndex, 'dumps', return_value=content):
+            with ThreadPoolExecutor(8) as executor:
+                sizes = list(executor.map(
+                    lambda _: index.write(rows), range(64)
+                ))
+        self.assertEqual(set(sizes), {len(content)})
+        with open(path, 'rb') as fin:
+            self.assertEqual(fin.read(), content)
+        self.assertEqual(
+            os.listdir(os.path.dirname(path)), [os.path.basename(path)]
+        )
+
+    def test_truncated_file_is_rebuilt(self):
+        """Обрезанный файл не открывается и пересобирается при поиске."""
+        self._names(name='капуста')
+        path = settings.INGREDIENT_TRIGRAM_INDEX_PATH
+        with open(path, 'rb') as fin:
+            content = fin.read()
+        for size in (0, 10, len(content) - 4):
+            with self.subTest(size=size):
+                with open(path, 'wb') as fout:
+                    fout.write(content[:size])
+                index = TrigramIndex()
+                self.assertFalse(index.load())
+                cabbage = Ingredient.objects.get(name='капуста')
+                self.assertEqual(
+                    index.search('капуста', limit=1), [cabbage.id]
+                )
+
+    def test_index_follows_changes(self):
+        """Новый ингредиент попадает в индекс после сохранения."""
+        self._names(name='капуста')
+        Ingredient.objects.create(name='кабачки', measurement_unit='г')
+        self.assertEqual(self._names(name='кабачок')[0], 'кабачки')
+        Ingredient.objects.filter(name='кабачки').update(name='баклажаны')
+        trigram_index.invalidate()
+        self.assertEqual(self._names(name='баклажан')[0], 'баклажаны')
+
+    def test_file_is_stable_across_catalog_versions(self):
+        """
+        Воркеры с разными версиями каталога (LocMemCache) не
+        пересобирают файл, если данные не менялись.
+        """
+        self._names(name='капуста')
+        path = settings.INGREDIENT_TRIGRAM_INDEX_PATH
+        mtime = os.stat(path).st_mtime_ns
+        workers = [TrigramIndex() for _ in range(4)]
+        with mock.patch('api.indexes.get_catalog_version',
+                        side_effect=lambda: uuid.uuid4().hex), \
+                mock.patch.object(TrigramIndex, 'write') as write:
+            for index in workers * 3:
+                self.assertTrue(index.search('капуста', limit=1))
+        write.assert_not_called()
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+
+class IngredientAutocompleteBenchmarkTests(APITestCase):
+    """Сравнение индекса в памяти с поиском по регулярному выражению."""
+    queries = ('м', 'мор', 'морковь', 'сок', 'масло', 'перец', 'ябл')
+
+    @classmethod
+    def setUpTestData(cls):
+        path = os.path.join(settings.BASE_DIR, 'static', 'data',
+                            'ingredients.json')
+        with open(path, 'rb') as fin:
+            Ingredient.objects.bulk_create(
+                Ingredient(**entry) for entry in json.load(fin)
+            )
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def test_warm_index_skips_database(self):
+        """Прогретый индекс отвечает без запросов к базе."""
+        ingredient_index.search('')
+        with self.assertNumQueries(0):
+            for query in self.queries:
+                self.assertTrue(ingredient_index.search(query))
+
+    def test_index_finds_regex_matches(self):
+        """Индекс находит те же ингредиенты, что и iregex."""
+        for query in self.queries:
+            with self.subTest(query=query):
+                expected = set(
+                    Ingredient.objects.filter(name__iregex=query)
+                    .values_list('id', flat=True)
+                )
+                found = {item['id'] for item in ingredient_index.search(query)}
+                self.assertEqual(found, expected)
@@ -0,0 +1,171 @@
+import json
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.conf import DUPLICATE_QUERY_THRESHOLD
+from api.middleware import RequestTiming
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from users.models import Follow, User
+
+
+def parse_server_timing(header):
+    """Заголовок Server-Timing в виде {метрика: {параметр: значение}}."""
+    metrics = {}
+    for metric in header.split(', '):
+        name, *params = metric.split(';')
+        metrics[name] = dict(
+            param.split('=', 1) for param in params
+        )
+    return metrics
+
+
+@override_settings(SERVER_TIMING=True)
+class ServerTimingMiddlewareTests(APITestCase):
+    """Класс тестов замеров запроса в Server-Timing и логе."""
+
+    def setUp(self):
+        self.recipe_list_url = 'http://testserver/api/recipes/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        for number in range(10):
+            author = User.objects.create(
+                first_name='Петя',
+                last_name='Петров',
+                username='author{}'.format(number),
+                email='author{}@yandex.ru'.format(number),
+                password='Qwerty_123'
+            )
+            recipe = Recipe.objects.create(
+                author=author,
+                image='image.jpg',
+                name='Рецепт {}'.format(number),
+                text='Описание',
+                cooking_time=1
+            )
+            recipe.tags.add(tag)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            Follow.objects.create(user=self.user, author=author)
+
+    def _get(self, url, **params):
+        with self.assertLogs('api.middleware', 'INFO') as logs:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, logs.records
+
+    def test_header(self):
+        """Заголовок содержит фазы, число запросов и размер ответа."""
+        with CaptureQueriesContext(connection) as context:
+            response, _ = self._get(self.recipe_list_url)
+        metrics = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(
+            set(metrics), {'total', 'db', 'view', 'app', 'render', 'size'}
+        )
+        for name in ('total', 'db', 'view', 'app', 'render'):
+            self.assertGreaterEqual(float(metrics[name]['dur']), 0)
+        self.assertGreater(float(metrics['view']['dur']), 0)
+        self.assertGreaterEqual(
+            float(metrics['total']['dur']), float(metrics['view']['dur'])
+        )
+        self.assertEqual(
+            metrics['db']['desc'],
+            '"{} queries"'.format(len(context.captured_queries))
+        )
+        self.assertEqual(
+            metrics['size']['desc'],
+            '"{} bytes"'.format(len(response.content))
+        )
+
+    def test_structured_log(self):
+        """Строка лога — JSON с теми же замерами."""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        response, records = self._get(self.recipe_list_url, limit=10)
+        self.assertEqual(len(records), 1)
+        record = records[0].server_timing
+        self.assertEqual(
+            json.loads(records[0].getMessage().split(' ', 1)[1]), record
+        )
+        self.assertEqual(record['method'], 'GET')
+        self.assertEqual(record['path'], '/api/recipes/')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['size'], len(response.content))
+        self.assertGreater(record['queries'], 0)
+        for name in ('total', 'db', 'view', 'app', 'render'):
+            self.assertIn(name + '_ms', record)
+
+    def test_serializers_have_no_n_plus_one(self):
+        """Списки API не повторяют одинаковые запросы для каждой строки."""
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        for url in (self.recipe_list_url,
+                    'http://testserver/api/users/',
+                    'http://testserver/api/users/subscriptions/'):
+            with self.subTest(url=url):
+                _, records = self._get(url, limit=10)
+                self.assertEqual(
+                    [record.getMessage() for record in records
+                     if hasattr(record, 'n_plus_one')],
+                    []
+                )
+
+    def test_streaming_response(self):
+        """
+        Потоковый ответ уходит без заголовка, а в лог после отправки
+        попадают и запросы, выполненные при выдаче тела.
+        """
+        recipe = Recipe.objects.get(name='Рецепт 0')
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        with CaptureQueriesContext(connection) as context, \
+                self.assertLogs('api.middleware', 'INFO') as logs:
+            response = self.client.get(
+                'http://testserver/api/recipes/download_shopping_cart/'
+            )
+            self.assertNotIn('Server-Timing', response)
+            self.assertEqual(logs.records, [])
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        record = logs.records[0].server_timing
+        self.assertEqual(record['queries'], len(context.captured_queries))
+        self.assertEqual(record['size'], len(content))
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        """Без настройки middleware не подключается."""
+        response = self.client.get(self.recipe_list_url)
+        self.assertNotIn('Server-Timing', response)
+
+
+class RequestTimingTests(APITestCase):
+    """Класс тестов счетчика запросов и поиска N+1."""
+
+    def _execute(self, timing, sql, times):
+        for _ in range(times):
+            timing(lambda *args: None, sql, (1, ), False, {})
+
+    def test_repeated_queries_are_flagged(self):
+        """Запрос, повторенный до порога и более раз, считается N+1."""
+        timing = RequestTiming()
+        repeated = 'SELECT * FROM "recipes_tag" WHERE "id" = %s'
+        self._execute(timing, repeated, DUPLICATE_QUERY_THRESHOLD)
+        self._execute(timing, 'SELECT COUNT(*)', DUPLICATE_QUERY_THRESHOLD - 1)
+        self.assertEqual(
+            timing.duplicates(), {repeated: DUPLICATE_QUERY_THRESHOLD}
+        )
+        self.assertEqual(sum(timing.queries.values()),
+                         DUPLICATE_QUERY_THRESHOLD * 2 - 1)
+        self.assertGreater(timing.db_time, 0)
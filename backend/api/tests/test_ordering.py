@@ -0,0 +1,193 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import User
+
+
+class RecipeCountersTests(APITestCase):
+    """Класс тестов счетчиков и сортировок рецептов."""
+
+    def setUp(self):
+        self.recipe_url = 'http://testserver/api/recipes/'
+        self.users = [
+            User.objects.create(
+                first_name='Вася',
+                last_name='Пупкин',
+                username='user{}'.format(number),
+                email='user{}@yandex.ru'.format(number),
+                password='Qwerty_123'
+            )
+            for number in range(3)
+        ]
+        token = Token.objects.create(user=self.users[0])
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.users[1],
+                image='image.jpg',
+                name='Рецепт {}'.format(number),
+                text='Описание',
+                cooking_time=cooking_time
+            )
+            for number, cooking_time in enumerate((30, 10, 20))
+        ]
+
+    def _counters(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.favorites_count, recipe.in_carts_count
+
+    def _names(self, **params):
+        response = self.client.get(self.recipe_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_counters_follow_api_actions(self):
+        """Счетчики меняются при добавлении и удалении через API."""
+        recipe = self.recipes[0]
+        url = '{}{}/'.format(self.recipe_url, recipe.id)
+        self.client.post(url + 'favorite/')
+        self.client.post(url + 'shopping_cart/')
+        self.assertEqual(self._counters(recipe), (1, 1))
+        self.client.delete(url + 'favorite/')
+        self.client.delete(url + 'shopping_cart/')
+        self.assertEqual(self._counters(recipe), (0, 0))
+
+    def test_stale_counters_do_not_go_negative(self):
+        """
+        Строки, созданные до появления счетчиков, удаляются без ошибки,
+        а счетчик остается нулевым.
+        """
+        recipe = self.recipes[0]
+        Favorite.objects.create(user=self.users[0], recipe=recipe)
+        ShoppingCart.objects.create(user=self.users[0], recipe=recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(
+            favorites_count=0, in_carts_count=0
+        )
+        url = '{}{}/'.format(self.recipe_url, recipe.id)
+        for action in ('favorite/', 'shopping_cart/'):
+            with self.subTest(action=action):
+                response = self.client.delete(url + action)
+                self.assertEqual(
+                    response.status_code, status.HTTP_204_NO_CONTENT
+                )
+        self.assertEqual(self._counters(recipe), (0, 0))
+
+    def test_counters_follow_cascades(self):
+        """Удаление пользователя уменьшает счетчики его рецептов."""
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=self.recipes[1])
+        ShoppingCart.objects.create(user=self.users[2], recipe=self.recipes[1])
+        self.assertEqual(self._counters(self.recipes[1]), (3, 1))
+        self.users[2].delete()
+        self.assertEqual(self._counters(self.recipes[1]), (2, 0))
+
+    def test_queryset_delete_updates_counters(self):
+        """
+        Массовое удаление уменьшает счетчики одним UPDATE на каждое
+        число удаленных строк рецепта.
+        """
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=self.recipes[0])
+            Favorite.objects.create(user=user, recipe=self.recipes[1])
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[2])
+        with CaptureQueriesContext(connection) as context:
+            Favorite.objects.filter(user__in=self.users[:2]).delete()
+        self.assertEqual(
+            [self._counters(recipe)[0] for recipe in self.recipes],
+            [1, 1, 0]
+        )
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "recipes_recipe"')
+        ]), 2)
+        call_command('reconcile_recipe_counters', '--check',
+                     stdout=StringIO())
+
+    def test_recipe_delete_skips_counter_updates(self):
+        """Удаление рецепта не обновляет счетчики удаляемой строки."""
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=self.recipes[0])
+        with CaptureQueriesContext(connection) as context:
+            self.recipes[0].delete()
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "recipes_recipe"')
+            for query in context.captured_queries
+        ))
+
+    def test_counters_are_not_exposed(self):
+        """Служебные поля рецепта не попадают в ответ API."""
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[0])
+        response = self.client.get(
+            '{}{}/'.format(self.recipe_url, self.recipes[0].id)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for field in ('favorites_count', 'in_carts_count', 'image_status',
+                      'pub_date'):
+            with self.subTest(field=field):
+                self.assertNotIn(field, response.json())
+
+    def test_orderings(self):
+        """Рецепты сортируются по популярности, времени и дате."""
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=self.recipes[2])
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[0])
+        self.assertEqual(
+            self._names(ordering='popular'),
+            ['Рецепт 2', 'Рецепт 0', 'Рецепт 1']
+        )
+        self.assertEqual(
+            self._names(ordering='cooking_time'),
+            ['Рецепт 1', 'Рецепт 2', 'Рецепт 0']
+        )
+        self.assertEqual(
+            self._names(ordering='-pub_date'),
+            ['Рецепт 2', 'Рецепт 1', 'Рецепт 0']
+        )
+        self.assertEqual(
+            self._names(ordering='cooking_time', pagination='cursor'),
+            ['Рецепт 1', 'Рецепт 2', 'Рецепт 0']
+        )
+        response = self.client.get(self.recipe_url, {'ordering': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_popular_uses_index(self):
+        """Популярные рецепты читаются по индексу, без GROUP BY."""
+        with CaptureQueriesContext(connection) as context:
+            self._names(ordering='popular', limit=2)
+        page_query = context.captured_queries[2]['sql']
+        self.assertIn('ORDER BY', page_query)
+        self.assertNotIn('GROUP BY', page_query)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'EXPLAIN QUERY PLAN SELECT id FROM recipes_recipe '
+                    'ORDER BY favorites_count DESC, pub_date DESC, id DESC '
+                    'LIMIT 2'
+                )
+                plan = ' '.join(str(row[-1]) for row in cursor)
+            self.assertIn('recipe_popular_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_reconcile_command(self):
+        """Команда сверки находит и исправляет расхождения счетчиков."""
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.users[0], recipe=self.recipes[1])
+        call_command('reconcile_recipe_counters', '--check',
+                     stdout=StringIO())
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(favorites_count=7)
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(in_carts_count=0)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_recipe_counters', '--check',
+                         stdout=StringIO())
+        stdout = StringIO()
+        call_command('reconcile_recipe_counters', stdout=stdout)
+        self.assertIn('2', stdout.getvalue())
+        self.assertEqual(self._counters(self.recipes[0]), (1, 0))
+        self.assertEqual(self._counters(self.recipes[1]), (0, 1))
@@ -0,0 +1,183 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.conf import RECIPE_ORDERINGS
+from api.paginations import RecipeCursorPagination
+from recipes.models import Favorite, Recipe, Tag
+from users.models import Follow, User
+
+
+class CursorPaginationTests(APITestCase):
+    """Класс тестов курсорного режима пагинации."""
+    recipes_count = 20
+
+    def setUp(self):
+        self.recipe_list_url = 'http://testserver/api/recipes/'
+        self.subscriptions_url = 'http://testserver/api/users/subscriptions/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.tags = [
+            Tag.objects.create(name='завтрак', color='#E26C2D', slug='b'),
+            Tag.objects.create(name='обед', color='#49B64E', slug='l')
+        ]
+        for number in range(self.recipes_count):
+            recipe = Recipe.objects.create(
+                author=self.user,
+                image='image.jpg',
+                name='Рецепт {}'.format(number),
+                text='Описание рецепта',
+                cooking_time=1
+            )
+            recipe.tags.set(self.tags[:number % 2 + 1])
+            if number % 3:
+                Favorite.objects.create(user=self.user, recipe=recipe)
+        # Половина рецептов с одинаковой датой проверяет разрешение
+        # совпадений по id.
+        Recipe.objects.filter(id__lte=self.recipes_count // 2).update(
+            pub_date=timezone.now()
+        )
+
+    def _walk(self, url, params, max_pages=100):
+        """Проходит все страницы по ссылкам next и собирает id."""
+        ids = []
+        response = self.client.get(url, params)
+        for _ in range(max_pages):
+            data = response.json()
+            ids.extend(item['id'] for item in data['results'])
+            if not data['next']:
+                return ids
+            response = self.client.get(data['next'])
+        self.fail('Курсор не дошел до последней страницы.')
+
+    def test_cursor_mode_skips_count(self):
+        """В курсорном режиме не выполняется COUNT(*)."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                self.recipe_list_url, {'pagination': 'cursor'}
+            )
+        data = response.json()
+        self.assertNotIn('count', data)
+        self.assertEqual(len(data['results']), 6)
+        for query in context.captured_queries:
+            with self.subTest(query=query['sql']):
+                self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_cursor_pages_match_ordering(self):
+        """Все страницы вместе дают рецепты в порядке (-pub_date, -id)."""
+        expected = list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        ids = self._walk(
+            self.recipe_list_url, {'pagination': 'cursor', 'limit': 3}
+        )
+        self.assertEqual(ids, expected)
+
+    def test_cursor_pages_with_filters(self):
+        """Курсор корректен вместе с фильтрами и не дублирует рецепты."""
+        expected = list(
+            Recipe.objects.filter(
+                tags__slug__in=('b', 'l'), favorite__user=self.user
+            ).distinct().order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        ids = self._walk(
+            self.recipe_list_url,
+            {
+                'pagination': 'cursor',
+                'limit': 4,
+                'tags': ['b', 'l'],
+                'is_favorited': 1,
+                'author': self.user.id
+            }
+        )
+        self.assertEqual(ids, expected)
+
+    def test_cursor_pages_with_orderings(self):
+        """
+        Курсор по сортировкам с совпадающими значениями проходит все
+        рецепты ровно по разу, а ссылки previous ведут назад.
+        """
+        for ordering, fields in RECIPE_ORDERINGS.items():
+            with self.subTest(ordering=ordering):
+                expected = list(
+                    Recipe.objects.order_by(*fields)
+                    .values_list('id', flat=True)
+                )
+                params = {'pagination': 'cursor', 'limit': 3,
+                          'ordering': ordering}
+                self.assertEqual(
+                    self._walk(self.recipe_list_url, params), expected
+                )
+                first = self.client.get(self.recipe_list_url, params).json()
+                second = self.client.get(first['next']).json()
+                back = self.client.get(second['previous']).json()
+                self.assertEqual(back['results'], first['results'])
+                self.assertIsNone(back['previous'])
+
+    def test_cursor_deeper_than_offset_cutoff(self):
+        """Много одинаковых значений не зацикливают курсор."""
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=self.user,
+                image='image.jpg',
+                name='Рецепт',
+                text='Описание',
+                cooking_time=1,
+                pub_date=timezone.now()
+            )
+            for _ in range(RecipeCursorPagination.offset_cutoff + 300)
+        )
+        ids = self._walk(
+            self.recipe_list_url,
+            {'pagination': 'cursor', 'limit': 100, 'ordering': 'popular'}
+        )
+        self.assertEqual(len(ids), Recipe.objects.count())
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_cursor_rejected_for_search(self):
+        """Поиск по релевантности листается только по номерам страниц."""
+        response = self.client.get(
+            self.recipe_list_url, {'pagination': 'cursor', 'search': 'рецепт'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.recipe_list_url, {'search': 'рецепт'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_cursor(self):
+        """Испорченный курсор дает 404, а не 500."""
+        for cursor in ('abc', 'cD1bMQ==', 'cD0lNUIxJTVE'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    self.recipe_list_url,
+                    {'pagination': 'cursor', 'cursor': cursor}
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_404_NOT_FOUND
+                )
+
+    def test_subscriptions_cursor_mode(self):
+        """Курсорный режим доступен в списке подписок."""
+        authors = []
+        for number in range(5):
+            author = User.objects.create(
+                username='author{}'.format(number),
+                email='author{}@yandex.ru'.format(number)
+            )
+            Follow.objects.create(user=self.user, author=author)
+            authors.append(author.id)
+        ids = self._walk(
+            self.subscriptions_url, {'pagination': 'cursor', 'limit': 2}
+        )
+        self.assertEqual(ids, sorted(authors, reverse=True))
@@ -0,0 +1,109 @@
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import (Favorite, Ingredient, IngredientAmountForRecipe,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Follow, User
+
+
+class RecipeListQueriesTests(APITestCase):
+    """Класс тестов количества запросов к БД для списка рецептов."""
+    recipes_count = 100
+
+    def setUp(self):
+        self.recipe_list_url = 'http://testserver/api/recipes/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        self.author = User.objects.create(
+            first_name='Петя',
+            last_name='Петров',
+            username='petya.petrov',
+            email='ppetrov@yandex.ru',
+            password='Qwerty_123'
+        )
+        tags = [
+            Tag.objects.create(name='завтрак', color='#E26C2D', slug='b'),
+            Tag.objects.create(name='обед', color='#49B64E', slug='l')
+        ]
+        ingredients = [
+            Ingredient.objects.create(name='Капуста', measurement_unit='кг'),
+            Ingredient.objects.create(name='Морковь', measurement_unit='г')
+        ]
+        for number in range(self.recipes_count):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                image='image.jpg',
+                name='Рецепт {}'.format(number),
+                text='Описание рецепта',
+                cooking_time=1
+            )
+            recipe.tags.set(tags)
+            for ingredient in ingredients:
+                IngredientAmountForRecipe.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+            if number % 2:
+                Favorite.objects.create(user=self.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        Follow.objects.create(user=self.user, author=self.author)
+
+    def _authenticate(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def test_anonymous_recipe_list_queries(self):
+        """
+        Количество запросов для анонима не зависит от размера страницы:
+        count, страница, теги, количества и ингредиенты.
+        """
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(5):
+                    response = self.client.get(
+                        self.recipe_list_url, {'limit': limit}
+                    )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_authenticated_recipe_list_queries(self):
+        """
+        Для авторизованного пользователя добавляются запрос токена
+        и один запрос флагов всех рецептов и авторов страницы.
+        """
+        self._authenticate()
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                with self.assertNumQueries(7):
+                    response = self.client.get(
+                        self.recipe_list_url, {'limit': limit}
+                    )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_recipe_list_flags(self):
+        """Флаги в ответе совпадают с данными в БД."""
+        self._authenticate()
+        response = self.client.get(
+            self.recipe_list_url, {'limit': self.recipes_count}
+        )
+        favorite_ids = set(
+            self.user.favorite_recipe.values_list('recipe_id', flat=True)
+        )
+        cart_ids = set(
+            self.user.recipe_in_cart.values_list('recipe_id', flat=True)
+        )
+        for recipe in response.json()['results']:
+            with self.subTest(recipe=recipe['id']):
+                self.assertEqual(
+                    recipe['is_favorited'], recipe['id'] in favorite_ids
+                )
+                self.assertEqual(
+                    recipe['is_in_shopping_cart'], recipe['id'] in cart_ids
+                )
+                self.assertTrue(recipe['author']['is_subscribed'])
+                self.assertEqual(len(recipe['ingredients']), 2)
+                self.assertEqual(len(recipe['tags']), 2)
@@ -0,0 +1,197 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+IMAGE = (
+    'data:image/png;base64,'
+    'iVBORw0KGgoAAAANSUhEUgAAAAIAAAACCAIAAAD91JpzAAAAFklEQVR4nGP8z8DA'
+    'wMDAxMDAwMDAAAANHQEDasKb6QAAAABJRU5ErkJggg=='
+)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeWriteTests(APITestCase):
+    """Класс тестов записи рецептов."""
+
+    def setUp(self):
+        self.recipe_url = 'http://testserver/api/recipes/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name='ингредиент {}'.format(number),
+                       measurement_unit='г')
+            for number in range(100)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def _recipe_data(self, ingredients):
+        return {
+            'ingredients': ingredients,
+            'tags': [self.tag.id],
+            'image': IMAGE,
+            'name': 'рецепт',
+            'text': 'описание',
+            'cooking_time': 5
+        }
+
+    def _create(self, ingredients):
+        return self.client.post(
+            self.recipe_url, self._recipe_data(ingredients), format='json'
+        )
+
+    def test_missing_ingredient(self):
+        """Несуществующий ингредиент отклоняется."""
+        response = self._create([{'id': 10 ** 6, 'amount': 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(10 ** 6), response.json()['Ингредиент'][0])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_duplicate_ingredient(self):
+        """Повторяющиеся ингредиенты отклоняются."""
+        ingredient_id = self.ingredients[0].id
+        response = self._create([
+            {'id': ingredient_id, 'amount': 1},
+            {'id': ingredient_id, 'amount': 2}
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json()['Ингредиент'],
+            ['Ингредиенты не должны повторяться.']
+        )
+
+    def test_create_queries_do_not_depend_on_ingredients(self):
+        """
+        Количество запросов при создании рецепта одинаково
+        для 5, 25 и 100 ингредиентов.
+        """
+        queries = {}
+        for size in (5, 25, 100):
+            ingredients = [
+                {'id': ingredient.id, 'amount': number}
+                for number, ingredient in enumerate(self.ingredients[:size], 1)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                response = self._create(ingredients)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(response.json()['ingredients']), size)
+            queries[size] = len(context.captured_queries)
+        self.assertEqual(len(set(queries.values())), 1, queries)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeUpdateDiffTests(APITestCase):
+    """Класс тестов обновления рецепта по разнице составов."""
+    through_tables = (
+        'recipes_ingredientamountforrecipe', 'recipes_recipe_tags'
+    )
+
+    def setUp(self):
+        self.recipe_url = 'http://testserver/api/recipes/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.tags = [
+            Tag.objects.create(name='завтрак', color='#E26C2D', slug='b'),
+            Tag.objects.create(name='обед', color='#49B64E', slug='l')
+        ]
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name='ингредиент {}'.format(number),
+                       measurement_unit='г')
+            for number in range(4)
+        )
+        self.data = {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:3]
+            ],
+            'tags': [self.tags[0].id],
+            'image': IMAGE,
+            'name': 'рецепт',
+            'text': 'описание',
+            'cooking_time': 5
+        }
+        response = self.client.post(self.recipe_url, self.data, format='json')
+        self.recipe_id = response.json()['id']
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def _update(self, data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                '{}{}/'.format(self.recipe_url, self.recipe_id),
+                data,
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = [
+            query['sql'].split()[0].upper()
+            for query in context.captured_queries
+            if query['sql'].split()[0].upper() in ('INSERT', 'UPDATE',
+                                                   'DELETE')
+            and any(table in query['sql'] for table in self.through_tables)
+        ]
+        return response.json(), writes
+
+    def test_unchanged_resubmission_touches_nothing(self):
+        """Повторная отправка того же рецепта не пишет в связующие таблицы."""
+        _, writes = self._update(self.data)
+        self.assertEqual(writes, [])
+
+    def test_changed_amount_is_single_update(self):
+        """Изменение одного количества дает ровно один UPDATE."""
+        self.data['ingredients'][1]['amount'] = 25
+        data, writes = self._update(self.data)
+        self.assertEqual(writes, ['UPDATE'])
+        amounts = {item['id']: item['amount'] for item in data['ingredients']}
+        self.assertEqual(amounts[self.ingredients[1].id], 25)
+
+    def test_added_and_removed_rows(self):
+        """Добавление и удаление ингредиентов и тегов применяются точечно."""
+        self.data['ingredients'] = [
+            {'id': self.ingredients[0].id, 'amount': 10},
+            {'id': self.ingredients[3].id, 'amount': 7}
+        ]
+        self.data['tags'] = [self.tags[1].id]
+        data, writes = self._update(self.data)
+        self.assertEqual(sorted(writes), ['DELETE', 'DELETE', 'INSERT',
+                                          'INSERT'])
+        self.assertEqual(
+            {item['id'] for item in data['ingredients']},
+            {self.ingredients[0].id, self.ingredients[3].id}
+        )
+        self.assertEqual(
+            [tag['id'] for tag in data['tags']], [self.tags[1].id]
+        )
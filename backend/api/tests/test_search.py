@@ -0,0 +1,91 @@
+from django.db import connection
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class RecipeSearchTests(APITestCase):
+    """Класс тестов полнотекстового поиска рецептов."""
+
+    def setUp(self):
+        self.recipe_url = 'http://testserver/api/recipes/'
+        self.users = [
+            User.objects.create(
+                username='user{}'.format(number),
+                email='user{}@yandex.ru'.format(number),
+                first_name='Имя',
+                last_name='Фамилия',
+                password='Qwerty_123'
+            )
+            for number in range(2)
+        ]
+        self.tag = Tag.objects.create(
+            name='обед', color='#49B64E', slug='lunch'
+        )
+        self.recipes = {}
+        for author, name, text in (
+            (0, 'Борщ', 'Свекла, капуста и картофель.'),
+            (1, 'Щи', 'Капуста и картофель, подавать с борщевой заправкой.'),
+            (1, 'Салат', 'Огурцы и помидоры.'),
+        ):
+            self.recipes[name] = Recipe.objects.create(
+                author=self.users[author],
+                image='image.jpg',
+                name=name,
+                text=text,
+                cooking_time=10
+            )
+        self.recipes['Борщ'].tags.add(self.tag)
+        self.recipes['Щи'].tags.add(self.tag)
+
+    def _names(self, **params):
+        response = self.client.get(self.recipe_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in response.json()['results']]
+
+    def test_search_by_name_and_text(self):
+        """Рецепты находятся по словам из названия и описания."""
+        self.assertEqual(set(self._names(search='капуста')), {'Борщ', 'Щи'})
+        self.assertEqual(self._names(search='огурцы помидоры'), ['Салат'])
+        self.assertEqual(self._names(search='ананас'), [])
+
+    def test_name_matches_rank_higher(self):
+        """Совпадение в названии важнее совпадения в описании."""
+        self.assertEqual(self._names(search='борщ'), ['Борщ', 'Щи'])
+
+    def test_search_combines_with_filters(self):
+        """Поиск работает вместе с фильтрами и пагинацией."""
+        self.assertEqual(
+            self._names(search='картофель', author=self.users[1].id),
+            ['Щи']
+        )
+        response = self.client.get(
+            self.recipe_url,
+            {'search': 'картофель', 'tags': 'lunch', 'limit': 1}
+        )
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении рецепта."""
+        salad = self.recipes['Салат']
+        salad.text = 'Редис и зелень.'
+        salad.save()
+        self.assertEqual(self._names(search='огурцы'), [])
+        self.assertEqual(self._names(search='редис'), ['Салат'])
+        salad.delete()
+        self.assertEqual(self._names(search='редис'), [])
+
+    def test_search_uses_index(self):
+        """В SQLite поиск идет по таблице FTS5, а не перебором."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Проверка плана запроса для SQLite.')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'EXPLAIN QUERY PLAN SELECT rowid FROM recipes_recipe_fts '
+                'WHERE recipes_recipe_fts MATCH %s', ['"капуста"*']
+            )
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('VIRTUAL TABLE INDEX', plan)
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from rest_framework.test import APITestCase
 
 from recipes.models import Ingredient, Tag
@@ -5,6 +6,7 @@ from recipes.models import Ingredient, Tag
 
 class TagSerializerTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.tag_data = {
             'name': 'завтрак',
             'color': '#E26C2D',
@@ -43,6 +45,7 @@ class TagSerializerTests(APITestCase):
 
 class IngredientSerializerTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.ingredient_data = {
             'name': 'Капуста',
             'measurement_unit': 'кг'
@@ -0,0 +1,255 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import (Ingredient, IngredientAmountForRecipe, Recipe,
+                            ShoppingCart, ShoppingListTotal, Tag)
+from users.models import User
+
+
+class DownloadShoppingCartTests(APITestCase):
+    """Класс тестов выгрузки списка покупок."""
+
+    def setUp(self):
+        self.download_url = (
+            'http://testserver/api/recipes/download_shopping_cart/'
+        )
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.ingredients = [
+            Ingredient.objects.create(name='соль', measurement_unit='г'),
+            Ingredient.objects.create(name='соль', measurement_unit='ч. л.'),
+            Ingredient.objects.create(name='морковь', measurement_unit='г')
+        ]
+
+    def _fill_cart(self, recipes_count):
+        for number in range(recipes_count):
+            recipe = Recipe.objects.create(
+                author=self.user,
+                image='image.jpg',
+                name='Рецепт {}'.format(number),
+                text='Описание рецепта',
+                cooking_time=1
+            )
+            IngredientAmountForRecipe.objects.bulk_create(
+                IngredientAmountForRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=amount
+                )
+                for amount, ingredient in enumerate(self.ingredients, 1)
+            )
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            ShoppingListTotal.objects.add_recipes(self.user, [recipe.id])
+
+    def _download(self, **params):
+        response = self.client.get(self.download_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_empty_cart(self):
+        """Пустой список покупок нельзя скачать."""
+        response = self.client.get(self.download_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_format(self):
+        """Неизвестный формат файла отклоняется."""
+        self._fill_cart(1)
+        response = self.client.get(self.download_url, {'format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_units_are_not_mixed(self):
+        """Ингредиенты с разными единицами суммируются отдельно."""
+        self._fill_cart(3)
+        data = json.loads(self._download(format='json'))
+        totals = {
+            (item['name'], item['measurement_unit']): item['amount']
+            for item in data
+        }
+        self.assertEqual(
+            totals,
+            {('соль', 'г'): 3, ('соль', 'ч. л.'): 6, ('морковь', 'г'): 9}
+        )
+
+    def test_txt_and_csv_formats(self):
+        """Текстовый и CSV форматы содержат суммы по ингредиентам."""
+        self._fill_cart(2)
+        text = self._download()
+        self.assertIn('· Соль (г) — 2\n', text)
+        self.assertIn('· Соль (ч. л.) — 4\n', text)
+        rows = list(csv.reader(io.StringIO(self._download(format='csv'))))
+        self.assertEqual(rows[0], ['name', 'measurement_unit', 'amount'])
+        self.assertIn(['морковь', 'г', '6'], rows)
+
+    def test_download_does_not_grow_with_cart(self):
+        """
+        Выгрузка читает готовые суммы: число запросов и строк
+        не растет вместе с количеством рецептов в списке покупок.
+        """
+        queries = []
+        for recipes_count in (10, 300):
+            ShoppingCart.objects.all().delete()
+            ShoppingListTotal.objects.all().delete()
+            self._fill_cart(recipes_count)
+            with CaptureQueriesContext(connection) as context:
+                rows = list(csv.reader(io.StringIO(
+                    self._download(format='csv')
+                )))
+            self.assertEqual(len(rows), len(self.ingredients) + 1)
+            self.assertFalse(any(
+                'recipes_ingredientamountforrecipe' in query['sql']
+                for query in context.captured_queries
+            ))
+            queries.append(len(context.captured_queries))
+        small, large = queries
+        self.assertEqual(large, small)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ShoppingListTotalTests(APITestCase):
+    """Класс тестов инкрементальных сумм списка покупок."""
+    image = (
+        'data:image/png;base64,'
+        'iVBORw0KGgoAAAANSUhEUgAAAAIAAAACCAIAAAD91JpzAAAAFklEQVR4nGP8z8DA'
+        'wMDAxMDAwMDAAAANHQEDasKb6QAAAABJRU5ErkJggg=='
+    )
+
+    def setUp(self):
+        self.recipe_url = 'http://testserver/api/recipes/'
+        self.shopping_list_url = self.recipe_url + 'shopping_list/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        self.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.carrot = Ingredient.objects.create(
+            name='морковь', measurement_unit='г'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def _recipe_data(self, amounts):
+        return {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in amounts
+            ],
+            'tags': [self.tag.id],
+            'image': self.image,
+            'name': 'рецепт',
+            'text': 'описание',
+            'cooking_time': 5
+        }
+
+    def _create_recipe(self, amounts):
+        response = self.client.post(
+            self.recipe_url, self._recipe_data(amounts), format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.json()['id']
+
+    def _totals(self):
+        response = self.client.get(self.shopping_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id']: item['amount'] for item in response.json()}
+
+    def _assert_consistent(self):
+        call_command(
+            'rebuild_shopping_lists', '--check', stdout=io.StringIO()
+        )
+
+    def test_cart_add_and_remove(self):
+        """Суммы меняются при добавлении и удалении рецепта из корзины."""
+        first = self._create_recipe([(self.salt, 5), (self.carrot, 100)])
+        second = self._create_recipe([(self.salt, 3)])
+        for recipe_id in (first, second):
+            self.client.post(
+                '{}{}/shopping_cart/'.format(self.recipe_url, recipe_id)
+            )
+        self.assertEqual(
+            self._totals(), {self.salt.id: 8, self.carrot.id: 100}
+        )
+        self.client.delete(
+            '{}{}/shopping_cart/'.format(self.recipe_url, first)
+        )
+        self.assertEqual(self._totals(), {self.salt.id: 3})
+        self._assert_consistent()
+
+    def test_recipe_update_and_delete(self):
+        """Изменение и удаление рецепта переносятся в списки покупок."""
+        recipe_id = self._create_recipe([(self.salt, 5)])
+        self.client.post(
+            '{}{}/shopping_cart/'.format(self.recipe_url, recipe_id)
+        )
+        response = self.client.patch(
+            '{}{}/'.format(self.recipe_url, recipe_id),
+            self._recipe_data([(self.salt, 2), (self.carrot, 7)]),
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._totals(), {self.salt.id: 2, self.carrot.id: 7})
+        self._assert_consistent()
+
+        self.client.delete('{}{}/'.format(self.recipe_url, recipe_id))
+        self.assertEqual(self._totals(), {})
+        self._assert_consistent()
+
+    def test_cart_created_before_totals(self):
+        """
+        Корзина, собранная до появления сумм, сразу попадает в список
+        покупок и в выгрузку.
+        """
+        recipe_id = self._create_recipe([(self.salt, 5), (self.carrot, 2)])
+        ShoppingCart.objects.create(user=self.user, recipe_id=recipe_id)
+        self.assertFalse(ShoppingListTotal.objects.exists())
+        response = self.client.get(self.recipe_url + 'download_shopping_cart/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Соль (г) — 5', content)
+        self.assertIn('Морковь (г) — 2', content)
+        self.assertEqual(
+            self._totals(), {self.salt.id: 5, self.carrot.id: 2}
+        )
+        self._assert_consistent()
+
+    def test_check_detects_drift(self):
+        """Команда находит расхождение и исправляет его пересборкой."""
+        recipe_id = self._create_recipe([(self.salt, 5)])
+        self.client.post(
+            '{}{}/shopping_cart/'.format(self.recipe_url, recipe_id)
+        )
+        ShoppingListTotal.objects.update(total_amount=1)
+        with self.assertRaises(CommandError):
+            self._assert_consistent()
+        call_command('rebuild_shopping_lists', stdout=io.StringIO())
+        self._assert_consistent()
+        self.assertEqual(self._totals(), {self.salt.id: 5})
@@ -0,0 +1,155 @@
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class RecipeTagFilterTests(APITestCase):
+    """Класс тестов фильтрации рецептов по тегам."""
+
+    def setUp(self):
+        cache.clear()
+        self.recipe_url = 'http://testserver/api/recipes/'
+        author = User.objects.create(
+            username='author',
+            email='author@yandex.ru',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Qwerty_123'
+        )
+        self.tags = {
+            slug: Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#E26C2D'),
+                                ('lunch', '#49B64E'),
+                                ('dinner', '#8775D2'))
+        }
+        for name, slugs in (('каша', ('breakfast', )),
+                            ('суп', ('lunch', 'dinner')),
+                            ('омлет', ('breakfast', 'dinner')),
+                            ('салат', ())):
+            recipe = Recipe.objects.create(
+                author=author,
+                image='image.jpg',
+                name=name,
+                text='описание',
+                cooking_time=10
+            )
+            recipe.tags.set(self.tags[slug] for slug in slugs)
+
+    def _get(self, *slugs, **params):
+        response = self.client.get(
+            self.recipe_url, {'tags': slugs, **params}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_any_of_tags_without_duplicates(self):
+        """Рецепт с несколькими выбранными тегами выводится один раз."""
+        data = self._get('breakfast', 'dinner')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(
+            sorted(item['name'] for item in data['results']),
+            ['каша', 'омлет', 'суп']
+        )
+
+    def test_unknown_tag(self):
+        """Неизвестный тег ничего не находит."""
+        self.assertEqual(self._get('brunch')['count'], 0)
+        self.assertEqual(self._get('brunch', 'lunch')['count'], 1)
+
+    def test_slug_map_is_cached(self):
+        """Справочник тегов читается из кэша и обновляется при изменении."""
+        self._get('lunch')
+        with CaptureQueriesContext(connection) as context:
+            self._get('lunch')
+        self.assertFalse(any(
+            'recipes_tag"."slug' in query['sql']
+            and 'recipes_recipe' not in query['sql']
+            for query in context.captured_queries
+        ))
+        Tag.objects.create(name='перекус', color='#000000', slug='snack')
+        self.assertEqual(self._get('snack')['count'], 0)
+        self.assertEqual(self._get('lunch')['count'], 1)
+
+
+class RecipeTagFilterScaleTests(APITestCase):
+    """Планы запросов и время фильтра по тегам на больших объемах."""
+    sizes = (10_000, 100_000)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author',
+            email='author@yandex.ru',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Qwerty_123'
+        )
+        cls.tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#E26C2D'),
+                                ('lunch', '#49B64E'),
+                                ('dinner', '#8775D2'))
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _fill(self, count):
+        existing = Recipe.objects.count()
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(author=self.author, image='image.jpg',
+                       name='Рецепт {}'.format(number), text='описание',
+                       cooking_time=10)
+                for number in range(existing, count)
+            ),
+            batch_size=5000
+        )
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+                for number, recipe in enumerate(recipes, existing)
+                for position, tag in enumerate(self.tags)
+                if number % (position + 2) == 0
+            ),
+            batch_size=5000
+        )
+
+    def test_multi_tag_filter_scales(self):
+        """
+        Фильтр по нескольким тегам — подзапрос EXISTS по индексу
+        связующей таблицы без DISTINCT, а число запросов страницы
+        не зависит от объема данных.
+        """
+        queries = {}
+        for count in self.sizes:
+            self._fill(count)
+            params = {'tags': ['breakfast', 'dinner'], 'limit': 6}
+            self.client.get('http://testserver/api/recipes/', params)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(
+                    'http://testserver/api/recipes/', params
+                )
+            queries[count] = len(context.captured_queries)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            expected = sum(
+                1 for number in range(count)
+                if number % 2 == 0 or number % 4 == 0
+            )
+            self.assertEqual(response.json()['count'], expected)
+            page_query = context.captured_queries[1]['sql']
+            self.assertIn('EXISTS', page_query)
+            self.assertNotIn('DISTINCT', page_query)
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + page_query)
+                    plan = ' '.join(str(row[-1]) for row in cursor)
+                self.assertIn('recipes_recipe_tags', plan)
+                self.assertIn('USING COVERING INDEX', plan)
+        self.assertEqual(len(set(queries.values())), 1)
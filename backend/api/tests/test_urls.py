@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from rest_framework import status
 from rest_framework.test import APITestCase
 
@@ -8,6 +9,7 @@ from users.models import User
 class TagUrlTests(APITestCase):
     """Класс тестов URL адресов для тэга."""
     def setUp(self):
+        cache.clear()
         self.tag_url = 'http://testserver/api/tags/'
 
     def test_tag_url(self):
@@ -41,6 +43,7 @@ class TagUrlTests(APITestCase):
 class IngredientUrlTests(APITestCase):
     """Класс тестов URL адресов для ингредиентов."""
     def setUp(self):
+        cache.clear()
         self.ingredient_url = 'http://testserver/api/ingredients/'
 
     def test_ingredient_url(self):
@@ -0,0 +1,176 @@
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers, status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.viewer import ViewerListSerializer, ViewerSerializerMixin
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+VIEWER_TABLES = ('users_follow', 'recipes_favorite', 'recipes_shoppingcart')
+
+
+class RecipeFlagsSerializer(ViewerSerializerMixin,
+                            serializers.ModelSerializer):
+    """Сериализатор без своего viewer_ids."""
+    is_favorited = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = ('name', 'is_favorited')
+        list_serializer_class = ViewerListSerializer
+
+    def get_is_favorited(self, obj):
+        return self.viewer.is_favorited(obj.id)
+
+
+class ViewerContextTests(APITestCase):
+    """Класс тестов флагов текущего пользователя во всех сериализаторах."""
+
+    def setUp(self):
+        self.user = self._create_user('vasya.pupkin')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.users = 0
+
+    def _create_user(self, username):
+        return User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username=username,
+            email='{}@yandex.ru'.format(username),
+            password='Qwerty_123'
+        )
+
+    def _fill(self, count):
+        """Авторы с рецептами; на четных авторов есть подписка."""
+        for _ in range(count):
+            self.users += 1
+            author = self._create_user('author{}'.format(self.users))
+            recipe = Recipe.objects.create(
+                author=author,
+                image='image.jpg',
+                name='Рецепт {}'.format(self.users),
+                text='Описание',
+                cooking_time=1
+            )
+            if self.users % 2 == 0:
+                Follow.objects.create(user=self.user, author=author)
+            if self.users % 3 == 0:
+                Favorite.objects.create(user=self.user, recipe=recipe)
+            if self.users % 4 == 0:
+                ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def _get(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        viewer_queries = [
+            query['sql'] for query in context.captured_queries
+            if any(table in query['sql'] for table in VIEWER_TABLES)
+        ]
+        return response.json(), len(context.captured_queries), viewer_queries
+
+    def _assert_author(self, author):
+        number = int(author['username'][len('author'):])
+        self.assertEqual(author['is_subscribed'], number % 2 == 0)
+
+    def _assert_recipe(self, recipe):
+        number = int(recipe['name'].split()[-1])
+        self.assertEqual(recipe['is_favorited'], number % 3 == 0)
+        self.assertEqual(recipe['is_in_shopping_cart'], number % 4 == 0)
+        self._assert_author(recipe['author'])
+
+    def test_user_list(self):
+        """Список пользователей — один запрос подписок на страницу."""
+        counts = []
+        for count in (5, 30):
+            self._fill(count - self.users)
+            data, queries, viewer_queries = self._get(
+                'http://testserver/api/users/', limit=100
+            )
+            counts.append(queries)
+            self.assertEqual(len(viewer_queries), 1)
+            for user in data['results']:
+                if user['username'].startswith('author'):
+                    self._assert_author(user)
+        self.assertEqual(counts[0], counts[1], counts)
+
+    def test_recipe_list_and_detail(self):
+        """Флаги списка и карточки рецепта — один запрос."""
+        self._fill(12)
+        data, _, viewer_queries = self._get(
+            'http://testserver/api/recipes/', limit=100
+        )
+        self.assertEqual(len(viewer_queries), 1)
+        self.assertEqual(len(data['results']), 12)
+        for recipe in data['results']:
+            self._assert_recipe(recipe)
+        for recipe in Recipe.objects.all()[:4]:
+            data, _, viewer_queries = self._get(
+                'http://testserver/api/recipes/{}/'.format(recipe.id)
+            )
+            self.assertEqual(len(viewer_queries), 1)
+            self._assert_recipe(data)
+
+    def test_default_viewer_ids(self):
+        """Без своего viewer_ids объекты регистрируются как рецепты."""
+        self._fill(6)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with CaptureQueriesContext(connection) as context:
+            data = RecipeFlagsSerializer(
+                Recipe.objects.all(), many=True, context={'request': request}
+            ).data
+        self.assertEqual(len(context.captured_queries), 2)
+        for recipe in data:
+            number = int(recipe['name'].split()[-1])
+            self.assertEqual(recipe['is_favorited'], number % 3 == 0)
+
+    def test_user_detail(self):
+        """Карточка пользователя и users/me — не больше одного запроса."""
+        self._fill(2)
+        for user in User.objects.filter(username__startswith='author'):
+            data, _, viewer_queries = self._get(
+                'http://testserver/api/users/{}/'.format(user.id)
+            )
+            self.assertEqual(len(viewer_queries), 1)
+            self._assert_author(data)
+        data, _, _ = self._get('http://testserver/api/users/me/')
+        self.assertFalse(data['is_subscribed'])
+
+    def test_anonymous_skips_viewer(self):
+        """Анонимные запросы не обращаются к таблицам связей."""
+        self._fill(6)
+        self.client.credentials()
+        for url in ('http://testserver/api/recipes/',
+                    'http://testserver/api/users/'):
+            with self.subTest(url=url):
+                data, _, viewer_queries = self._get(url)
+                self.assertEqual(viewer_queries, [])
+                for item in data['results']:
+                    user = item.get('author', item)
+                    self.assertFalse(user['is_subscribed'])
+                    self.assertFalse(item.get('is_favorited', False))
+
+    def test_flag_filters(self):
+        """Фильтры по избранному и корзине выбирают нужные рецепты."""
+        self._fill(12)
+        for name, divider in (('is_favorited', 3), ('is_in_shopping_cart', 4)):
+            with self.subTest(filter=name):
+                data, _, _ = self._get(
+                    'http://testserver/api/recipes/', **{name: 1}
+                )
+                self.assertEqual(
+                    sorted(int(item['name'].split()[-1])
+                           for item in data['results']),
+                    list(range(divider, 13, divider))
+                )
+                self.assertTrue(all(item[name] for item in data['results']))
+        self.client.credentials()
+        data, _, _ = self._get(
+            'http://testserver/api/recipes/', is_favorited=1
+        )
+        self.assertEqual(data['results'], [])
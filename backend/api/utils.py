@@ -1,29 +1,191 @@
 from __future__ import annotations
 
 import base64
+import csv
+import io
+import json
+from tempfile import SpooledTemporaryFile
+from typing import Iterable, Iterator
 
-from django.core.files.base import ContentFile
+from django import forms
+from django.core.files.base import File
+from django.templatetags.static import static
 from django.utils.timezone import datetime
+from PIL import Image
 from rest_framework.serializers import ImageField, ValidationError
 
-from api.conf import LIMIT_VALUE
+from api.conf import (IMAGE_DECODE_CHUNK_SIZE, IMAGE_MAX_PIXELS,
+                      IMAGE_MAX_SIZE, IMAGE_SPOOL_MAX_SIZE, LIMIT_VALUE,
+                      RECIPE_IMAGE_PLACEHOLDER)
+
+
+class LimitedImageField(forms.ImageField):
+    """
+    Проверка картинки без копирования файла в память:
+    Pillow читает заголовок прямо из файла, и картинки
+    с числом пикселей больше ``IMAGE_MAX_PIXELS`` отклоняются
+    до разбора изображения целиком.
+    """
+
+    def to_python(self, data):
+        file = forms.FileField.to_python(self, data)
+        if file is None:
+            return None
+        try:
+            image = Image.open(file)
+            if image.width * image.height > IMAGE_MAX_PIXELS:
+                raise forms.ValidationError(
+                    self.error_messages['too_many_pixels'],
+                    code='too_many_pixels'
+                )
+            image.verify()
+        except forms.ValidationError:
+            raise
+        except Exception as exc:
+            raise forms.ValidationError(
+                self.error_messages['invalid_image'], code='invalid_image'
+            ) from exc
+        file.image = image
+        file.content_type = Image.MIME.get(image.format)
+        file.seek(0)
+        return file
 
 
 class Base64ImageField(ImageField):
+    """
+    Картинка в виде data URI. Base64 декодируется частями
+    во временный файл, который переносится на диск, если
+    перестает помещаться в ``IMAGE_SPOOL_MAX_SIZE``.
+    Слишком большие данные отклоняются до декодирования.
+    Переводы строк и пробелы (base64 в стиле MIME) пропускаются.
+    """
+    default_error_messages = {
+        'too_large': (
+            'Размер картинки не должен превышать {} МБ.'
+            .format(IMAGE_MAX_SIZE // (1024 * 1024))
+        ),
+        'too_many_pixels': (
+            'Картинка не должна быть больше {} мегапикселей.'
+            .format(IMAGE_MAX_PIXELS // 1_000_000)
+        ),
+        'invalid_base64': 'Картинка должна быть закодирована в base64.',
+    }
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('_DjangoImageField', LimitedImageField)
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def _chunks(data: str, start: int) -> Iterator[str]:
+        """Части base64 без пробельных символов, кратные 4 символам."""
+        rest = ''
+        for position in range(start, len(data), IMAGE_DECODE_CHUNK_SIZE):
+            chunk = rest + ''.join(
+                data[position:position + IMAGE_DECODE_CHUNK_SIZE].split()
+            )
+            size = len(chunk) - len(chunk) % 4
+            rest = chunk[size:]
+            yield chunk[:size]
+        if rest:
+            yield rest
+
+    def _decode(self, data: str) -> File:
+        header_end = data.find(';base64,', 0, 100)
+        if header_end == -1:
+            self.fail('invalid_base64')
+        ext = data[len('data:image/'):header_end].split('+')[0]
+        start = header_end + len(';base64,')
+        if (len(data) - start) * 3 // 4 > IMAGE_MAX_SIZE:
+            self.fail('too_large')
+        fout = SpooledTemporaryFile(max_size=IMAGE_SPOOL_MAX_SIZE)
+        for chunk in self._chunks(data, start):
+            try:
+                fout.write(base64.b64decode(chunk, validate=True))
+            except ValueError:
+                fout.close()
+                self.fail('invalid_base64')
+        file = File(fout, name='temp.' + ext)
+        file.size = fout.tell()
+        fout.seek(0)
+        return file
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self._decode(data)
         return super().to_internal_value(data)
 
 
+class RecipeImageField(ImageField):
+    """Картинка рецепта; пока она обрабатывается, отдается заглушка."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if value:
+            return super().to_representation(value)
+        url = static(RECIPE_IMAGE_PLACEHOLDER)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ImageDerivativeField(RecipeImageField):
+    """Уменьшенная копия картинки; пока ее нет, отдается оригинал."""
+
+    def get_attribute(self, instance):
+        return super().get_attribute(instance) or instance.image
+
+
 def get_shopping_cart_footer() -> str:
     time_format_message: str = 'Список создан в %H:%M от %d/%m/%Y'
     separate: str = '-' * len(time_format_message)
     return separate + '\n' + datetime.now().strftime(time_format_message)
 
 
+def shopping_cart_txt(ingredients: Iterable[dict]) -> Iterator[str]:
+    yield 'Ваш список покупок:\n'
+    for ingredient in ingredients:
+        yield '\u00B7 {} ({}) \u2014 {}\n'.format(
+            ingredient['name'].capitalize(),
+            ingredient['measurement_unit'],
+            ingredient['amount']
+        )
+    yield get_shopping_cart_footer()
+
+
+def shopping_cart_csv(ingredients: Iterable[dict]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        writer.writerow((
+            ingredient['name'],
+            ingredient['measurement_unit'],
+            ingredient['amount']
+        ))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def shopping_cart_json(ingredients: Iterable[dict]) -> Iterator[str]:
+    separator = ''
+    yield '['
+    for ingredient in ingredients:
+        yield separator + json.dumps(ingredient, ensure_ascii=False)
+        separator = ', '
+    yield ']'
+
+
+SHOPPING_CART_FORMATS = {
+    'txt': (shopping_cart_txt, 'text/plain; charset=utf-8'),
+    'csv': (shopping_cart_csv, 'text/csv; charset=utf-8'),
+    'json': (shopping_cart_json, 'application/json; charset=utf-8'),
+}
+
+
 def validate_input_value(
     value: int,
     field_name: str,
@@ -0,0 +1,145 @@
+from django.db.models import CharField, Value
+from rest_framework import serializers
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+AUTHOR, FAVORITE, CART = 'author', 'favorite', 'cart'
+
+
+class AnonymousViewer:
+    """Связи анонимного пользователя: всегда пусты, без запросов."""
+
+    def add(self, authors=(), recipes=()):
+        pass
+
+    def mark_followed(self, author_ids):
+        pass
+
+    def is_subscribed(self, author_id):
+        return False
+
+    def is_favorited(self, recipe_id):
+        return False
+
+    def is_in_shopping_cart(self, recipe_id):
+        return False
+
+
+class ViewerContext(AnonymousViewer):
+    """
+    Подписки, избранное и корзина текущего пользователя на время
+    запроса. Сериализаторы сначала регистрируют id авторов и рецептов
+    страницы, а при первом обращении к флагу все три множества
+    загружаются одним запросом UNION ALL только для этих id.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.authors, self.recipes = set(), set()
+        self.loaded_authors, self.loaded_recipes = set(), set()
+        self.ids = {AUTHOR: set(), FAVORITE: set(), CART: set()}
+
+    def add(self, authors=(), recipes=()):
+        self.authors.update(authors)
+        self.recipes.update(recipes)
+
+    def mark_followed(self, author_ids):
+        """Запоминает авторов, о подписке на которых уже известно."""
+        author_ids = set(author_ids)
+        self.ids[AUTHOR].update(author_ids)
+        self.loaded_authors.update(author_ids)
+
+    def _query(self, kind, model, field, ids):
+        return model.objects.filter(
+            user=self.user, **{field + '__in': ids}
+        ).order_by().annotate(
+            kind=Value(kind, output_field=CharField())
+        ).values_list('kind', field)
+
+    def _load(self):
+        authors = self.authors - self.loaded_authors
+        recipes = self.recipes - self.loaded_recipes
+        queries = []
+        if authors:
+            queries.append(self._query(AUTHOR, Follow, 'author_id', authors))
+        if recipes:
+            queries.append(
+                self._query(FAVORITE, Favorite, 'recipe_id', recipes)
+            )
+            queries.append(
+                self._query(CART, ShoppingCart, 'recipe_id', recipes)
+            )
+        if not queries:
+            return
+        for kind, pk in queries[0].union(*queries[1:], all=True):
+            self.ids[kind].add(pk)
+        self.loaded_authors.update(authors)
+        self.loaded_recipes.update(recipes)
+
+    def is_subscribed(self, author_id):
+        if author_id not in self.loaded_authors:
+            self.add(authors=[author_id])
+            self._load()
+        return author_id in self.ids[AUTHOR]
+
+    def _has_recipe(self, kind, recipe_id):
+        if recipe_id not in self.loaded_recipes:
+            self.add(recipes=[recipe_id])
+            self._load()
+        return recipe_id in self.ids[kind]
+
+    def is_favorited(self, recipe_id):
+        return self._has_recipe(FAVORITE, recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return self._has_recipe(CART, recipe_id)
+
+
+def get_viewer(request):
+    """Контекст связей пользователя, один на запрос."""
+    if request is None:
+        return AnonymousViewer()
+    viewer = getattr(request, '_viewer', None)
+    if viewer is None:
+        user = request.user
+        viewer = (
+            ViewerContext(user) if user.is_authenticated
+            else AnonymousViewer()
+        )
+        request._viewer = viewer
+    return viewer
+
+
+class ViewerListSerializer(serializers.ListSerializer):
+    """
+    Перед выводом списка регистрирует в контексте пользователя
+    все объекты страницы, чтобы флаги загрузились одним запросом.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.add_to_viewer(items)
+        return super().to_representation(items)
+
+
+class ViewerSerializerMixin:
+    """Сериализатор с флагами, которые берутся из контекста запроса."""
+
+    @property
+    def viewer(self):
+        return get_viewer(self.context.get('request'))
+
+    def viewer_ids(self, objs):
+        """
+        Словарь ``authors``/``recipes`` с id объектов для контекста.
+        По умолчанию объекты считаются рецептами.
+        """
+        return {'recipes': [obj.pk for obj in objs]}
+
+    def add_to_viewer(self, objs):
+        self.viewer.add(**self.viewer_ids(objs))
+
+    def to_representation(self, instance):
+        self.add_to_viewer([instance])
+        return super().to_representation(instance)
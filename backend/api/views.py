@@ -1,30 +1,62 @@
-from django.db import transaction
-from django.http.response import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, response, serializers, status, viewsets
 from rest_framework.decorators import action
 
-from api.filters import IngredientSearchFilter, RecipeFilter
-from api.paginations import CustomPagination
+from api.cache import CatalogCacheMixin
+from api.conf import (BATCH_RECIPES_LIMIT, FUZZY_SEARCH_LIMIT,
+                      MAX_MISSING_INGREDIENTS)
+from api.filters import RecipeFilter
+from api.indexes import (ingredient_index, recipe_ingredient_index,
+                         trigram_index)
+from api.paginations import FeedCursorPagination, RecipePagination
 from api.permissions import IsAuthorAdminOrReadOnly
-from api.serializers import (FavoriteSerializer, IngredientAmountForRecipe,
-                             IngredientSerializer, RecipeSerializer,
+from api.serializers import (FavoriteSerializer, IngredientSerializer,
+                             RecipeMatchSerializer, RecipeSerializer,
                              RecipesListSerializer, ShoppingCartSerializer,
-                             TagSerializer)
-from api.utils import get_shopping_cart_footer
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+                             ShoppingListSerializer, TagSerializer)
+from api.utils import SHOPPING_CART_FORMATS
+from recipes.models import (RECIPE_COUNTERS, Favorite, FeedItem, Ingredient,
+                            Recipe, ShoppingCart, ShoppingListTotal, Tag)
+from users.models import User
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('$name',)
 
+    def _get_limit(self):
+        limit = self.request.query_params.get('limit')
+        if limit is None:
+            return None
+        if not limit.isdigit():
+            raise serializers.ValidationError(
+                {'limit': 'Ожидается целое неотрицательное число.'}
+            )
+        return int(limit)
+
+    def _fuzzy_search(self, name, limit):
+        ids = trigram_index.search(name, limit or FUZZY_SEARCH_LIMIT)
+        ingredients = Ingredient.objects.in_bulk(ids)
+        return self.get_serializer(
+            [ingredients[pk] for pk in ids if pk in ingredients], many=True
+        ).data
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        limit = self._get_limit()
+        if request.query_params.get('fuzzy') in ('1', 'true'):
+            return response.Response(self._fuzzy_search(name, limit))
+        return response.Response(ingredient_index.search(name, limit))
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
@@ -32,22 +64,62 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
     permission_classes = (IsAuthorAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """
+        Рецепты вместе со всеми связанными данными: число запросов
+        не зависит от размера страницы. Флаги текущего пользователя
+        сериализаторы берут из контекста запроса (api.viewer).
+        """
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'ingredient_amount__ingredient'
+        )
+
     def get_serializer_class(self):
         if self.request.method in ['GET']:
             return RecipesListSerializer
         return RecipeSerializer
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingListTotal.objects.change_recipe(
+            instance,
+            dict(
+                instance.ingredient_amount.values_list(
+                    'ingredient_id', 'amount'
+                )
+            ),
+            {}
+        )
+        instance.delete()
+
+    @staticmethod
+    def _lock_user(user):
+        """
+        Блокирует строку пользователя, чтобы одиночные и пакетные
+        изменения избранного и списка покупок одного пользователя
+        выполнялись по очереди.
+        """
+        list(User.objects.select_for_update().filter(pk=user.pk).values('pk'))
+
     @transaction.atomic
     def _create_action(self, request, pk, serializer):
+        self._lock_user(request.user)
         data = {'user': request.user.id, 'recipe': pk}
         serializer = serializer(data=data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # Параллельный запрос успел добавить рецепт после проверки.
+            raise serializers.ValidationError(
+                {'error': 'Данный рецепт уже добавлен.'}
+            )
         return response.Response(
             serializer.data, status=status.HTTP_201_CREATED
         )
@@ -55,6 +127,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @transaction.atomic
     def _delete_action(self, request, pk, klass):
         user = request.user
+        self._lock_user(user)
         recipe = get_object_or_404(Recipe, pk=pk)
         obj = get_object_or_404(klass=klass, user=user, recipe=recipe)
         obj.delete()
@@ -83,56 +156,264 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
     @shopping_cart.mapping.delete
+    @transaction.atomic
     def delete_shopping_cart(self, request, pk):
-        return self._delete_action(
+        response = self._delete_action(
             request=request, pk=pk, klass=ShoppingCart
         )
+        ShoppingListTotal.objects.remove_recipes(request.user, [pk])
+        return response
+
+    def _get_batch_recipe_ids(self, request):
+        recipe_ids = (
+            request.data.get('recipes') if isinstance(request.data, dict)
+            else None
+        )
+        if (
+            not isinstance(recipe_ids, list)
+            or not 0 < len(recipe_ids) <= BATCH_RECIPES_LIMIT
+            or not all(
+                type(recipe_id) is int for recipe_id in recipe_ids
+            )
+        ):
+            raise serializers.ValidationError({
+                'recipes': 'Ожидается список id рецептов, не больше {}.'
+                .format(BATCH_RECIPES_LIMIT)
+            })
+        return list(dict.fromkeys(recipe_ids))
+
+    def _get_batch_state(self, request, model):
+        """
+        Блокирует строку пользователя и одним запросом находит
+        рецепты и уже добавленные из них.
+        """
+        user = request.user
+        recipe_ids = self._get_batch_recipe_ids(request)
+        self._lock_user(user)
+        state = dict(
+            Recipe.objects.filter(pk__in=recipe_ids).annotate(
+                present=Exists(
+                    model.objects.filter(user=user, recipe=OuterRef('pk'))
+                )
+            ).values_list('pk', 'present')
+        )
+        return recipe_ids, state
+
+    @staticmethod
+    def _batch_response(recipe_ids, state, changed_ids, changed, unchanged):
+        changed_ids = set(changed_ids)
+        return response.Response({
+            'results': [
+                {
+                    'id': recipe_id,
+                    'status': (
+                        'not_found' if recipe_id not in state
+                        else changed if recipe_id in changed_ids
+                        else unchanged
+                    )
+                }
+                for recipe_id in recipe_ids
+            ]
+        })
+
+    @transaction.atomic
+    def _batch_create(self, request, model):
+        recipe_ids, state = self._get_batch_state(request, model)
+        added = [
+            recipe_id for recipe_id in recipe_ids
+            if recipe_id in state and not state[recipe_id]
+        ]
+        if added:
+            model.objects.bulk_create(
+                (model(user=request.user, recipe_id=pk) for pk in added),
+                ignore_conflicts=True
+            )
+            Recipe.objects.change_counter(RECIPE_COUNTERS[model], added, 1)
+            if model is ShoppingCart:
+                ShoppingListTotal.objects.add_recipes(request.user, added)
+        return self._batch_response(
+            recipe_ids, state, added, 'added', 'exists'
+        )
+
+    @transaction.atomic
+    def _batch_delete(self, request, model):
+        recipe_ids, state = self._get_batch_state(request, model)
+        removed = [
+            recipe_id for recipe_id in recipe_ids if state.get(recipe_id)
+        ]
+        if removed:
+            model.objects.filter(
+                user=request.user, recipe_id__in=removed
+            ).delete()
+            if model is ShoppingCart:
+                ShoppingListTotal.objects.remove_recipes(request.user, removed)
+        return self._batch_response(
+            recipe_ids, state, removed, 'removed', 'absent'
+        )
+
+    @action(
+        methods=['POST'], detail=False, url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def favorite_batch(self, request):
+        """
+        Добавляет в избранное рецепты ``{"recipes": [1, 2, 3]}``
+        и возвращает результат по каждому id: added, exists
+        или not_found.
+        """
+        return self._batch_create(request, Favorite)
+
+    @favorite_batch.mapping.delete
+    def delete_favorite_batch(self, request):
+        return self._batch_delete(request, Favorite)
+
+    @action(
+        methods=['POST'], detail=False, url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def shopping_cart_batch(self, request):
+        """Пакетное добавление рецептов в список покупок."""
+        return self._batch_create(request, ShoppingCart)
+
+    @shopping_cart_batch.mapping.delete
+    def delete_shopping_cart_batch(self, request):
+        return self._batch_delete(request, ShoppingCart)
+
+    def _get_ingredient_set(self):
+        have = self.request.query_params.get('have', '')
+        max_missing = self.request.query_params.get(
+            'max_missing', str(MAX_MISSING_INGREDIENTS)
+        )
+        ids = [value.strip() for value in have.split(',') if value.strip()]
+        if not ids or not all(value.isdigit() for value in ids):
+            raise serializers.ValidationError(
+                {'have': 'Ожидается список id ингредиентов через запятую.'}
+            )
+        if not max_missing.isdigit():
+            raise serializers.ValidationError(
+                {'max_missing': 'Ожидается целое неотрицательное число.'}
+            )
+        return [int(value) for value in ids], int(max_missing)
+
+    @action(methods=['GET'], detail=False, url_path='by-ingredients')
+    def by_ingredients(self, request):
+        """
+        Рецепты из имеющихся продуктов ``?have=1,5,17``: сначала те,
+        для которых есть большая часть ингредиентов. Рецепты, где
+        недостает больше ``?max_missing`` ингредиентов, не выводятся.
+        """
+        have, max_missing = self._get_ingredient_set()
+        matches = self.paginate_queryset(
+            recipe_ingredient_index.search(have, max_missing)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        page = []
+        for recipe_id, matched, missing in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched_count = matched
+                recipe.missing_count = missing
+                page.append(recipe)
+        serializer = RecipeMatchSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=['GET'], detail=False,
-        permission_classes=[permissions.AllowAny]
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def feed(self, request):
+        """
+        Рецепты авторов, на которых подписан пользователь, от новых
+        к старым. Страница — один проход по индексу ленты, число
+        подписок на стоимость запроса не влияет.
+        """
+        paginator = FeedCursorPagination()
+        items = paginator.paginate_queryset(
+            FeedItem.objects.filter(user=request.user).only(
+                'recipe_id', 'pub_date'
+            ),
+            request,
+            view=self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [item.recipe_id for item in items]
+        )
+        page = [
+            recipes[item.recipe_id] for item in items
+            if item.recipe_id in recipes
+        ]
+        serializer = RecipesListSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    def _get_shopping_list(self, user):
+        """
+        Суммы списка покупок. Пока команда rebuild_shopping_lists
+        не запускалась, суммы пользователя собираются при первом
+        обращении.
+        """
+        shopping_list = ShoppingListTotal.objects.filter(user=user)
+        if not shopping_list.exists():
+            ShoppingListTotal.objects.build_for_user(user)
+        return shopping_list.order_by('ingredient__name')
+
+    @action(
+        methods=['GET'], detail=False,
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def shopping_list(self, request):
+        shopping_list = self._get_shopping_list(
+            request.user
+        ).select_related('ingredient')
+        return response.Response(
+            ShoppingListSerializer(shopping_list, many=True).data
+        )
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= у списка покупок выбирает формат файла,
+        # а не рендерер DRF.
+        if self.action == 'download_shopping_cart':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
+    @action(
+        methods=['GET'], detail=False,
+        permission_classes=[permissions.IsAuthenticated]
     )
     def download_shopping_cart(self, request):
         user = self.request.user
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_CART_FORMATS:
+            raise serializers.ValidationError({
+                'format': 'Доступные форматы: {}.'.format(
+                    ', '.join(SHOPPING_CART_FORMATS)
+                )
+            })
         if not user.recipe_in_cart.exists():
             raise serializers.ValidationError({
                 'error': 'В списке покупок нет ни одного рецепта.'
             })
 
-        recipe_id_list = user.recipe_in_cart.values_list('recipe_id')
-        ingredients_in_cart = IngredientAmountForRecipe.objects.filter(
-            recipe__in=recipe_id_list
-        ).values_list(
-            'ingredient__name',
-            'ingredient__measurement_unit',
-            'amount'
-        )
-
-        ingredients = {}
-        for (name, measurement_unit, amount) in ingredients_in_cart:
-            if name not in ingredients:
-                ingredients[name] = {
-                    'name': name,
-                    'measurement_unit': measurement_unit,
-                    'amount': amount
-                }
-            else:
-                ingredients[name]['amount'] += amount
-
-        shopping_cart_out = 'Ваш список покупок:\n'
-        for ingredient in ingredients.values():
-            shopping_cart_out += '\u00B7 {} ({}) \u2014 {}\n'.format(
-                ingredient['name'].capitalize(),
-                ingredient['measurement_unit'],
-                ingredient['amount']
-            )
-        shopping_cart_out += get_shopping_cart_footer()
+        ingredients = self._get_shopping_list(user).values(
+            'ingredient_id',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            amount=F('total_amount')
+        )
 
-        response = HttpResponse(
-            shopping_cart_out, content_type='text/plain; charset=utf-8'
+        render, content_type = SHOPPING_CART_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            render(ingredients.iterator()), content_type=content_type
         )
 
-        filename = str(user) + '-shopping-list' + '.txt'
+        filename = str(user) + '-shopping-list' + '.' + file_format
         response['Content-Disposition'] = (
             'attachment; filename={}'.format(filename)
         )
@@ -0,0 +1,13 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite для разработки и тестов. Транзакции начинаются с BEGIN
+    IMMEDIATE: запись сразу берет блокировку базы, и параллельные
+    транзакции ждут ее в пределах OPTIONS['timeout'], а не падают
+    с «database is locked» при попытке записи после чтения.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
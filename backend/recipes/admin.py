@@ -1,12 +1,24 @@
 from django.contrib import admin
 
+from api.paginations import EstimatedCountPaginator
 from recipes.models import (Favorite, Ingredient, IngredientAmountForRecipe,
                             Recipe, ShoppingCart, Tag)
 
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Настройки списков по большим таблицам: приблизительное число
+    строк без фильтров и без второго COUNT(*) для «показать все».
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
 
 
@@ -19,17 +31,20 @@ class IngredientAdmin(admin.ModelAdmin):
 class IngredientInline(admin.StackedInline):
     model = IngredientAmountForRecipe
     extra = 0
+    autocomplete_fields = ('ingredient', )
 
 
 @admin.register(IngredientAmountForRecipe)
-class IngredientAmountForRecipeAdmin(admin.ModelAdmin):
+class IngredientAmountForRecipeAdmin(LargeTableAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
-    list_filter = ('recipe', )
+    list_select_related = ('recipe', 'ingredient')
+    raw_id_fields = ('recipe', )
+    autocomplete_fields = ('ingredient', )
     search_fields = ('ingredient__name', 'recipe__name')
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     inlines = (IngredientInline, )
     fields = (
         'author',
@@ -42,7 +57,9 @@ class RecipeAdmin(admin.ModelAdmin):
     )
 
     list_display = ('name', 'author', 'amount_favorite')
-    list_filter = ('author', 'name', 'tags')
+    list_select_related = ('author', )
+    list_filter = ('tags', )
+    autocomplete_fields = ('author', 'tags')
     search_fields = ('author__username', 'name__icontains')
 
     readonly_fields = ('ingredient_inline', )
@@ -62,16 +79,18 @@ class RecipeAdmin(admin.ModelAdmin):
         self.response = super().render_change_form(request, *args, **kwargs)
         return self.response
 
-    @admin.display(description='Количество в избранном')
+    @admin.display(
+        description='Количество в избранном', ordering='favorites_count'
+    )
     def amount_favorite(self, obj):
-        amount = Favorite.objects.filter(recipe=obj).count()
-        return amount
+        return obj.favorites_count
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
 
 
@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from recipes.search import setup_full_text_search
+        post_migrate.connect(setup_full_text_search, sender=self)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from api.conf import IMAGE_MEDIUM_WIDTH, IMAGE_THUMBNAIL_WIDTH
+
+DERIVATIVES = (
+    ('image_thumbnail', IMAGE_THUMBNAIL_WIDTH),
+    ('image_medium', IMAGE_MEDIUM_WIDTH),
+)
+
+
+def derivative_format() -> tuple[str, str]:
+    """WebP, если Pillow собран с его поддержкой, иначе JPEG."""
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def resize_to_width(image: Image.Image, width: int, format: str) -> bytes:
+    """Уменьшает картинку до заданной ширины, не увеличивая маленькие."""
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    if format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB' if format == 'JPEG' else 'RGBA')
+    buffer = BytesIO()
+    image.save(buffer, format=format, quality=80, method=4)
+    return buffer.getvalue()
+
+
+def make_image_derivatives(recipe) -> list[str]:
+    """
+    Создает миниатюру для списков и картинку среднего размера
+    для страницы рецепта. Возвращает имена измененных полей,
+    сохранять рецепт должен вызывающий код.
+    """
+    format, ext = derivative_format()
+    name = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    with recipe.image.open('rb') as fin, Image.open(fin) as source:
+        source.draft('RGB', (IMAGE_MEDIUM_WIDTH, IMAGE_MEDIUM_WIDTH))
+        image = ImageOps.exif_transpose(source)
+        for field, width in DERIVATIVES:
+            getattr(recipe, field).save(
+                '{}_{}.{}'.format(name, width, ext),
+                ContentFile(resize_to_width(image, width, format)),
+                save=False
+            )
+    return [field for field, _ in DERIVATIVES]
@@ -0,0 +1,70 @@
+import time
+from typing import Any, Optional
+
+from django.core.cache import cache
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.authentication import CachedTokenAuthentication, token_cache_key
+from api.cache import is_shared_cache
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для замера аутентификации по токену с кэшем и без
+    него на текущих базе и кэше. Команда только выводит p50 и p99:
+    соотношение зависит от машины, поэтому в тестах оно не проверяется.
+    Временный пользователь создается в транзакции, которая откатывается.
+    """
+    help = 'Сравнивает задержку аутентификации по токену с кэшем и без.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=1000,
+            help='Количество замеров для каждого варианта.'
+        )
+
+    @staticmethod
+    def _timings(auth, request, repeat: int) -> tuple[float, float]:
+        auth.authenticate(request)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            auth.authenticate(request)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        if not is_shared_cache():
+            self.stdout.write(
+                'The cache is process-local: CachedTokenAuthentication '
+                'falls back to the database.'
+            )
+        with transaction.atomic():
+            user = User.objects.create_user(
+                first_name='benchmark',
+                last_name='benchmark',
+                username='benchmark.auth',
+                email='benchmark.auth@example.com',
+                password=None
+            )
+            token = Token.objects.create(user=user)
+            request = RequestFactory().get(
+                '/', HTTP_AUTHORIZATION='Token ' + token.key
+            )
+            for name, auth in (('plain', TokenAuthentication()),
+                               ('cached', CachedTokenAuthentication())):
+                p50, p99 = self._timings(auth, request, options['repeat'])
+                self.stdout.write(
+                    '{:<8} p50 {:.3f} ms, p99 {:.3f} ms'
+                    .format(name, p50 * 1000, p99 * 1000)
+                )
+            cache.delete(token_cache_key(token.key))
+            transaction.set_rollback(True)
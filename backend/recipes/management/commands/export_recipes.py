@@ -0,0 +1,56 @@
+import time
+from typing import Any, Optional
+
+from django.core.management import BaseCommand
+from tqdm import tqdm
+
+from recipes.management.graph import (FORMAT, FORMAT_VERSION, export_chunks,
+                                      write_line)
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для потоковой выгрузки графа рецептов
+    (пользователи, справочники, рецепты, избранное, корзины
+    и подписки) в файл JSONL, по одной пачке строк на строку файла.
+    """
+    help = 'Выгружает рецепты и связанные таблицы в файл JSONL.'
+    chunk_size: int = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу выгрузки.')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=self.chunk_size,
+            help='Количество строк в одной пачке.'
+        )
+        parser.add_argument(
+            '--media',
+            action='store_true',
+            help='Выгрузить пути к картинкам рецептов.'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        rows_count = 0
+        started = time.perf_counter()
+        with open(options['path'], 'w', encoding='utf-8') as fout, \
+                tqdm(unit=' rows') as progress:
+            write_line(fout, {
+                'format': FORMAT,
+                'version': FORMAT_VERSION,
+                'media': options['media']
+            })
+            for number, label, rows in export_chunks(
+                options['chunk_size'], options['media']
+            ):
+                write_line(fout, {'chunk': number, 'model': label,
+                                  'rows': rows})
+                rows_count += len(rows)
+                progress.update(len(rows))
+        elapsed = time.perf_counter() - started
+
+        return self.stdout.write(
+            'Exported \033[1m{}\033[0m rows in {:.1f}s ({:.0f} rows/sec).'
+            .format(rows_count, elapsed, rows_count / max(elapsed, 1e-6))
+        )
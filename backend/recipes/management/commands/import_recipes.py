@@ -0,0 +1,76 @@
+import os
+import time
+from typing import Any, Optional
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from tqdm import tqdm
+
+from api.cache import bump_catalog_version, bump_recipe_ingredients_version
+from recipes.management.graph import (SECTIONS_BY_LABEL, GraphImporter,
+                                      read_chunks)
+from recipes.models import MediaBlob
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для загрузки графа рецептов из файла,
+    созданного командой export_recipes.
+
+    Каждая пачка загружается в отдельной транзакции вместе
+    с ее номером и добавленными ею соответствиями id. Повторный
+    запуск пропускает уже загруженные пачки. Записи, конфликтующие
+    с существующими по уникальным полям, пропускаются и выводятся
+    в stderr вместе с зависящими от них строками.
+    """
+    help = 'Загружает рецепты и связанные таблицы из файла JSONL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу выгрузки.')
+        parser.add_argument(
+            '--state',
+            help='Имя состояния загрузки (по умолчанию путь к файлу).'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        importer = GraphImporter(
+            options['state'] or os.path.abspath(options['path'])
+        )
+        rows_count = created = 0
+        started = time.perf_counter()
+        with open(options['path'], encoding='utf-8') as fin, \
+                tqdm(unit=' rows') as progress:
+            for chunk in read_chunks(fin):
+                if chunk['chunk'] <= importer.chunk:
+                    continue
+                section = SECTIONS_BY_LABEL.get(chunk['model'])
+                if section is None:
+                    raise CommandError(
+                        'Неизвестная таблица: {}'.format(chunk['model'])
+                    )
+                with transaction.atomic():
+                    created += importer.load_chunk(section, chunk['rows'])
+                    importer.chunk = chunk['chunk']
+                    importer.save_state()
+                rows_count += len(chunk['rows'])
+                progress.update(len(chunk['rows']))
+        elapsed = time.perf_counter() - started
+
+        bump_catalog_version()
+        bump_recipe_ingredients_version()
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+        call_command('reconcile_recipe_counters', stdout=self.stdout)
+        MediaBlob.objects.recount()
+        importer.remove_state()
+        for label, old_id, field, value in importer.conflicts:
+            self.stderr.write(
+                'Skipped {} #{}: {} {!r} is already taken.'
+                .format(label, old_id, field, value)
+            )
+        return self.stdout.write(
+            'Imported \033[1m{}\033[0m rows ({} created, {} conflicts) '
+            'in {:.1f}s ({:.0f} rows/sec).'
+            .format(rows_count, created, len(importer.conflicts), elapsed,
+                    rows_count / max(elapsed, 1e-6))
+        )
@@ -1,41 +1,18 @@
-import json
-import os
-from typing import Any, Optional
-
-from django.core.management import BaseCommand
-from tqdm import tqdm
-
+from api.indexes import trigram_index
+from recipes.management.loaders import LoadDataCommand
 from recipes.models import Ingredient
 
 
-class Command(BaseCommand):
+class Command(LoadDataCommand):
     """
     Класс команды для загрузки данных
-    игнредиентов из json файла.
+    игнредиентов из csv, json или jsonl файла.
     """
+    model = Ingredient
     filename: str = 'ingredients'
-    ext: str = '.json'
-    path_to_file: str = os.path.join('static', 'data', filename + ext)
-
-    def handle(self, *args: Any, **options: Any) -> Optional[str]:
-        if Ingredient.objects.exists():
-            self.stdout.write(
-                'Initial data '
-                '\033[0;33;48m{}\033[0;0m '
-                'already exists.'.format(self.filename)
-            )
-            return
-
-        with open(self.path_to_file, 'rb') as fin:
-            data: list[dict[str, str]] = json.load(fin)
-
-            for entry in tqdm(data):
-                ingredient = Ingredient()
-                ingredient.name = entry.get('name')
-                ingredient.measurement_unit = entry.get('measurement_unit')
-                ingredient.save()
+    fields: tuple = ('name', 'measurement_unit')
+    key_fields: tuple = ('name', 'measurement_unit')
 
-        return self.stdout.write(
-            'Loading \033[1m{}\033[0m data successfully done.'
-            .format(self.filename)
-        )
+    def after_load(self) -> None:
+        super().after_load()
+        trigram_index.write()
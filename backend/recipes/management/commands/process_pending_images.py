@@ -0,0 +1,76 @@
+import os
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+from recipes.tasks import process_recipe_image
+
+UPLOADS_DIRECTORY = Recipe._meta.get_field('image_upload').upload_to
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для обработки картинок, оставшихся в статусе
+    «обрабатывается», например после перезапуска воркера,
+    который не успел их обработать.
+    """
+    help = (
+        'Обрабатывает картинки рецептов, зависшие в очереди, '
+        'и удаляет загрузки без рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=10,
+            help='Не трогать загрузки, созданные за последние N минут.'
+        )
+
+    def _process_pending(self, deadline) -> int:
+        processed = 0
+        pending = Recipe.objects.filter(
+            image_status=Recipe.ImageStatus.PENDING
+        ).exclude(image_upload='').values_list('pk', 'image_upload')
+        for pk, name in pending.iterator():
+            if (default_storage.exists(name)
+                    and default_storage.get_modified_time(name) >= deadline):
+                continue
+            process_recipe_image(pk, name)
+            processed += 1
+        return processed
+
+    def _remove_orphans(self, deadline) -> int:
+        """Загрузки, рецепт которых не сохранился или уже обработан."""
+        removed = 0
+        if not default_storage.exists(UPLOADS_DIRECTORY):
+            return removed
+        used = set(
+            Recipe.objects.exclude(image_upload='')
+            .values_list('image_upload', flat=True)
+        )
+        for file in default_storage.listdir(UPLOADS_DIRECTORY)[1]:
+            name = os.path.join(UPLOADS_DIRECTORY, file)
+            if (name not in used
+                    and default_storage.get_modified_time(name) < deadline):
+                default_storage.delete(name)
+                removed += 1
+        return removed
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        deadline = timezone.now() - timedelta(minutes=options['grace'])
+        processed = self._process_pending(deadline)
+        failed = Recipe.objects.filter(
+            image_status=Recipe.ImageStatus.PENDING, image_upload=''
+        ).update(image_status=Recipe.ImageStatus.FAILED)
+        removed = self._remove_orphans(deadline)
+
+        return self.stdout.write(
+            'Processed \033[1m{}\033[0m pending images, {} without '
+            'uploads marked failed, {} orphan uploads removed.'
+            .format(processed, failed, removed)
+        )
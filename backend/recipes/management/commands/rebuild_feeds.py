@@ -0,0 +1,37 @@
+from typing import Any, Optional
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedItem
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для пересборки лент подписок по подпискам
+    и рецептам, например после загрузки данных через bulk_create.
+    """
+    help = 'Пересобирает ленты подписок.'
+    batch_size: int = 1000
+
+    @transaction.atomic
+    def _rebuild(self) -> int:
+        FeedItem.objects.all().delete()
+        rows = (
+            FeedItem(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for user_id, recipe_id, author_id, pub_date
+            in FeedItem.objects.live_items().iterator()
+        )
+        return len(FeedItem.objects.bulk_create(
+            rows, batch_size=self.batch_size
+        ))
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        return self.stdout.write(
+            'Rebuilt \033[1m{}\033[0m feed items.'.format(self._rebuild())
+        )
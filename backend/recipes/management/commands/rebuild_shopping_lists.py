@@ -0,0 +1,67 @@
+from typing import Any, Optional
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListTotal
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для пересборки или проверки
+    сумм ингредиентов в списках покупок.
+    """
+    help = (
+        'Пересобирает таблицу сумм списков покупок по корзинам. '
+        'С флагом --check только сравнивает ее с корзинами.'
+    )
+    batch_size: int = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя.'
+        )
+
+    def _drift(self) -> dict:
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingListTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            ).iterator()
+        }
+        drift = {}
+        for row in ShoppingListTotal.objects.live_totals().iterator():
+            key = (row['user_id'], row['ingredient_id'])
+            if stored.pop(key, None) != row['total_amount']:
+                drift[key] = row['total_amount']
+        drift.update(dict.fromkeys(stored, None))
+        return drift
+
+    @transaction.atomic
+    def _rebuild(self) -> int:
+        ShoppingListTotal.objects.all().delete()
+        rows = (
+            ShoppingListTotal(**row)
+            for row in ShoppingListTotal.objects.live_totals().iterator()
+        )
+        return len(ShoppingListTotal.objects.bulk_create(
+            rows, batch_size=self.batch_size
+        ))
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        if options['check']:
+            drift = self._drift()
+            if drift:
+                raise CommandError(
+                    'Found {} mismatched shopping list rows.'
+                    .format(len(drift))
+                )
+            return self.stdout.write('Shopping lists are consistent.')
+
+        return self.stdout.write(
+            'Rebuilt \033[1m{}\033[0m shopping list rows.'
+            .format(self._rebuild())
+        )
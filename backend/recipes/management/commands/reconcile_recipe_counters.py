@@ -0,0 +1,73 @@
+from typing import Any, Optional
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+COUNTERS = {
+    'favorites_count': Favorite,
+    'in_carts_count': ShoppingCart
+}
+
+
+def live_count(model):
+    """Подзапрос с числом записей ``model`` для рецепта."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для сверки счетчиков избранного и списков
+    покупок рецептов с таблицами Favorite и ShoppingCart.
+    """
+    help = (
+        'Пересчитывает счетчики избранного и списков покупок рецептов. '
+        'С флагом --check только ищет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя.'
+        )
+
+    @staticmethod
+    def _drifted():
+        mismatch = Q()
+        for field in COUNTERS:
+            mismatch |= ~Q(**{field: F('live_' + field)})
+        return Recipe.objects.alias(**{
+            'live_' + field: live_count(model)
+            for field, model in COUNTERS.items()
+        }).filter(mismatch)
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        drifted = self._drifted()
+        if options['check']:
+            count = drifted.count()
+            if count:
+                raise CommandError(
+                    'Found {} recipes with mismatched counters.'
+                    .format(count)
+                )
+            return self.stdout.write('Recipe counters are consistent.')
+
+        counters = {
+            field: live_count(model) for field, model in COUNTERS.items()
+        }
+        updated = Recipe.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(**counters)
+        return self.stdout.write(
+            'Reconciled \033[1m{}\033[0m recipe counters.'.format(updated)
+        )
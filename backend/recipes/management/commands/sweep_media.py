@@ -0,0 +1,87 @@
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.management.loaders import batched
+from recipes.models import MediaBlob
+from recipes.storage import content_addressed_storage
+
+
+class Command(BaseCommand):
+    """
+    Класс команды для удаления файлов картинок,
+    на которые больше не ссылается ни один рецепт.
+    """
+    help = (
+        'Удаляет файлы картинок без ссылок из рецептов. '
+        'С флагом --recount сначала пересчитывает счетчики ссылок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60,
+            help='Не трогать файлы, измененные за последние N минут.'
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Пересчитать счетчики ссылок по таблице рецептов.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def _sweep_blobs(self, deadline, dry_run: bool) -> int:
+        removed = 0
+        candidates = MediaBlob.objects.filter(
+            ref_count__lte=0, updated__lt=deadline
+        ).values_list('pk', 'name')
+        for pk, name in candidates.iterator():
+            if dry_run:
+                self.stdout.write(name)
+            elif MediaBlob.objects.filter(
+                pk=pk, ref_count__lte=0
+            ).delete()[0]:
+                content_addressed_storage.delete(name)
+            removed += 1
+        return removed
+
+    def _sweep_orphans(self, deadline, dry_run: bool) -> int:
+        """Файлы без записи о ссылках, например от отмененных загрузок."""
+        removed = 0
+        for names in batched(content_addressed_storage.iter_blobs(), 1000):
+            known = set(
+                MediaBlob.objects.filter(name__in=names)
+                .values_list('name', flat=True)
+            )
+            for name in names:
+                if name in known or (
+                    content_addressed_storage.get_modified_time(name)
+                    >= deadline
+                ):
+                    continue
+                if dry_run:
+                    self.stdout.write(name)
+                else:
+                    content_addressed_storage.delete(name)
+                removed += 1
+        return removed
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        if options['recount']:
+            MediaBlob.objects.recount()
+        deadline = timezone.now() - timedelta(minutes=options['grace'])
+        removed = self._sweep_blobs(deadline, options['dry_run'])
+        removed += self._sweep_orphans(deadline, options['dry_run'])
+
+        return self.stdout.write(
+            '{} \033[1m{}\033[0m unused media files.'.format(
+                'Found' if options['dry_run'] else 'Removed', removed
+            )
+        )
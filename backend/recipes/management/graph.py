@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import datetime
+import json
+from typing import IO, Any, Iterator, NamedTuple, Optional
+
+from django.core.management import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from recipes.management.loaders import batched
+from recipes.models import (RECIPE_MEDIA_FIELDS, Favorite, ImportIdMapping,
+                            ImportState, Ingredient,
+                            IngredientAmountForRecipe, Recipe, ShoppingCart,
+                            Tag)
+from users.models import Follow, User
+
+FORMAT = 'foodgram-graph'
+FORMAT_VERSION = 1
+
+
+class Section(NamedTuple):
+    """
+    Описание одной таблицы графа рецептов.
+
+    ``fields`` выгружаются как есть, ``foreign_keys`` переводятся
+    из id исходной базы в id целевой по карте ``{поле: имя карты}``.
+    Записи с ``key`` сопоставляются с существующими по естественному
+    ключу, id созданных и найденных записей попадают в карту ``id_map``.
+    Новые записи, значение ``unique``-поля которых уже занято,
+    пропускаются и попадают в отчет о конфликтах.
+    """
+    label: str
+    model: type
+    fields: tuple
+    foreign_keys: dict = {}
+    key: tuple = ()
+    unique: tuple = ()
+    id_map: Optional[str] = None
+    preserve: tuple = ()
+
+
+SECTIONS = (
+    Section(
+        'users.user', User,
+        fields=('username', 'email', 'first_name', 'last_name', 'password',
+                'is_active', 'is_staff', 'is_superuser', 'date_joined'),
+        key=('username', ),
+        unique=('email', ),
+        id_map='users'
+    ),
+    Section(
+        'recipes.tag', Tag,
+        fields=('name', 'color', 'slug'),
+        key=('slug', ),
+        unique=('name', 'color'),
+        id_map='tags'
+    ),
+    Section(
+        'recipes.ingredient', Ingredient,
+        fields=('name', 'measurement_unit'),
+        key=('name', 'measurement_unit'),
+        id_map='ingredients'
+    ),
+    Section(
+        'recipes.recipe', Recipe,
+        fields=('name', 'image', 'image_thumbnail', 'image_medium',
+                'image_status', 'text', 'cooking_time', 'pub_date'),
+        foreign_keys={'author_id': 'users'},
+        id_map='recipes',
+        preserve=('pub_date', )
+    ),
+    Section(
+        'recipes.recipe_tags', Recipe.tags.through,
+        fields=(),
+        foreign_keys={'recipe_id': 'recipes', 'tag_id': 'tags'}
+    ),
+    Section(
+        'recipes.ingredientamountforrecipe', IngredientAmountForRecipe,
+        fields=('amount', ),
+        foreign_keys={'recipe_id': 'recipes', 'ingredient_id': 'ingredients'}
+    ),
+    Section(
+        'recipes.favorite', Favorite,
+        fields=(),
+        foreign_keys={'user_id': 'users', 'recipe_id': 'recipes'}
+    ),
+    Section(
+        'recipes.shoppingcart', ShoppingCart,
+        fields=(),
+        foreign_keys={'user_id': 'users', 'recipe_id': 'recipes'}
+    ),
+    Section(
+        'users.follow', Follow,
+        fields=(),
+        foreign_keys={'user_id': 'users', 'author_id': 'users'}
+    ),
+)
+SECTIONS_BY_LABEL = {section.label: section for section in SECTIONS}
+
+
+def export_chunks(
+    chunk_size: int, media: bool = False
+) -> Iterator[tuple[int, str, list]]:
+    """
+    Отдает граф рецептов пачками ``(номер, таблица, строки)``.
+    Таблицы читаются серверным курсором, поэтому в памяти
+    одновременно находится не больше одной пачки.
+    """
+    number = 0
+    for section in SECTIONS:
+        columns = ('id', *section.foreign_keys, *section.fields)
+        rows = section.model.objects.order_by('pk').values(*columns)
+        for batch in batched(rows.iterator(chunk_size=chunk_size),
+                             chunk_size):
+            if section.model is Recipe and not media:
+                for row in batch:
+                    row.update(dict.fromkeys(RECIPE_MEDIA_FIELDS, ''))
+            number += 1
+            yield number, section.label, batch
+
+
+class GraphJSONEncoder(DjangoJSONEncoder):
+    """Сохраняет время с микросекундами, чтобы не менять порядок лент."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def write_line(fout: IO[str], data: dict) -> None:
+    fout.write(json.dumps(data, cls=GraphJSONEncoder, ensure_ascii=False))
+    fout.write('\n')
+
+
+def read_chunks(fin: IO[str]) -> Iterator[dict]:
+    """Читает файл выгрузки построчно, проверяя заголовок."""
+    header = json.loads(fin.readline() or 'null')
+    if not isinstance(header, dict) or header.get('format') != FORMAT:
+        raise CommandError('Файл не является выгрузкой графа рецептов.')
+    if header.get('version') != FORMAT_VERSION:
+        raise CommandError(
+            'Неподдерживаемая версия выгрузки: {}'.format(header['version'])
+        )
+    for line in fin:
+        if line.strip():
+            yield json.loads(line)
+
+
+class GraphImporter:
+    """
+    Загружает пачки выгрузки в базу, переводя внешние ключи
+    по картам id. Номер последней загруженной пачки (``ImportState``)
+    и добавленные ею соответствия id (``ImportIdMapping``)
+    сохраняются в транзакции пачки, чтобы прерванную загрузку можно
+    было продолжить с того же места.
+    """
+
+    def __init__(self, state_name: str):
+        self.state_name = state_name
+        self.chunk = 0
+        self.id_maps = {
+            section.id_map: {} for section in SECTIONS if section.id_map
+        }
+        self.new_mappings: list[tuple[str, int, int]] = []
+        self.conflicts: list[tuple[str, int, str, Any]] = []
+        state = ImportState.objects.filter(name=state_name).first()
+        if state is not None:
+            self.chunk = state.chunk
+            mappings = state.id_mappings.values_list(
+                'map_name', 'old_id', 'new_id'
+            )
+            for name, old_id, new_id in mappings.iterator():
+                self.id_maps[name][old_id] = new_id
+
+    def save_state(self) -> None:
+        """Вызывается внутри транзакции загруженной пачки."""
+        state, _ = ImportState.objects.update_or_create(
+            name=self.state_name, defaults={'chunk': self.chunk}
+        )
+        ImportIdMapping.objects.bulk_create(
+            (
+                ImportIdMapping(
+                    state=state, map_name=name, old_id=old_id, new_id=new_id
+                )
+                for name, old_id, new_id in self.new_mappings
+            ),
+            batch_size=1000
+        )
+        self.new_mappings = []
+
+    def remove_state(self) -> None:
+        ImportState.objects.filter(name=self.state_name).delete()
+
+    def _map(self, section: Section, old_id: int, new_id: int) -> None:
+        self.id_maps[section.id_map][old_id] = new_id
+        self.new_mappings.append((section.id_map, old_id, new_id))
+
+    def _remap(self, section: Section, rows: list) -> list[dict]:
+        result = []
+        for row in rows:
+            values = {field: row[field] for field in section.fields}
+            for field, name in section.foreign_keys.items():
+                values[field] = self.id_maps[name].get(row[field])
+            if None not in (values[field] for field in section.foreign_keys):
+                values['old_id'] = row['id']
+                result.append(values)
+        return result
+
+    def _existing(self, section: Section, rows: list) -> dict:
+        lookup = {
+            section.key[0] + '__in': {row[section.key[0]] for row in rows}
+        }
+        return {
+            tuple(values[1:]): values[0]
+            for values in section.model.objects.filter(**lookup)
+            .values_list('pk', *section.key)
+        }
+
+    def _without_conflicts(self, section: Section, rows: list) -> list:
+        """Новые строки, не нарушающие уникальность полей ``unique``."""
+        for field in section.unique:
+            taken = set(
+                section.model.objects.filter(**{
+                    field + '__in': {row[field] for row in rows}
+                }).values_list(field, flat=True)
+            )
+            kept = []
+            for row in rows:
+                if row[field] in taken:
+                    self.conflicts.append(
+                        (section.label, row['old_id'], field, row[field])
+                    )
+                else:
+                    taken.add(row[field])
+                    kept.append(row)
+            rows = kept
+        return rows
+
+    def _create(self, section: Section, rows: list) -> list:
+        objs = [
+            section.model(**{
+                field: value for field, value in row.items()
+                if field != 'old_id'
+            })
+            for row in rows
+        ]
+        if section.id_map is None:
+            section.model.objects.bulk_create(objs, ignore_conflicts=True)
+            return objs
+        if connection.features.can_return_rows_from_bulk_insert:
+            section.model.objects.bulk_create(objs)
+        else:
+            for obj in objs:
+                obj.save()
+        if section.preserve:
+            for obj, row in zip(objs, rows):
+                for field in section.preserve:
+                    setattr(obj, field, row[field])
+            section.model.objects.bulk_update(objs, section.preserve)
+        return objs
+
+    def load_chunk(self, section: Section, rows: list) -> int:
+        """Загружает одну пачку и возвращает число созданных записей."""
+        rows = self._remap(section, rows)
+        if section.key and rows:
+            existing = self._existing(section, rows)
+            new_rows = []
+            for row in rows:
+                pk = existing.get(tuple(row[field] for field in section.key))
+                if pk is None:
+                    new_rows.append(row)
+                else:
+                    self._map(section, row['old_id'], pk)
+            rows = self._without_conflicts(section, new_rows)
+        objs = self._create(section, rows)
+        if section.id_map is not None:
+            for obj, row in zip(objs, rows):
+                self._map(section, row['old_id'], obj.pk)
+        return len(objs)
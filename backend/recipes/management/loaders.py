@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator, Optional
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from tqdm import tqdm
+
+from api.cache import bump_catalog_version
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(rows)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _skip_separators(buffer: str, position: int) -> int:
+    while position < len(buffer) and buffer[position] in ' \t\r\n,':
+        position += 1
+    return position
+
+
+def _read_array_start(fin: IO[str], chunk_size: int) -> str:
+    """Читает файл до открывающей скобки массива и возвращает остаток."""
+    buffer = ''
+    for chunk in iter(lambda: fin.read(chunk_size), ''):
+        buffer += chunk
+        position = _skip_separators(buffer, 0)
+        if position < len(buffer):
+            if buffer[position] != '[':
+                break
+            return buffer[position + 1:]
+    raise CommandError('Ожидается JSON-массив.')
+
+
+def iter_json_array(fin: IO[str], chunk_size: int = 64 * 1024) -> Iterator:
+    """
+    Потоково разбирает JSON-массив объектов, не загружая файл целиком:
+    в памяти держится только недочитанный хвост буфера.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = _read_array_start(fin, chunk_size), 0
+    while True:
+        position = _skip_separators(buffer, position)
+        if position < len(buffer):
+            if buffer[position] == ']':
+                return
+            try:
+                entry, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield entry
+                continue
+        chunk = fin.read(chunk_size)
+        if not chunk:
+            raise CommandError('Файл JSON обрывается на середине.')
+        buffer, position = buffer[position:] + chunk, 0
+
+
+def read_rows(path: str, fieldnames: tuple) -> Iterator[dict]:
+    """Построчно читает CSV (без заголовка), JSON или JSONL."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8', newline='') as fin:
+        if ext == '.csv':
+            yield from csv.DictReader(fin, fieldnames=fieldnames)
+        elif ext == '.jsonl':
+            yield from (json.loads(line) for line in fin if line.strip())
+        elif ext == '.json':
+            yield from iter_json_array(fin)
+        else:
+            raise CommandError('Неподдерживаемый формат файла: {}'.format(ext))
+
+
+class LoadDataCommand(BaseCommand):
+    """
+    Базовый класс команд загрузки справочников.
+
+    Файл читается потоково и записывается пачками через bulk_create.
+    В режиме --upsert существующие записи ищутся по ``key_fields``:
+    новые вставляются, отличающиеся по ``update_fields`` обновляются,
+    остальные пропускаются. Новые записи, нарушающие другие
+    ограничения уникальности (например, тег с новым slug и уже
+    занятым названием), не вставляются и выводятся в stderr.
+    """
+    model = None
+    filename: str = ''
+    fields: tuple = ()
+    key_fields: tuple = ()
+    update_fields: tuple = ()
+    batch_size: int = 1000
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join('static', 'data', self.filename + '.json'),
+            help='Путь к файлу .csv, .json или .jsonl.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=self.batch_size,
+            help='Количество записей в одном INSERT.'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help='Дозагрузить и обновить данные в непустой таблице.'
+        )
+
+    def _key(self, entry) -> tuple:
+        if isinstance(entry, dict):
+            return tuple(entry.get(field) for field in self.key_fields)
+        return tuple(getattr(entry, field) for field in self.key_fields)
+
+    def _existing(self, keys: set) -> dict:
+        first_field = self.key_fields[0]
+        lookup = {first_field + '__in': {key[0] for key in keys}}
+        return {
+            self._key(obj): obj
+            for obj in self.model.objects.filter(**lookup)
+        }
+
+    def _insert(self, new: list) -> int:
+        """Вставляет записи и возвращает число записанных на самом деле."""
+        if not new:
+            return 0
+        self.model.objects.bulk_create(new, ignore_conflicts=True)
+        keys = {self._key(obj) for obj in new}
+        written = keys & set(self._existing(keys))
+        self.conflicts.extend(sorted(keys - written))
+        return len(written)
+
+    @transaction.atomic
+    def _load_batch(self, batch: list[dict]) -> tuple[int, int, int, int]:
+        rows = {}
+        for entry in batch:
+            rows.setdefault(self._key(entry), entry)
+        existing = self._existing(set(rows))
+        new, changed = [], []
+        for key, entry in rows.items():
+            obj = existing.get(key)
+            if obj is None:
+                new.append(self.model(
+                    **{field: entry.get(field) for field in self.fields}
+                ))
+                continue
+            if any(getattr(obj, field) != entry.get(field)
+                   for field in self.update_fields):
+                for field in self.update_fields:
+                    setattr(obj, field, entry.get(field))
+                changed.append(obj)
+        inserted = self._insert(new)
+        if self.update_fields:
+            self.model.objects.bulk_update(changed, self.update_fields)
+        return (
+            inserted, len(changed),
+            len(batch) - len(new) - len(changed), len(new) - inserted
+        )
+
+    def after_load(self) -> None:
+        bump_catalog_version()
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        if not options['upsert'] and self.model.objects.exists():
+            self.stdout.write(
+                'Initial data '
+                '\033[0;33;48m{}\033[0;0m '
+                'already exists. Use --upsert to update it.'
+                .format(self.filename)
+            )
+            return
+
+        self.conflicts = []
+        totals = [0, 0, 0, 0]
+        rows = read_rows(options['path'], self.fields)
+        with tqdm(unit=' rows') as progress:
+            for batch in batched(rows, options['batch_size']):
+                for position, count in enumerate(self._load_batch(batch)):
+                    totals[position] += count
+                progress.update(len(batch))
+        self.after_load()
+        for key in self.conflicts:
+            self.stderr.write(
+                'Conflicts with existing rows: {}'.format(
+                    ', '.join(map(str, key))
+                )
+            )
+
+        return self.stdout.write(
+            'Loading \033[1m{}\033[0m data successfully done: '
+            'inserted {}, updated {}, skipped {}, conflicts {}.'
+            .format(self.filename, *totals)
+        )
@@ -1,9 +1,17 @@
+from collections import defaultdict
+from itertools import islice
+
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from recipes.storage import content_addressed_storage
 from recipes.validators import validate_color
-from users.models import User
+from users.models import Follow, User
 
 
 class Ingredient(models.Model):
@@ -17,6 +25,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_unit'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -50,7 +64,47 @@ class Tag(models.Model):
         return self.slug
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def latest_by_author(self, author_ids, limit):
+        """
+        Не больше ``limit`` последних рецептов каждого автора одним
+        запросом: номер рецепта внутри автора считает оконная функция
+        ROW_NUMBER() по рецептам только переданных авторов.
+        """
+        author_ids = list(author_ids)
+        if not author_ids:
+            return self.none()
+        table = self.model._meta.db_table
+        return self.filter(pk__in=RawSQL(
+            'SELECT id FROM ('
+            'SELECT id, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            ') AS position FROM {} WHERE author_id IN ({})'
+            ') AS ranked WHERE position <= %s'
+            .format(table, ', '.join(['%s'] * len(author_ids))),
+            [*author_ids, limit]
+        ))
+
+    def change_counter(self, field, recipe_ids, delta):
+        """
+        Атомарно меняет счетчик рецептов одним UPDATE через F().
+        Счетчик не уходит ниже нуля, даже если еще не пересчитан
+        командой reconcile_recipe_counters.
+        """
+        if recipe_ids and delta:
+            self.filter(pk__in=recipe_ids).update(
+                **{field: Greatest(F(field) + delta, Value(0))}
+            )
+
+
 class Recipe(models.Model):
+
+    class ImageStatus(models.TextChoices):
+        PENDING = 'pending', 'Обрабатывается'
+        READY = 'ready', 'Готова'
+        FAILED = 'failed', 'Ошибка обработки'
+
     author = models.ForeignKey(
         User,
         related_name='recipes',
@@ -63,8 +117,32 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=content_addressed_storage,
         verbose_name='Картинка'
     )
+    image_thumbnail = models.ImageField(
+        upload_to='recipes/images/thumbnails/',
+        storage=content_addressed_storage,
+        blank=True,
+        verbose_name='Миниатюра картинки'
+    )
+    image_medium = models.ImageField(
+        upload_to='recipes/images/medium/',
+        storage=content_addressed_storage,
+        blank=True,
+        verbose_name='Картинка среднего размера'
+    )
+    image_status = models.CharField(
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.READY,
+        verbose_name='Статус картинки'
+    )
+    image_upload = models.FileField(
+        upload_to='recipes/uploads/',
+        blank=True,
+        verbose_name='Картинка в обработке'
+    )
     text = models.TextField(verbose_name='Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -93,9 +171,33 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество в избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество в списках покупок'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=('cooking_time', '-pub_date', '-id'),
+                name='recipe_cooking_time_idx'
+            )
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -147,6 +249,29 @@ class IngredientAmountForRecipe(models.Model):
         )
 
 
+class RecipeRelationQuerySet(models.QuerySet):
+
+    def delete(self):
+        """
+        Массовое удаление (например, действие админки) уменьшает
+        счетчики рецептов: строки группируются по рецепту, и на каждое
+        число удаленных строк приходится один UPDATE. Сигнал
+        post_delete такие удаления пропускает.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            recipes_by_count = defaultdict(list)
+            for recipe_id, count in self.order_by().values(
+                'recipe_id'
+            ).annotate(count=Count('pk')).values_list('recipe_id', 'count'):
+                recipes_by_count[count].append(recipe_id)
+            deleted = super().delete()
+            for count, recipe_ids in recipes_by_count.items():
+                Recipe.objects.change_counter(
+                    RECIPE_COUNTERS[self.model], recipe_ids, -count
+                )
+        return deleted
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User,
@@ -160,6 +285,8 @@ class Favorite(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = RecipeRelationQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -191,6 +318,8 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = RecipeRelationQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -207,3 +336,381 @@ class ShoppingCart(models.Model):
             'Рецепт: [ {} ]'
             .format(self.user, self.recipe)
         )
+
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count'
+}
+
+
+class ShoppingListTotalManager(models.Manager):
+    """
+    Инкрементальное обновление сумм ингредиентов в списках покупок.
+
+    Изменения передаются словарем ``{ingredient_id: delta}`` и
+    применяются одним UPDATE для всех затронутых пользователей.
+    """
+
+    def _apply(self, user_ids, deltas):
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not user_ids or not deltas:
+            return
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=0
+                )
+                for user_id in user_ids
+                for ingredient_id, delta in deltas.items()
+                if delta > 0
+            ),
+            ignore_conflicts=True
+        )
+        rows = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        rows.update(
+            total_amount=F('total_amount') + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0)
+            )
+        )
+        rows.filter(total_amount__lte=0).delete()
+
+    @staticmethod
+    def recipe_amounts(recipe_ids):
+        return dict(
+            IngredientAmountForRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('ingredient_id').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient_id', 'total')
+        )
+
+    def add_recipes(self, user, recipe_ids):
+        self._apply([user.id], self.recipe_amounts(recipe_ids))
+
+    def remove_recipes(self, user, recipe_ids):
+        deltas = self.recipe_amounts(recipe_ids)
+        self._apply(
+            [user.id],
+            {key: -value for key, value in deltas.items()}
+        )
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """
+        Переносит изменение ингредиентов рецепта в списки покупок
+        всех пользователей, у которых рецепт лежит в корзине.
+        """
+        deltas = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in {*old_amounts, *new_amounts}
+        }
+        if not any(deltas.values()):
+            return
+        user_ids = list(
+            ShoppingCart.objects.filter(recipe=recipe)
+            .values_list('user_id', flat=True)
+        )
+        self._apply(user_ids, deltas)
+
+    def build_for_user(self, user):
+        """
+        Собирает суммы пользователя по его корзине, если их еще нет:
+        например, для корзин, созданных до появления таблицы сумм.
+        """
+        self.bulk_create(
+            (self.model(**row) for row in self.live_totals(user)),
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def live_totals(user=None):
+        """Суммы, посчитанные заново по корзинам и рецептам."""
+        lookup = (
+            {'recipe__shoppingcart__isnull': False} if user is None
+            else {'recipe__shoppingcart__user': user}
+        )
+        return IngredientAmountForRecipe.objects.filter(**lookup).values(
+            'ingredient_id', user_id=F('recipe__shoppingcart__user')
+        ).annotate(total_amount=Sum('amount'))
+
+
+class ShoppingListTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField(verbose_name='Общее количество')
+
+    objects = ShoppingListTotalManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+        verbose_name = 'Сумма ингредиента в списке покупок'
+        verbose_name_plural = 'Суммы ингредиентов в списках покупок'
+
+    def __str__(self):
+        return (
+            'Пользователь: [ {} ]; '
+            'Ингредиент: [ {} ]'
+            .format(self.user, self.ingredient)
+        )
+
+
+RECIPE_MEDIA_FIELDS = ('image', 'image_thumbnail', 'image_medium')
+
+
+class MediaBlobManager(models.Manager):
+    """Счетчики ссылок рецептов на файлы картинок."""
+
+    def acquire(self, names):
+        names = {name for name in names if name}
+        if not names:
+            return
+        self.bulk_create(
+            (self.model(name=name) for name in names),
+            ignore_conflicts=True
+        )
+        self.filter(name__in=names).update(
+            ref_count=F('ref_count') + 1, updated=timezone.now()
+        )
+
+    def release(self, names):
+        names = {name for name in names if name}
+        if names:
+            self.filter(name__in=names).update(
+                ref_count=F('ref_count') - 1, updated=timezone.now()
+            )
+
+    @transaction.atomic
+    def recount(self):
+        """
+        Пересчитывает счетчики по таблице рецептов, например после
+        загрузки рецептов через bulk_create, минуя сигналы.
+        """
+        counts = {}
+        for names in Recipe.objects.values_list(
+            *RECIPE_MEDIA_FIELDS
+        ).iterator():
+            for name in filter(None, names):
+                counts[name] = counts.get(name, 0) + 1
+        self.bulk_create(
+            (self.model(name=name) for name in counts), ignore_conflicts=True
+        )
+        blobs = list(self.all())
+        for blob in blobs:
+            blob.ref_count = counts.get(blob.name, 0)
+        self.bulk_update(blobs, ('ref_count', ), batch_size=1000)
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Имя файла'
+    )
+    ref_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество ссылок'
+    )
+    updated = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата изменения'
+    )
+
+    objects = MediaBlobManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('ref_count', 'updated'),
+                name='media_blob_sweep_idx'
+            )
+        ]
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class FeedItemManager(models.Manager):
+    """
+    Ленты подписок, заполняемые при записи: рецепт попадает
+    в ленты подписчиков автора при создании, а подписка
+    переносит в ленту уже опубликованные рецепты автора.
+    """
+    batch_size = 1000
+
+    def _create(self, items):
+        items = iter(items)
+        batch = list(islice(items, self.batch_size))
+        while batch:
+            self.bulk_create(batch, ignore_conflicts=True)
+            batch = list(islice(items, self.batch_size))
+
+    def fan_out(self, recipe):
+        """Добавляет рецепт в ленты всех подписчиков автора."""
+        follower_ids = Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True)
+        self._create(
+            self.model(
+                user_id=user_id,
+                recipe_id=recipe.id,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date
+            )
+            for user_id in follower_ids.iterator()
+        )
+
+    def backfill(self, user_id, author_id):
+        """Добавляет в ленту подписчика все рецепты автора."""
+        recipes = Recipe.objects.filter(author_id=author_id).values_list(
+            'id', 'pub_date'
+        )
+        self._create(
+            self.model(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for recipe_id, pub_date in recipes.iterator()
+        )
+
+    def remove(self, user_id, author_id):
+        """Убирает из ленты подписчика рецепты автора."""
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def live_items(self):
+        """Записи лент, посчитанные заново по подпискам и рецептам."""
+        return Recipe.objects.filter(
+            author__following__isnull=False
+        ).values_list(
+            'author__following__user_id', 'id', 'author_id', 'pub_date'
+        )
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = FeedItemManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_item_user_date_idx'
+            )
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+
+    def __str__(self):
+        return (
+            'Подписчик: [ {} ]; '
+            'Рецепт: [ {} ]'
+            .format(self.user, self.recipe)
+        )
+
+
+class ImportState(models.Model):
+    """
+    Состояние прерванной загрузки графа рецептов: номер последней
+    загруженной пачки. Сохраняется в той же транзакции, что и пачка,
+    поэтому не может разойтись с данными в базе.
+    """
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Загрузка'
+    )
+    chunk = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Последняя пачка'
+    )
+
+    class Meta:
+        verbose_name = 'Состояние загрузки'
+        verbose_name_plural = 'Состояния загрузок'
+
+    def __str__(self):
+        return '{} ({})'.format(self.name, self.chunk)
+
+
+class ImportIdMapping(models.Model):
+    """
+    Соответствие id исходной базы и id созданной или найденной
+    записи. Каждая пачка добавляет только свои соответствия.
+    """
+    state = models.ForeignKey(
+        ImportState,
+        on_delete=models.CASCADE,
+        related_name='id_mappings',
+        verbose_name='Загрузка'
+    )
+    map_name = models.CharField(
+        max_length=32,
+        verbose_name='Карта id'
+    )
+    old_id = models.BigIntegerField(verbose_name='Id в выгрузке')
+    new_id = models.BigIntegerField(verbose_name='Id в базе')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('state', 'map_name', 'old_id'),
+                name='unique_import_id_mapping'
+            )
+        ]
+        verbose_name = 'Соответствие id загрузки'
+        verbose_name_plural = 'Соответствия id загрузок'
+
+    def __str__(self):
+        return '{} {} → {}'.format(self.map_name, self.old_id, self.new_id)
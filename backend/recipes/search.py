@@ -0,0 +1,110 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+WORD = re.compile(r'\w+')
+TABLE = Recipe._meta.db_table
+FTS_TABLE = TABLE + '_fts'
+
+POSTGRESQL_SETUP = (
+    'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+    ') STORED',
+    'CREATE INDEX IF NOT EXISTS {table}_search_idx '
+    'ON {table} USING GIN (search_vector)',
+)
+SQLITE_SETUP = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+    "name, text, content='{table}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+    'INSERT INTO {fts}(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+    "INSERT INTO {fts}({fts}, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); END",
+    'CREATE TRIGGER IF NOT EXISTS {fts}_au '
+    'AFTER UPDATE OF name, text ON {table} BEGIN '
+    "INSERT INTO {fts}({fts}, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    'INSERT INTO {fts}(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+)
+
+
+def setup_full_text_search(using: str = 'default', **kwargs) -> None:
+    """
+    Создает индекс полнотекстового поиска, которого нет в моделях:
+    в PostgreSQL — вычисляемый столбец tsvector с русской
+    морфологией и GIN-индексом, в SQLite — таблицу FTS5 с триггерами,
+    которые обновляют ее при сохранении и удалении рецептов.
+    Вызывается после каждого migrate и ничего не делает повторно.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRESQL_SETUP:
+                cursor.execute(statement.format(table=TABLE))
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master "
+                "WHERE type = 'trigger' AND tbl_name = %s",
+                [TABLE]
+            )
+            triggers_count = cursor.fetchone()[0]
+            for statement in SQLITE_SETUP:
+                cursor.execute(statement.format(table=TABLE, fts=FTS_TABLE))
+            if triggers_count < 3:
+                cursor.execute(
+                    "INSERT INTO {fts}({fts}) VALUES ('rebuild')"
+                    .format(fts=FTS_TABLE)
+                )
+
+
+def search_recipes(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Оставляет рецепты, подходящие под запрос, и добавляет
+    к ним релевантность ``search_rank`` (чем больше, тем лучше).
+    Совпадения в названии весят больше, чем в описании.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('russian', %s)"
+        return queryset.filter(RawSQL(
+            '{}.search_vector @@ {}'.format(TABLE, tsquery),
+            [query],
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            'ts_rank({}.search_vector, {})'.format(TABLE, tsquery),
+            [query],
+            output_field=FloatField()
+        ))
+    words = WORD.findall(query)
+    if not words:
+        return queryset.none()
+    if vendor == 'sqlite':
+        match = ' '.join('"{}"*'.format(word) for word in words)
+        return queryset.filter(RawSQL(
+            '{table}.id IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)'
+            .format(table=TABLE, fts=FTS_TABLE),
+            [match],
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            '(SELECT -bm25({fts}, 10.0, 1.0) FROM {fts} '
+            'WHERE {fts} MATCH %s AND rowid = {table}.id)'
+            .format(table=TABLE, fts=FTS_TABLE),
+            [match],
+            output_field=FloatField()
+        ))
+    condition = Q()
+    for word in words:
+        condition &= Q(name__icontains=word) | Q(text__icontains=word)
+    return queryset.filter(condition).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    )
@@ -0,0 +1,63 @@
+import hashlib
+import os
+import re
+from tempfile import NamedTemporaryFile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — хеш SHA-256 его содержимого:
+    ``<upload_to>/ab/abcdef….png``. Одинаковые файлы записываются
+    один раз, а их адреса никогда не меняют содержимое, поэтому
+    их можно кэшировать бессрочно. Файлы не удаляются при замене
+    картинки, так как на них могут ссылаться другие рецепты:
+    неиспользуемые удаляет команда sweep_media по счетчикам
+    ссылок ``MediaBlob``.
+    """
+
+    @staticmethod
+    def content_name(name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + ext)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        with NamedTemporaryFile(dir=directory, delete=False) as fout:
+            for chunk in content.chunks():
+                fout.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(fout.name, self.file_permissions_mode)
+        os.replace(fout.name, full_path)
+        return name.replace('\\', '/')
+
+    def iter_blobs(self, directory=''):
+        """Имена всех файлов хранилища, названных по хешу."""
+        directories, files = self.listdir(directory)
+        for file in files:
+            name = os.path.join(directory, file).replace('\\', '/')
+            if BLOB_NAME.search(name):
+                yield name
+        for child in directories:
+            yield from self.iter_blobs(os.path.join(directory, child))
+
+
+content_addressed_storage = ContentAddressedStorage()
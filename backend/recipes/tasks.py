@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+from recipes.images import make_image_derivatives
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Пул потоков обработки картинок, общий для воркера."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.RECIPE_IMAGE_WORKERS,
+                    thread_name_prefix='recipe-images'
+                )
+    return _executor
+
+
+def is_same_image(recipe: Recipe, file: File) -> bool:
+    """Совпадает ли присланная картинка с сохраненной (по хешу)."""
+    field = Recipe._meta.get_field('image')
+    name = field.storage.content_name(
+        field.generate_filename(recipe, file.name), file
+    )
+    return name == recipe.image.name
+
+
+def process_recipe_image(recipe_id: int, upload_name: str) -> None:
+    """
+    Сохраняет картинку рецепта и ее производные из загруженного
+    файла ``upload_name``. Если рецепт успели удалить или прислать
+    для него новую картинку, результат отбрасывается: сохраняется
+    только последняя загрузка, в каком бы порядке ни закончилась
+    обработка.
+    """
+    try:
+        recipe = Recipe.objects.filter(
+            pk=recipe_id, image_upload=upload_name
+        ).first()
+        if recipe is None:
+            return
+        with default_storage.open(upload_name) as file:
+            recipe.image.save(os.path.basename(upload_name), file,
+                              save=False)
+        fields = make_image_derivatives(recipe)
+        with transaction.atomic():
+            if not Recipe.objects.select_for_update().filter(
+                pk=recipe_id, image_upload=upload_name
+            ).exists():
+                return
+            recipe.image_status = Recipe.ImageStatus.READY
+            recipe.image_upload = ''
+            recipe.save(update_fields=(
+                'image', 'image_status', 'image_upload', *fields
+            ))
+    except Exception:
+        logger.exception('Image processing failed for recipe %s', recipe_id)
+        Recipe.objects.filter(pk=recipe_id, image_upload=upload_name).update(
+            image_status=Recipe.ImageStatus.FAILED, image_upload=''
+        )
+    finally:
+        default_storage.delete(upload_name)
+
+
+def _process_in_worker(recipe_id: int, upload_name: str) -> None:
+    try:
+        process_recipe_image(recipe_id, upload_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_recipe_image(recipe: Recipe, file: File) -> None:
+    """
+    Сохраняет присланную картинку в ``image_upload`` в транзакции
+    рецепта и после коммита передает ее в пул потоков. Если процесс
+    завершится раньше, картинку обработает команда
+    process_pending_images. При ``RECIPE_IMAGE_WORKERS = 0`` картинка
+    обрабатывается сразу после коммита в том же потоке.
+    """
+    recipe.image_upload.save(file.name, file, save=False)
+    file.close()
+    upload_name = recipe.image_upload.name
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_upload=upload_name, image_status=Recipe.ImageStatus.PENDING
+    )
+
+    def submit():
+        if settings.RECIPE_IMAGE_WORKERS:
+            get_executor().submit(_process_in_worker, recipe.pk, upload_name)
+        else:
+            process_recipe_image(recipe.pk, upload_name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,146 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api.paginations import EstimatedCountPaginator
+from recipes.models import (Favorite, Ingredient, IngredientAmountForRecipe,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Follow, User
+
+
+class AdminChangelistQueriesTests(TestCase):
+    """Класс тестов количества запросов в списках админки."""
+    changelists = {
+        'recipes_recipe': 5,
+        'recipes_favorite': 4,
+        'recipes_shoppingcart': 4,
+        'recipes_ingredientamountforrecipe': 4,
+        'users_follow': 4,
+        'users_user': 4
+    }
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            first_name='Админ',
+            last_name='Админов',
+            username='admin.user',
+            email='admin@yandex.ru',
+            password='Qwerty_123'
+        )
+        self.client.force_login(self.admin)
+        self.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='Капуста', measurement_unit='кг'
+        )
+        self.users = 0
+
+    def _fill(self, count):
+        for _ in range(count):
+            self.users += 1
+            user = User.objects.create(
+                first_name='Вася',
+                last_name='Пупкин',
+                username='user{}'.format(self.users),
+                email='user{}@yandex.ru'.format(self.users),
+                password='Qwerty_123'
+            )
+            recipe = Recipe.objects.create(
+                author=user,
+                image='image.jpg',
+                name='Рецепт {}'.format(self.users),
+                text='Описание',
+                cooking_time=1
+            )
+            recipe.tags.add(self.tag)
+            IngredientAmountForRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1
+            )
+            Favorite.objects.create(user=self.admin, recipe=recipe)
+            ShoppingCart.objects.create(user=self.admin, recipe=recipe)
+            Follow.objects.create(user=self.admin, author=user)
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_changelist_queries(self):
+        """
+        Списки выполняют фиксированное число запросов при любом числе
+        строк: сессия, пользователь, COUNT и страница (и теги для
+        фильтра рецептов), без выборок целых таблиц для фильтров.
+        """
+        for count in (5, 50):
+            self._fill(count - self.users)
+            for name, expected in self.changelists.items():
+                with self.subTest(changelist=name, rows=count):
+                    url = reverse('admin:{}_changelist'.format(name))
+                    self.assertEqual(self._queries(url), expected)
+
+    def test_change_forms_do_not_load_tables(self):
+        """Формы связей не выводят пользователей и рецепты списком."""
+        self._fill(30)
+        forms = {
+            'recipes_shoppingcart': ShoppingCart.objects.first(),
+            'recipes_favorite': Favorite.objects.first(),
+            'recipes_ingredientamountforrecipe': (
+                IngredientAmountForRecipe.objects.first()
+            ),
+            'recipes_recipe': Recipe.objects.first()
+        }
+        for name, obj in forms.items():
+            with self.subTest(form=name):
+                response = self.client.get(reverse(
+                    'admin:{}_change'.format(name), args=(obj.pk, )
+                ))
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, 'user29</option>')
+                self.assertNotContains(response, 'Рецепт 29</option>')
+
+    def test_delete_selected_updates_counters(self):
+        """Действие «удалить выбранные» уменьшает счетчики рецептов."""
+        self._fill(3)
+        favorites = list(Favorite.objects.values_list('pk', flat=True)[:2])
+        response = self.client.post(
+            reverse('admin:recipes_favorite_changelist'),
+            {
+                'action': 'delete_selected',
+                '_selected_action': favorites,
+                'post': 'yes'
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Favorite.objects.count(), 1)
+        call_command(
+            'reconcile_recipe_counters', '--check', stdout=io.StringIO()
+        )
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Класс тестов пагинатора с приблизительным числом строк."""
+
+    def test_exact_count_without_estimate(self):
+        """Без статистики базы используется точный COUNT(*)."""
+        paginator = EstimatedCountPaginator(Tag.objects.all(), 10)
+        self.assertEqual(paginator.count, 0)
+
+    def test_large_estimate_is_used(self):
+        """Большая оценка заменяет COUNT(*), а фильтры — нет."""
+        with mock.patch.object(
+            EstimatedCountPaginator, '_estimated_count', return_value=10 ** 6
+        ):
+            paginator = EstimatedCountPaginator(Tag.objects.all(), 10)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 10 ** 6)
+        paginator = EstimatedCountPaginator(
+            Tag.objects.filter(slug='breakfast'), 10
+        )
+        self.assertIsNone(paginator._estimated_count())
@@ -0,0 +1,134 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import get_catalog_version
+from recipes.management.loaders import LoadDataCommand, iter_json_array
+from recipes.models import Ingredient, Tag
+
+
+@override_settings(INGREDIENT_TRIGRAM_INDEX_PATH=os.path.join(
+    tempfile.mkdtemp(), 'ingredients.trigrams'
+))
+class LoadDataCommandTests(TestCase):
+    """Класс тестов команд загрузки справочников."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write(self, filename, content):
+        path = os.path.join(self.directory, filename)
+        with open(path, 'w', encoding='utf-8') as fout:
+            fout.write(content)
+        return path
+
+    def _call(self, command, *args):
+        stdout = io.StringIO()
+        call_command(command, *args, stdout=stdout, stderr=io.StringIO())
+        return stdout.getvalue()
+
+    def test_json_array_is_streamed(self):
+        """Массив разбирается по частям через границы буфера."""
+        entries = [
+            {'name': 'ароматизатор "ананас"', 'measurement_unit': 'г'},
+            {'name': 'соль', 'measurement_unit': 'г'}
+        ]
+        content = json.dumps(entries, ensure_ascii=False, indent=2)
+        self.assertEqual(
+            list(iter_json_array(io.StringIO(content), chunk_size=7)),
+            entries
+        )
+
+    def test_load_csv_and_upsert(self):
+        """CSV загружается, повторная загрузка пропускает строки."""
+        path = self._write(
+            'ingredients.csv',
+            '"ароматизатор ""ананас""",по вкусу\nсоль,г\nсоль,г\n'
+        )
+        output = self._call('load_ingredients_data', '--path', path)
+        self.assertIn('inserted 2, updated 0, skipped 1', output)
+        self.assertTrue(
+            Ingredient.objects.filter(name='ароматизатор "ананас"').exists()
+        )
+        path = self._write('more.jsonl', '\n'.join((
+            json.dumps({'name': 'соль', 'measurement_unit': 'г'}),
+            json.dumps({'name': 'перец', 'measurement_unit': 'г'})
+        )))
+        output = self._call(
+            'load_ingredients_data', '--path', path, '--upsert'
+        )
+        self.assertIn('inserted 1, updated 0, skipped 1', output)
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_non_empty_table_requires_upsert(self):
+        """Без --upsert непустая таблица не изменяется."""
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        output = self._call('load_tags_data')
+        self.assertIn('Use --upsert', output)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_tags_upsert_updates_changed_rows(self):
+        """Теги обновляются по slug и сбрасывают версию каталога."""
+        Tag.objects.create(name='Завтрак', color='#000000', slug='breakfast')
+        version = get_catalog_version()
+        output = self._call('load_tags_data', '--upsert')
+        self.assertIn('inserted 2, updated 1, skipped 0', output)
+        self.assertEqual(Tag.objects.get(slug='breakfast').color, '#E26C2D')
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_unique_conflicts_are_not_counted_as_inserted(self):
+        """Тег с новым slug, но занятым названием попадает в конфликты."""
+        Tag.objects.create(name='Обед', color='#000000', slug='dinner')
+        path = self._write('tags.jsonl', '\n'.join((
+            json.dumps({'name': 'Обед', 'color': '#111111', 'slug': 'lunch'},
+                       ensure_ascii=False),
+            json.dumps({'name': 'Ужин', 'color': '#222222', 'slug': 'supper'},
+                       ensure_ascii=False)
+        )))
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('load_tags_data', '--path', path, '--upsert',
+                     stdout=stdout, stderr=stderr)
+        self.assertIn(
+            'inserted 1, updated 0, skipped 0, conflicts 1', stdout.getvalue()
+        )
+        self.assertIn('lunch', stderr.getvalue())
+        self.assertEqual(
+            set(Tag.objects.values_list('slug', flat=True)),
+            {'dinner', 'supper'}
+        )
+
+    def test_large_catalog_loads_in_batches(self):
+        """
+        Каталог из 100 000 строк загружается пачками: число запросов
+        зависит от числа пачек, а не строк.
+        """
+        path = os.path.join(self.directory, 'ingredients.jsonl')
+        with open(path, 'w', encoding='utf-8') as fout:
+            for number in range(100_000):
+                fout.write(json.dumps(
+                    {'name': 'ингредиент {}'.format(number),
+                     'measurement_unit': 'г'},
+                    ensure_ascii=False
+                ) + '\n')
+        with mock.patch.object(LoadDataCommand, '_load_batch', autospec=True,
+                               side_effect=LoadDataCommand._load_batch) \
+                as load_batch, \
+                CaptureQueriesContext(connection) as context:
+            output = self._call(
+                'load_ingredients_data', '--path', path, '--batch-size', '5000'
+            )
+        self.assertEqual(load_batch.call_count, 20)
+        self.assertLess(len(context.captured_queries), 100_000 // 100)
+        self.assertIn('inserted 100000', output)
+        self.assertEqual(Ingredient.objects.count(), 100_000)
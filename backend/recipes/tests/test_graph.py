@@ -0,0 +1,231 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.management.graph import GraphImporter
+from recipes.models import (Favorite, ImportIdMapping, ImportState,
+                            Ingredient, IngredientAmountForRecipe, Recipe,
+                            ShoppingCart, ShoppingListTotal, Tag)
+from users.models import Follow, User
+
+
+class RecipeGraphExchangeTests(TestCase):
+    """Класс тестов выгрузки и загрузки графа рецептов."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'graph.jsonl')
+        self.users = [
+            User.objects.create(
+                username='user{}'.format(number),
+                email='user{}@yandex.ru'.format(number),
+                first_name='Имя',
+                last_name='Фамилия',
+                password='Qwerty_123'
+            )
+            for number in range(3)
+        ]
+        tag = Tag.objects.create(name='завтрак', color='#E26C2D', slug='b')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        for number in range(5):
+            recipe = Recipe.objects.create(
+                author=self.users[number % 2],
+                image='recipes/images/{}.jpg'.format(number),
+                image_thumbnail='recipes/images/{}-t.jpg'.format(number),
+                image_medium='recipes/images/{}-m.jpg'.format(number),
+                image_status=Recipe.ImageStatus.FAILED,
+                name='Рецепт {}'.format(number),
+                text='Описание',
+                cooking_time=number + 1
+            )
+            recipe.tags.add(tag)
+            IngredientAmountForRecipe.objects.create(
+                recipe=recipe, ingredient=salt, amount=number + 1
+            )
+            Favorite.objects.create(user=self.users[2], recipe=recipe)
+            ShoppingCart.objects.create(user=self.users[2], recipe=recipe)
+        Follow.objects.create(user=self.users[2], author=self.users[0])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _snapshot(self):
+        return {
+            'recipes': sorted(
+                Recipe.objects.values_list(
+                    'author__username', 'name', 'image', 'image_thumbnail',
+                    'image_medium', 'image_status', 'cooking_time',
+                    'pub_date'
+                )
+            ),
+            'tags': sorted(
+                Recipe.tags.through.objects.values_list(
+                    'recipe__name', 'tag__slug'
+                )
+            ),
+            'amounts': sorted(
+                IngredientAmountForRecipe.objects.values_list(
+                    'recipe__name', 'ingredient__name', 'amount'
+                )
+            ),
+            'favorites': sorted(
+                Favorite.objects.values_list('user__username', 'recipe__name')
+            ),
+            'carts': sorted(
+                ShoppingCart.objects.values_list(
+                    'user__username', 'recipe__name'
+                )
+            ),
+            'follows': sorted(
+                Follow.objects.values_list('user__username',
+                                           'author__username')
+            ),
+        }
+
+    def _export(self, *args):
+        call_command(
+            'export_recipes', self.path, *args,
+            stdout=io.StringIO(), stderr=io.StringIO()
+        )
+
+    def _import(self, stderr=None):
+        stdout = io.StringIO()
+        call_command(
+            'import_recipes', self.path,
+            stdout=stdout, stderr=stderr or io.StringIO()
+        )
+        return stdout.getvalue()
+
+    def _wipe(self):
+        Recipe.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+        Tag.objects.all().delete()
+
+    def test_round_trip(self):
+        """Граф восстанавливается в пустой базе с новыми id."""
+        expected = self._snapshot()
+        self._export('--media', '--chunk-size', '2')
+        self._wipe()
+        output = self._import()
+        self.assertIn('rows/sec', output)
+        self.assertEqual(self._snapshot(), expected)
+        self.assertEqual(Ingredient.objects.count(), 1)
+        self.assertEqual(ShoppingListTotal.objects.get().total_amount, 15)
+        self.assertFalse(ImportState.objects.exists())
+
+    def test_media_is_optional(self):
+        """Без --media пути к картинкам не выгружаются."""
+        self._export()
+        with open(self.path, encoding='utf-8') as fin:
+            chunks = [json.loads(line) for line in fin]
+        self.assertEqual(chunks[0]['format'], 'foodgram-graph')
+        images = {
+            row[field]
+            for chunk in chunks[1:] if chunk['model'] == 'recipes.recipe'
+            for row in chunk['rows']
+            for field in ('image', 'image_thumbnail', 'image_medium')
+        }
+        self.assertEqual(images, {''})
+
+    def test_resume_after_failure(self):
+        """Прерванная загрузка продолжается без дублей."""
+        expected = self._snapshot()
+        self._export('--media', '--chunk-size', '2')
+        self._wipe()
+        load_chunk = GraphImporter.load_chunk
+
+        def failing_load_chunk(importer, section, rows):
+            if section.label == 'recipes.favorite':
+                raise RuntimeError('сбой')
+            return load_chunk(importer, section, rows)
+
+        with mock.patch.object(GraphImporter, 'load_chunk',
+                               failing_load_chunk):
+            with self.assertRaises(RuntimeError):
+                self._import()
+        self.assertEqual(Recipe.objects.count(), 5)
+        self.assertTrue(ImportState.objects.exists())
+        self._import()
+        self.assertEqual(self._snapshot(), expected)
+
+    def test_state_is_saved_with_chunk(self):
+        """Пачка и ее номер сохраняются вместе: сбой не создает дублей."""
+        expected = self._snapshot()
+        self._export('--media', '--chunk-size', '2')
+        self._wipe()
+        save_state = GraphImporter.save_state
+
+        def failing_save_state(importer):
+            if importer.chunk > 4:
+                raise RuntimeError('сбой')
+            return save_state(importer)
+
+        with mock.patch.object(GraphImporter, 'save_state',
+                               failing_save_state):
+            with self.assertRaises(RuntimeError):
+                self._import()
+        self.assertEqual(ImportState.objects.get().chunk, 4)
+        self.assertEqual(ImportIdMapping.objects.count(), 5)
+        self._import()
+        self.assertEqual(self._snapshot(), expected)
+
+    def test_chunks_save_only_new_mappings(self):
+        """Пачки без новых соответствий id не пишут их заново."""
+        self._export('--media', '--chunk-size', '2')
+        self._wipe()
+        counts = []
+        save_state = GraphImporter.save_state
+
+        def counting_save_state(importer):
+            save_state(importer)
+            counts.append(ImportIdMapping.objects.count())
+
+        with mock.patch.object(GraphImporter, 'save_state',
+                               counting_save_state), \
+                mock.patch.object(GraphImporter, 'remove_state'):
+            self._import()
+        self.assertEqual(counts[:7], [2, 3, 4, 5, 7, 9, 10])
+        self.assertEqual(set(counts[7:]), {10})
+
+    def test_unique_conflicts_are_reported(self):
+        """Пользователь с занятой почтой пропускается, остальное грузится."""
+        self._export()
+        self._wipe()
+        User.objects.create(
+            username='other', email='user0@yandex.ru',
+            first_name='Имя', last_name='Фамилия', password='Qwerty_123'
+        )
+        stderr = io.StringIO()
+        output = self._import(stderr)
+        self.assertIn('1 conflicts', output)
+        self.assertIn("users.user #{}: email 'user0@yandex.ru'".format(
+            self.users[0].id
+        ), stderr.getvalue())
+        self.assertFalse(User.objects.filter(username='user0').exists())
+        self.assertEqual(
+            set(Recipe.objects.values_list('author__username', flat=True)),
+            {'user1'}
+        )
+        self.assertEqual(Follow.objects.count(), 0)
+        self.assertEqual(Favorite.objects.count(), 2)
+
+    def test_existing_rows_are_matched(self):
+        """Пользователи, теги и ингредиенты сопоставляются по ключам."""
+        self._export()
+        Recipe.objects.all().delete()
+        Follow.objects.all().delete()
+        self._import()
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Tag.objects.count(), 1)
+        self.assertEqual(Recipe.objects.count(), 5)
+        self.assertEqual(
+            set(Recipe.objects.values_list('author_id', flat=True)),
+            {self.users[0].id, self.users[1].id}
+        )
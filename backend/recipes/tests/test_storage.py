@@ -0,0 +1,152 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.tests.test_images import make_image
+from recipes.models import Ingredient, MediaBlob, Recipe, Tag
+from recipes.storage import content_addressed_storage
+from users.models import User
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), RECIPE_IMAGE_WORKERS=0)
+class ContentAddressedStorageTests(APITestCase):
+    """Класс тестов хранения картинок по хешу содержимого."""
+
+    def setUp(self):
+        self.recipe_url = 'http://testserver/api/recipes/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.tag = Tag.objects.create(
+            name='завтрак', color='#E26C2D', slug='breakfast'
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.image = make_image((400, 300))
+
+    def tearDown(self):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def _data(self, image):
+        return {
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            'tags': [self.tag.id],
+            'image': image,
+            'name': 'рецепт',
+            'text': 'описание',
+            'cooking_time': 5
+        }
+
+    def _create(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.recipe_url, self._data(image), format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Recipe.objects.get(pk=response.json()['id'])
+
+    def _files(self):
+        return sorted(content_addressed_storage.iter_blobs())
+
+    def test_same_content_is_stored_once(self):
+        """Одинаковые картинки разных рецептов хранятся в одном файле."""
+        first = self._create(self.image)
+        second = self._create(self.image)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^recipes/images/[0-9a-f]{2}/[0-9a-f]{64}\.'
+        )
+        self.assertEqual(len(self._files()), 3)
+        self.assertEqual(
+            MediaBlob.objects.get(name=first.image.name).ref_count, 2
+        )
+
+    def test_resubmitted_image_is_not_rewritten(self):
+        """Повторная отправка той же картинки не пишет файлы."""
+        recipe = self._create(self.image)
+        path = content_addressed_storage.path(recipe.image_thumbnail.name)
+        modified = os.stat(path).st_mtime_ns
+        with mock.patch('api.serializers.schedule_recipe_image') as schedule:
+            response = self.client.patch(
+                '{}{}/'.format(self.recipe_url, recipe.id),
+                self._data(self.image),
+                format='json'
+            )
+        schedule.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(os.stat(path).st_mtime_ns, modified)
+        self.assertEqual(len(self._files()), 3)
+        self.assertEqual(
+            set(MediaBlob.objects.values_list('ref_count', flat=True)), {1}
+        )
+
+    def test_replaced_and_deleted_images_are_swept(self):
+        """Замененные и удаленные картинки удаляет sweep_media."""
+        recipe = self._create(self.image)
+        old_names = {recipe.image.name, recipe.image_thumbnail.name,
+                     recipe.image_medium.name}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                '{}{}/'.format(self.recipe_url, recipe.id),
+                self._data(make_image((500, 300))),
+                format='json'
+            )
+        self.assertEqual(len(self._files()), 6)
+        call_command('sweep_media', '--grace', '0', stdout=io.StringIO())
+        files = set(self._files())
+        self.assertEqual(len(files), 3)
+        self.assertFalse(old_names & files)
+
+        self.client.delete('{}{}/'.format(self.recipe_url, recipe.id))
+        call_command('sweep_media', '--grace', '0', stdout=io.StringIO())
+        self.assertEqual(self._files(), [])
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_orphans_and_recount(self):
+        """Файлы без записей удаляются, счетчики пересчитываются."""
+        recipe = self._create(self.image)
+        orphan = content_addressed_storage.save(
+            'recipes/images/orphan.png', ContentFile(b'orphan')
+        )
+        MediaBlob.objects.update(ref_count=0)
+        stdout = io.StringIO()
+        call_command(
+            'sweep_media', '--grace', '0', '--recount', stdout=stdout
+        )
+        self.assertIn('Removed \033[1m1\033[0m', stdout.getvalue())
+        self.assertNotIn(orphan, self._files())
+        self.assertIn(recipe.image.name, self._files())
+
+    def test_imported_recipes_keep_images(self):
+        """После import_recipes файлы рецептов не считаются лишними."""
+        recipe = self._create(self.image)
+        files = self._files()
+        path = os.path.join(settings.MEDIA_ROOT, 'graph.jsonl')
+        call_command('export_recipes', path, '--media',
+                     stdout=io.StringIO(), stderr=io.StringIO())
+        Recipe.objects.all().delete()
+        MediaBlob.objects.all().delete()
+        call_command('import_recipes', path,
+                     stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(
+            MediaBlob.objects.get(name=recipe.image.name).ref_count, 1
+        )
+        call_command('sweep_media', '--grace', '0', stdout=io.StringIO())
+        self.assertEqual(self._files(), files)
@@ -1,17 +1,19 @@
 from django.contrib import admin
 
+from recipes.admin import LargeTableAdmin
 from users.models import Follow, User
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('author', 'user')
-    list_filter = ('author', 'user')
+    list_select_related = ('author', 'user')
+    raw_id_fields = ('author', 'user')
     search_fields = ('author__username', 'user__username')
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ('username', 'email')
-    list_filter = ('email', 'username')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('email', 'username')
@@ -2,12 +2,14 @@ from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.utils import ImageDerivativeField, RecipeImageField
+from api.viewer import ViewerListSerializer, ViewerSerializerMixin
 from foodgram.settings import RESERVED_USERNAME_LIST
 from recipes.models import Recipe
 from users.models import Follow, User
 
 
-class UserDetailSerializer(UserSerializer):
+class UserDetailSerializer(ViewerSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -20,13 +22,13 @@ class UserDetailSerializer(UserSerializer):
             'last_name',
             'is_subscribed'
         )
+        list_serializer_class = ViewerListSerializer
+
+    def viewer_ids(self, objs):
+        return {'authors': [obj.id for obj in objs]}
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return (
-            user.follower.filter(author=obj).exists()
-            if user.is_authenticated else False
-        )
+        return self.viewer.is_subscribed(obj.id)
 
 
 class UserRegistrationSerializer(UserCreateSerializer):
@@ -58,9 +60,7 @@ class UserRegistrationSerializer(UserCreateSerializer):
 
 class FollowSerializer(UserDetailSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count'
-    )
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -75,6 +75,7 @@ class FollowSerializer(UserDetailSerializer):
             'recipes_count'
         )
         read_only_fields = ('recipes', 'recipes_count')
+        list_serializer_class = ViewerListSerializer
 
         validators = [
             serializers.UniqueTogetherValidator(
@@ -84,16 +85,26 @@ class FollowSerializer(UserDetailSerializer):
         ]
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            request = self.context.get('request')
+            recipes_limit = request.query_params.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return RecipeShortSerializer(recipes, many=True).data
 
+    def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
+        return obj.recipes.count()
+
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image = RecipeImageField()
+    image_thumbnail = ImageDerivativeField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumbnail', 'cooking_time')
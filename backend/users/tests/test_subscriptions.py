@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+from users.models import Follow, User
+
+
+class SubscriptionListQueriesTests(APITestCase):
+    """Класс тестов списка подписок."""
+
+    def setUp(self):
+        self.subscriptions = 'http://testserver/api/users/subscriptions/'
+        self.user = User.objects.create(
+            first_name='Вася',
+            last_name='Пупкин',
+            username='vasya.pupkin',
+            email='vpupkin@yandex.ru',
+            password='Qwerty_123'
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        now = timezone.now()
+        self.authors = []
+        for number in range(30):
+            author = User.objects.create(
+                first_name='Автор',
+                last_name='Авторов',
+                username='author{}'.format(number),
+                email='author{}@yandex.ru'.format(number),
+                password='Qwerty_123'
+            )
+            for position in range(number % 5):
+                recipe = Recipe.objects.create(
+                    author=author,
+                    image='image.jpg',
+                    name='Рецепт {} {}'.format(number, position),
+                    text='Описание',
+                    cooking_time=1
+                )
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    pub_date=now - timedelta(minutes=position)
+                )
+            Follow.objects.create(user=self.user, author=author)
+            self.authors.append(author)
+
+    def _get(self, **params):
+        response = self.client.get(self.subscriptions, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_queries_do_not_depend_on_page_size(self):
+        """
+        Страница подписок — токен, count, авторы и рецепты
+        при любом размере страницы и recipes_limit.
+        """
+        for limit in (3, 30):
+            for params in ({}, {'recipes_limit': 2}):
+                with self.subTest(limit=limit, **params):
+                    with self.assertNumQueries(4):
+                        data = self._get(limit=limit, **params)
+                    self.assertEqual(len(data['results']), limit)
+
+    def test_recipes_limit_and_counts(self):
+        """Рецепты ограничиваются и идут от новых к старым."""
+        data = self._get(limit=30, recipes_limit=2)
+        for item in data['results']:
+            with self.subTest(author=item['username']):
+                number = int(item['username'][len('author'):])
+                self.assertTrue(item['is_subscribed'])
+                self.assertEqual(item['recipes_count'], number % 5)
+                self.assertEqual(
+                    [recipe['name'] for recipe in item['recipes']],
+                    [
+                        'Рецепт {} {}'.format(number, position)
+                        for position in range(min(number % 5, 2))
+                    ]
+                )
+
+    def test_cursor_mode(self):
+        """Курсорный режим тоже загружает рецепты одним запросом."""
+        with self.assertNumQueries(3):
+            data = self._get(pagination='cursor', limit=10, recipes_limit=1)
+        self.assertEqual(len(data['results']), 10)
+
+    def test_invalid_recipes_limit(self):
+        """Некорректный recipes_limit отклоняется."""
+        response = self.client.get(
+            self.subscriptions, {'recipes_limit': 'abc'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
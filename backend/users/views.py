@@ -1,11 +1,14 @@
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, Prefetch, prefetch_related_objects
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from rest_framework import generics, permissions, response, status
+from rest_framework import (generics, permissions, response, serializers,
+                            status)
 
-from api.paginations import CustomPagination
+from api.paginations import FollowPagination
 from api.permissions import IsAuthorAdminOrReadOnly
+from api.viewer import get_viewer
+from recipes.models import Recipe
 from users.models import Follow, User
 from users.serializers import FollowSerializer, UserDetailSerializer
 
@@ -18,7 +21,7 @@ class UserListViewSet(UserViewSet):
 
 class FollowListViewSet(generics.ListAPIView):
     serializer_class = FollowSerializer
-    pagination_class = CustomPagination
+    pagination_class = FollowPagination
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
@@ -26,6 +29,37 @@ class FollowListViewSet(generics.ListAPIView):
             following__user=self.request.user
         ).annotate(recipes_count=Count('recipes'))
 
+    def _get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        if not recipes_limit.isdigit():
+            raise serializers.ValidationError(
+                {'recipes_limit': 'Ожидается целое неотрицательное число.'}
+            )
+        return int(recipes_limit)
+
+    def paginate_queryset(self, queryset):
+        """
+        Последние рецепты всех авторов страницы загружаются одним
+        запросом, с ограничением ``recipes_limit`` внутри базы.
+        """
+        page = super().paginate_queryset(queryset)
+        if page is None:
+            page = list(queryset)
+        recipes_limit = self._get_recipes_limit()
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        if recipes_limit is not None:
+            recipes = recipes.latest_by_author(
+                (author.id for author in page), recipes_limit
+            )
+        prefetch_related_objects(
+            page,
+            Prefetch('recipes', queryset=recipes, to_attr='latest_recipes')
+        )
+        get_viewer(self.request).mark_followed(author.id for author in page)
+        return page
+
 
 class FollowCreateDestroyViewSet(
     generics.CreateAPIView,
@@ -52,6 +86,7 @@ class FollowCreateDestroyViewSet(
             )
         author = get_object_or_404(User, id=user_id)
         Follow.objects.create(user=request.user, author_id=user_id)
+        get_viewer(request).mark_followed([author.id])
         return response.Response(
             self.serializer_class(author, context={'request': request}).data,
             status=status.HTTP_201_CREATED